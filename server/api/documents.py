@@ -6,78 +6,103 @@ from config import settings
 
 from PyPDF2 import PdfReader, PdfWriter
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Request, Query
+from fastapi.responses import FileResponse, StreamingResponse, RedirectResponse, Response
 import os
+import json
+import asyncio
 import uuid
 import traceback
+import mimetypes
 from pathlib import Path
+from urllib.parse import quote
 
-from services.document_service import DocumentService
+from services.document_service import DocumentService, UnsupportedFileError, FileTooLargeError
 from services.metadata_service import MetadataService
 from services.annotation_service import AnnotationService
+from services.job_service import JobService, JobQueueFullError
+from services.tile_service import TileService, TileOutOfRangeError
+from services.search_service import SearchService
+from services.archive_member_service import ArchiveMemberService
 from models.document import Document
-from core.utils.file_utils import get_mime_type
-from core.registry.handler_registry import HandlerRegistry
+from core.utils.file_utils import hash_file
+from core.utils.command_utils import get_scheduler_stats
+from core.utils import render_backends
+from core.utils.cache_manager import page_cache
+from core.utils.http_cache import (
+    artifact_headers, not_modified, cached_json_response, ranged_file_response, document_version, versioned_url,
+    make_etag, IMMUTABLE, REVALIDATE
+)
+from core.utils.video_streaming import HLS_MASTER_PLAYLIST, start_hls_transcode, is_hls_failed
+from core.utils.storyboard import STORYBOARD_TRACK
+from core.utils import waveform, line_index, highlighting, text_layer, archive_access
 
 router = APIRouter()
 
 document_service = DocumentService()
 metadata_service = MetadataService()
 annotation_service = AnnotationService()
+search_service = SearchService()
+job_service = JobService(document_service, metadata_service, search_service)
+tile_service = TileService(document_service)
+archive_member_service = ArchiveMemberService(document_service)
 
 @router.post("/documents/upload")
 async def upload_document(file: UploadFile = File(...)):
     try:
         document_id = str(uuid.uuid4())
-        file_path = await document_service.save_uploaded_file(file, document_id)
-        
-        # Get MIME type using python-magic
-        mime_type = get_mime_type(file_path)
-
-        # Now, check if the file type is supported
-        is_supported = document_service.is_supported_file(file.filename, mime_type)
-        if not is_supported:
-            error_detail = (
-                f"Unsupported file type. "
-                f"Filename: '{file.filename}', "
-                f"Detected Content-Type: '{mime_type}'"
-            )
-            print(error_detail)
-            # Clean up the saved file
-            os.remove(file_path)
-            raise HTTPException(status_code=400, detail=error_detail)
-        
-        processed_info = await document_service.process_document(file_path, document_id)
-        metadata = await metadata_service.extract_metadata(file_path)
+        try:
+            ingested = await document_service.ingest_uploaded_file(file, document_id)
+        except UnsupportedFileError as e:
+            print(e)
+            raise HTTPException(status_code=400, detail=str(e))
+        except FileTooLargeError as e:
+            print(e)
+            raise HTTPException(status_code=413, detail=str(e))
+
+        file_path = ingested["file_path"]
+        artifact_key = document_service.get_artifact_key(ingested["sha256"], file_path)
 
         document = Document(
             id=document_id,
             name=file.filename,
             original_name=file.filename,
-            file_type=mime_type,
-            size=Path(file_path).stat().st_size,
+            file_type=ingested["mime_type"],
+            size=ingested["size"],
             file_path=file_path,
-            converted_path=processed_info.get("converted_path"),
-            thumbnail_path=processed_info.get("thumbnail_path"),
-            total_pages=processed_info.get("total_pages", 1),
-            metadata=metadata,
-            is_plain_text=processed_info.get("is_plain_text", False)
+            content_hash=ingested["sha256"],
+            artifact_key=artifact_key,
+            status="processing"
         )
-
         document_service.store_document(document)
 
+        # Conversion, thumbnails and metadata run in the background job queue
+        try:
+            job = job_service.submit(document)
+        except JobQueueFullError as e:
+            document_service.delete_document(document_id)
+            raise HTTPException(status_code=503, detail=str(e))
+
         return {
             "id": document.id,
             "name": document.name,
             "size": document.size,
             "type": document.file_type,
+            "contentHash": document.content_hash,
             "uploadedAt": document.created_at.isoformat(),
             "totalPages": document.total_pages,
-            "previewUrl": f"/api/documents/{document.id}/preview",
-            "downloadUrl": f"/api/documents/{document.id}/download"
+            "status": document.status,
+            "jobId": job.id,
+            "statusUrl": f"/api/jobs/{job.id}",
+            "eventsUrl": f"/api/jobs/{job.id}/events",
+            "version": document_version(document),
+            "previewUrl": versioned_url(document, f"/api/documents/{document.id}/preview"),
+            "downloadUrl": versioned_url(document, f"/api/documents/{document.id}/download"),
+            "pageUrlTemplate": versioned_url(document, f"/api/documents/{document.id}/page/{{page}}")
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("Error in /upload:", str(e))
         traceback.print_exc()
@@ -98,40 +123,321 @@ async def get_document(document_id: str):
         "totalPages": document.total_pages,
         "createdAt": document.created_at.isoformat(),
         "updatedAt": document.updated_at.isoformat(),
-        "previewUrl": f"/api/documents/{document_id}/preview",
-        "downloadUrl": f"/api/documents/{document_id}/download",
+        "version": document_version(document),
+        "previewUrl": versioned_url(document, f"/api/documents/{document_id}/preview"),
+        "downloadUrl": versioned_url(document, f"/api/documents/{document_id}/download"),
+        "pageUrlTemplate": versioned_url(document, f"/api/documents/{document_id}/page/{{page}}"),
+        "streamUrl": f"/api/documents/{document_id}/hls/{HLS_MASTER_PLAYLIST}" if _has_hls(document) else None,
+        "storyboardUrl": versioned_url(document, f"/api/documents/{document_id}/storyboard/{STORYBOARD_TRACK}")
+        if document.storyboard_path else None,
+        "waveformUrl": versioned_url(document, f"/api/documents/{document_id}/waveform")
+        if document.waveform_path else None,
+        "linesUrl": versioned_url(document, f"/api/documents/{document_id}/lines")
+        if document.line_index_path else None,
+        "highlightUrl": versioned_url(document, f"/api/documents/{document_id}/highlight")
+        if document.highlight_path else None,
+        "parentId": document.parent_id,
+        "memberPath": document.member_path,
         "metadata": document.metadata,
         "is_plain_text": document.is_plain_text,
+        "status": document.status,
     }
 
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = job_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Server-sent events reporting each processing stage as it finishes."""
+    if not job_service.get_job(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for event in job_service.subscribe(job_id):
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/search")
+async def search_documents(
+    q: str = Query(..., min_length=1, description="Words to find; the last one also matches as a prefix"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """Ranked page hits across all documents, with highlighted snippets"""
+    result = await search_service.search(q, limit, offset)
+    hits = []
+    for hit in result["hits"]:
+        document = document_service.get_document(hit["documentId"])
+        if not document:
+            continue
+        hits.append({
+            **hit,
+            "pageUrl": versioned_url(document, f"/api/documents/{document.id}/page/{hit['page']}")
+            if document.total_pages >= hit["page"] else None,
+        })
+    return {**result, "hits": hits}
+
 @router.delete("/documents/{document_id}")
 async def delete_document(document_id: str):
     try:
         document_service.delete_document(document_id)
+        await search_service.remove_document(document_id)
         return {"message": "Document deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/documents/{document_id}/preview")
-async def get_document_preview(document_id: str):
+async def get_document_preview(document_id: str, request: Request, mode: Optional[str] = None):
     document = document_service.get_document(document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
+    if mode == "hls":
+        # Adaptive stream of videos browsers cannot play natively
+        if not _has_hls(document):
+            raise HTTPException(status_code=404, detail="No HLS rendition for this document.")
+        return RedirectResponse(f"/api/documents/{document_id}/hls/{HLS_MASTER_PLAYLIST}", status_code=307)
+
     if document.is_plain_text:
         preview_path = document.file_path
         media_type = "text/plain; charset=utf-8"
     else:
-        preview_path = document.converted_path or document.file_path
+        # Prefer the linearized copy so the viewer can render page 1 from the first ranges
+        preview_path = document.linearized_path or document.converted_path or document.file_path
+        if not os.path.exists(preview_path):
+            preview_path = document.converted_path or document.file_path
         media_type = None
 
+    # The preview switches from the original to the converted PDF when processing finishes
+    headers = artifact_headers(
+        request, document, "preview", os.path.basename(preview_path),
+        immutable=document.status == "ready"
+    )
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
     if not os.path.exists(preview_path):
         raise HTTPException(status_code=404, detail="Preview file not found on server.")
 
-    return FileResponse(preview_path, media_type=media_type)
+    return ranged_file_response(request, preview_path, headers, media_type=media_type)
+
+def _has_hls(document: Document) -> bool:
+    """Whether the document has an HLS rendition, finished or in progress"""
+    return bool(document.hls_path) and not is_hls_failed(document.artifact_key or document.id)
+
+@router.get("/documents/{document_id}/hls/{hls_file:path}")
+async def get_hls_file(document_id: str, hls_file: str, request: Request):
+    """Master/variant playlists and segments; playlists grow while the transcode is running"""
+    document = document_service.get_document(document_id)
+    if not document or not _has_hls(document):
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    file_path = _contained_path(os.path.dirname(document.hls_path), hls_file)
+    if not file_path:
+        raise HTTPException(status_code=404, detail="File not found")
+    if file_path.endswith(".m3u8"):
+        # Restarts a transcode whose worker died; no-op while it runs or once it is complete
+        start_hls_transcode(document.file_path, document.artifact_key or document.id)
+
+    if not os.path.exists(file_path):
+        if hls_file == HLS_MASTER_PLAYLIST:
+            # The master appears with the first segments; players should retry
+            raise HTTPException(status_code=404, detail="Transcode has not produced a playlist yet.",
+                                headers={"Retry-After": str(settings.HLS_SEGMENT_SECONDS)})
+        raise HTTPException(status_code=404, detail="File not found")
+
+    if file_path.endswith(".m3u8"):
+        return FileResponse(file_path, media_type="application/vnd.apple.mpegurl",
+                            headers={"cache-control": REVALIDATE})
+    # Segments are written once under a temporary name and never change afterwards
+    stat = os.stat(file_path)
+    headers = {"etag": make_etag(file_path, stat.st_size, stat.st_mtime_ns), "cache-control": IMMUTABLE}
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+    return FileResponse(file_path, media_type="video/mp2t", headers=headers)
+
+@router.get("/documents/{document_id}/storyboard/{storyboard_file}")
+async def get_storyboard_file(document_id: str, storyboard_file: str, request: Request):
+    """WebVTT thumbnail track and the sprite sheets its cues point into"""
+    document = document_service.get_document(document_id)
+    if not document or not document.storyboard_path:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    file_path = _contained_path(os.path.dirname(document.storyboard_path), storyboard_file)
+    if not file_path or not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    headers = artifact_headers(request, document, "storyboard", storyboard_file)
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+    media_type = "text/vtt" if file_path.endswith(".vtt") else "image/jpeg"
+    return FileResponse(file_path, media_type=media_type, headers=headers)
+
+@router.get("/documents/{document_id}/waveform")
+async def get_waveform(
+    document_id: str,
+    request: Request,
+    level: Optional[int] = Query(None, ge=0, description="Zoom level, 0 is the finest"),
+    format: str = Query("dat", description="dat (audiowaveform binary) or json")
+):
+    """
+    Min/max peak pairs of an audio document at one zoom level, for drawing the
+    waveform in the client. Without a level, lists the available levels.
+    """
+    document = document_service.get_document(document_id)
+    if not document or not document.waveform_path:
+        raise HTTPException(status_code=404, detail="No waveform for this document.")
+
+    manifest = waveform.load_manifest(document.waveform_path)
+    if not manifest:
+        raise HTTPException(status_code=404, detail="Waveform file not found on server.")
+
+    if level is None:
+        return cached_json_response(request, {
+            **manifest,
+            "levels": [
+                {**info, "url": versioned_url(document, f"/api/documents/{document_id}/waveform?level={i}")}
+                for i, info in enumerate(manifest["levels"])
+            ]
+        })
+    if level >= len(manifest["levels"]):
+        raise HTTPException(status_code=400, detail="Invalid waveform level requested.")
+    if format not in ("dat", "json"):
+        raise HTTPException(status_code=400, detail=f"Unsupported waveform format: {format}")
+
+    headers = artifact_headers(request, document, "waveform", level, format)
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
+    dat_path = waveform.level_file(document.waveform_path, level)
+    if not os.path.exists(dat_path):
+        raise HTTPException(status_code=404, detail="Waveform file not found on server.")
+    if format == "json":
+        # Long recordings have millions of peaks; listing and serializing them would stall the loop
+        body = await asyncio.to_thread(waveform.level_json, dat_path)
+        return Response(body, media_type="application/json", headers=headers)
+    return FileResponse(dat_path, media_type="application/octet-stream", headers=headers)
+
+@router.get("/documents/{document_id}/lines")
+async def get_text_lines(
+    document_id: str,
+    request: Request,
+    start: int = Query(0, ge=0, description="First line, 0-based"),
+    count: int = Query(200, ge=1, description="Number of lines")
+):
+    """A window of a plain text document's lines, for virtual scrolling through files of any size"""
+    document = document_service.get_document(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if not document.line_index_path:
+        raise HTTPException(status_code=404, detail="No line index for this document.")
+
+    count = min(count, settings.TEXT_LINES_MAX_COUNT)
+    headers = artifact_headers(request, document, "lines", start, count)
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
+    manifest = line_index.load_manifest(document.line_index_path)
+    if not manifest or not os.path.exists(document.file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    window = await asyncio.to_thread(
+        line_index.read_lines, document.file_path, document.line_index_path, manifest, start, count
+    )
+    body = {
+        "start": start,
+        "count": len(window["lines"]),
+        "totalLines": manifest["line_count"],
+        "encoding": manifest["encoding"],
+        "truncated": window["truncated"],
+        "lines": window["lines"],
+    }
+    return Response(json.dumps(body, separators=(",", ":")), media_type="application/json", headers=headers)
+
+@router.get("/documents/{document_id}/highlight")
+async def get_highlight_manifest(document_id: str, request: Request):
+    """Chunk count, language and stylesheet of a document's highlighted code or rendered Markdown"""
+    document = document_service.get_document(document_id)
+    if not document or not document.highlight_path:
+        raise HTTPException(status_code=404, detail="No highlighted rendering for this document.")
+
+    manifest = highlighting.load_manifest(document.highlight_path)
+    if not manifest:
+        raise HTTPException(status_code=404, detail="File not found")
+    return cached_json_response(request, {
+        **manifest,
+        "chunkUrlTemplate": versioned_url(document, f"/api/documents/{document_id}/highlight/{{chunk}}")
+    })
+
+@router.get("/documents/{document_id}/highlight/{chunk}")
+async def get_highlight_chunk(document_id: str, chunk: int, request: Request):
+    """One chunk: HTML lines of highlighted code, or the HTML of a run of Markdown blocks"""
+    document = document_service.get_document(document_id)
+    if not document or not document.highlight_path:
+        raise HTTPException(status_code=404, detail="No highlighted rendering for this document.")
+
+    headers = artifact_headers(request, document, "highlight", chunk)
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
+    chunk_path = highlighting.chunk_file(document.highlight_path, chunk)
+    if chunk < 0 or not os.path.exists(chunk_path):
+        raise HTTPException(status_code=404, detail="Chunk not found")
+    return FileResponse(chunk_path, media_type="application/json", headers=headers)
+
+def _contained_path(root: str, relative_path: str) -> Optional[str]:
+    """Resolve relative_path under root, or None if it escapes it"""
+    root = os.path.realpath(root)
+    file_path = os.path.realpath(os.path.join(root, relative_path))
+    return file_path if file_path.startswith(root + os.sep) else None
+
+async def run_until_disconnected(request: Request, coro):
+    """Await coro, cancelling it (and any external tool it runs) if the client goes away."""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
+
+PAGE_MEDIA_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "svg": "image/svg+xml",
+}
 
 @router.get("/documents/{document_id}/page/{page_number}")
-async def get_document_page(document_id: str, page_number: int):
+async def get_document_page(
+    document_id: str,
+    page_number: int,
+    request: Request,
+    width: Optional[int] = Query(None, ge=16, description="Target width in CSS pixels"),
+    dpr: float = Query(1.0, gt=0, le=4, description="Device pixel ratio"),
+    format: Optional[str] = Query(None, description="png, jpeg, webp, avif or svg"),
+    quality: Optional[int] = Query(None, ge=1, le=100, description="Lossy encoder quality")
+):
     document = document_service.get_document(document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -139,55 +445,252 @@ async def get_document_page(document_id: str, page_number: int):
     if page_number < 1 or page_number > document.total_pages:
         raise HTTPException(status_code=400, detail="Invalid page number requested.")
 
-    page_image_path = await document_service.get_page_image(document_id, page_number)
+    default_rendition = width is None and format is None and dpr == 1.0 and quality is None
+    image_format = (format or "png").lower()
+    if image_format == "jpg":
+        image_format = "jpeg"
+    if image_format not in render_backends.supported_image_formats() + ["svg"]:
+        raise HTTPException(status_code=400, detail=f"Unsupported page format: {format}")
+
+    # Validators depend only on the content and parameters, so repeat views skip rendering
+    headers = artifact_headers(request, document, "page", page_number, width, dpr, image_format, quality)
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
+    if default_rendition:
+        # Default rendition, shared with the prefetching page window cache
+        page_image_coro = document_service.get_page_image(document_id, page_number)
+    else:
+        page_image_coro = document_service.get_page_rendition(
+            document_id, page_number, width or settings.PAGE_RENDER_WIDTH, dpr, image_format, quality
+        )
+
+    page_image_path = await run_until_disconnected(request, page_image_coro)
     if not page_image_path or not os.path.exists(page_image_path):
         raise HTTPException(status_code=404, detail="Page image could not be found or generated.")
 
-    return FileResponse(page_image_path, media_type="image/png")
+    return FileResponse(page_image_path, media_type=PAGE_MEDIA_TYPES[image_format], headers=headers)
+
+@router.get("/documents/{document_id}/page/{page_number}/text")
+async def get_page_text(document_id: str, page_number: int, request: Request):
+    """Text layer of a page: its words and their boxes in points (origin top-left), without rendering"""
+    document = document_service.get_document(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if not document.text_layer_path:
+        raise HTTPException(status_code=404, detail="No text layer for this document.")
+
+    headers = artifact_headers(request, document, "text", page_number)
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
+    layer = await asyncio.to_thread(text_layer.open_text_layer, document.text_layer_path)
+    if page_number < 1 or page_number > layer.page_count:
+        raise HTTPException(status_code=400, detail="Invalid page number requested.")
+    return Response(json.dumps(layer.page(page_number), separators=(",", ":")),
+                    media_type="application/json", headers=headers)
+
+@router.get("/documents/{document_id}/find")
+async def find_in_document(
+    document_id: str,
+    request: Request,
+    q: str = Query(..., min_length=1, description="Text to find, case-insensitive")
+):
+    """Pages containing q, with one highlight rectangle per word of every match"""
+    document = document_service.get_document(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if not document.text_layer_path:
+        raise HTTPException(status_code=404, detail="No text layer for this document.")
+
+    headers = artifact_headers(request, document, "find", q)
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
+    layer = await asyncio.to_thread(text_layer.open_text_layer, document.text_layer_path)
+    result = await asyncio.to_thread(layer.find, q, settings.FIND_MAX_MATCHES)
+    return Response(json.dumps({"query": q, **result}, separators=(",", ":")),
+                    media_type="application/json", headers=headers)
+
+@router.get("/documents/{document_id}/page/{page_number}/tiles")
+async def get_page_tile_manifest(document_id: str, page_number: int, request: Request):
+    """Deep Zoom (DZI) descriptor of a page's tile pyramid, in the JSON form OpenSeadragon accepts"""
+    document = document_service.get_document(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    if page_number < 1 or page_number > document.total_pages:
+        raise HTTPException(status_code=400, detail="Invalid page number requested.")
+
+    manifest = await tile_service.get_manifest(document_id, page_number)
+    if not manifest:
+        raise HTTPException(status_code=404, detail="Page tiles are not available for this document.")
+
+    return cached_json_response(request, {
+        "Image": {
+            "xmlns": "http://schemas.microsoft.com/deepzoom/2008",
+            "Url": f"/api/documents/{document_id}/page/{page_number}/tiles/",
+            "Format": manifest["format"],
+            "Overlap": str(manifest["overlap"]),
+            "TileSize": str(manifest["tileSize"]),
+            "Size": {"Width": str(manifest["width"]), "Height": str(manifest["height"])}
+        },
+        **manifest
+    })
+
+@router.get("/documents/{document_id}/page/{page_number}/tiles/{level}/{tile}")
+async def get_page_tile(document_id: str, page_number: int, level: int, tile: str, request: Request):
+    """One tile, addressed as {x}_{y} with an optional .png/.jpeg/.webp/.avif extension"""
+    document = document_service.get_document(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    if page_number < 1 or page_number > document.total_pages:
+        raise HTTPException(status_code=400, detail="Invalid page number requested.")
+
+    name, _, extension = tile.partition(".")
+    image_format = {"jpg": "jpeg"}.get(extension.lower(), extension.lower()) or tile_service.default_format()
+    if image_format not in render_backends.supported_image_formats():
+        raise HTTPException(status_code=400, detail=f"Unsupported tile format: {extension}")
+    try:
+        x, y = (int(part) for part in name.split("_"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Tiles are addressed as {x}_{y}.")
+
+    headers = artifact_headers(request, document, "tile", page_number, level, x, y, image_format)
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
+    try:
+        tile_path = await run_until_disconnected(
+            request, tile_service.get_tile(document_id, page_number, level, x, y, image_format)
+        )
+    except TileOutOfRangeError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if not tile_path:
+        raise HTTPException(status_code=404, detail="Tile could not be generated.")
+
+    return FileResponse(tile_path, media_type=PAGE_MEDIA_TYPES[image_format], headers=headers)
 
 @router.get("/documents/{document_id}/download")
-async def download_document(document_id: str):
+async def download_document(document_id: str, request: Request):
     document = document_service.get_document(document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
+    headers = artifact_headers(request, document, "download")
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
     if not os.path.exists(document.file_path):
         raise HTTPException(status_code=404, detail="File not found")
 
-    return FileResponse(
-        path=document.file_path,
-        filename=document.original_name,
-        media_type=document.file_type or 'application/octet-stream'
+    return ranged_file_response(
+        request, document.file_path, headers,
+        media_type=document.file_type or 'application/octet-stream',
+        filename=document.original_name
     )
 
 @router.get("/documents/{document_id}/metadata")
-async def get_document_metadata(document_id: str):
+async def get_document_metadata(document_id: str, request: Request):
     document = document_service.get_document(document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
-    return document.metadata
+    # Metadata is filled in by the processing job, so it is revalidated rather than immutable
+    return cached_json_response(request, document.metadata)
 
 @router.get("/documents/{document_id}/list_files")
-async def list_archive_files(document_id: str):
-    """Endpoint to list files inside an archive."""
+async def list_archive_files(
+    document_id: str,
+    request: Request,
+    path: str = Query("", description="Directory to list, relative to the archive root"),
+    recursive: bool = Query(True, description="Everything below path instead of its direct children"),
+    prefix: str = Query("", description="Only paths (relative to path) starting with this"),
+    pattern: Optional[str] = Query(None, description="Only paths (relative to path) matching this glob"),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1)
+):
+    """One page of the files inside an archive, read from the member index built at ingest."""
     document = document_service.get_document(document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
+    if not document.member_index_path:
+        raise HTTPException(status_code=400, detail="This document is not an archive.")
+
+    limit = min(limit or settings.ARCHIVE_LIST_PAGE_SIZE, settings.ARCHIVE_LIST_MAX_PAGE_SIZE)
+    headers = artifact_headers(request, document, "list", path, recursive, prefix, pattern, offset, limit)
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
+    index = await asyncio.to_thread(archive_access.open_archive_index, document.member_index_path)
+    if not index:
+        raise HTTPException(status_code=404, detail="No member index for this document.")
+    try:
+        listing = await asyncio.to_thread(index.list, path, recursive, prefix, pattern, offset, limit)
+    except archive_access.MemberNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    # file_list keeps the flat list of paths older clients read
+    body = {"file_list": [entry["path"] for entry in listing["entries"]], **listing}
+    return Response(json.dumps(body, separators=(",", ":")), media_type="application/json", headers=headers)
+
+@router.get("/documents/{document_id}/members/{member_path:path}")
+async def get_archive_member(document_id: str, member_path: str, request: Request):
+    """One file inside an archive, streamed without extracting the rest of the archive"""
+    document = document_service.get_document(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if not document.member_index_path:
+        raise HTTPException(status_code=404, detail="No member index for this document.")
+
+    headers = artifact_headers(request, document, "member", member_path.strip("/"))
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
 
-    # Ensure this is an archive file type before proceeding
-    file_ext = Path(document.file_path).suffix.lower()
-    handler = HandlerRegistry.get_handler(file_ext)
-    
-    # A bit of a hacky way to check if it's an ArchiveHandler
-    if "archive_handler" not in handler.__class__.__module__:
-         raise HTTPException(status_code=400, detail="This document is not an archive.")
+    try:
+        # Members of nested archives are read from the nested archive, extracted once
+        archive_path, archive_key, index, member, _ = await archive_member_service.resolve(document, member_path)
+        chunks, size = await archive_access.open_member(archive_path, archive_key, index, member)
+    except archive_access.ArchiveBudgetExceededError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except archive_access.MemberNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    name = os.path.basename(member["name"].rstrip("/"))
+    headers["content-length"] = str(size)
+    headers["content-disposition"] = f"inline; filename*=utf-8''{quote(name)}"
+    media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+@router.get("/documents/{document_id}/open/{member_path:path}")
+async def open_archive_member(document_id: str, member_path: str):
+    """
+    An archive member (in nested archives too) as a document of its own. The
+    returned id works with the page, tile, text and download endpoints.
+    """
+    document = document_service.get_document(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if not document.member_index_path:
+        raise HTTPException(status_code=400, detail="This document is not an archive.")
 
     try:
-        file_list = await handler.list_archive_contents(document.file_path)
-        return {"file_list": file_list}
+        virtual = await archive_member_service.open_document(document, member_path)
+    except archive_access.MemberNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except archive_access.ArchiveBudgetExceededError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
-        print(f"Error listing archive contents for {document_id}: {e}")
-        raise HTTPException(status_code=500, detail="Failed to list archive contents.")
+        print(f"Error opening {member_path} of {document_id}: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Failed to open archive member.")
+    return await get_document(virtual.id)
 
 @router.post("/documents/{document_id}/annotations")
 async def create_annotation(document_id: str, annotation_data: dict):
@@ -282,7 +785,9 @@ async def organize_pdf(document_id: str, operations: OrganizePayload):
             writer.write(out_f)
 
         # Process the new PDF for metadata/thumbnails as usual
-        processed_info = await document_service.process_document(new_file_path, new_doc_id)
+        content_hash = await asyncio.to_thread(hash_file, new_file_path)
+        artifact_key = document_service.get_artifact_key(content_hash, new_file_path)
+        processed_info = await document_service.process_document(new_file_path, artifact_key)
         metadata = await metadata_service.extract_metadata(new_file_path)
 
         # Register the new document (in-memory DB, or update for your DB solution)
@@ -293,6 +798,8 @@ async def organize_pdf(document_id: str, operations: OrganizePayload):
             file_type="application/pdf",
             size=Path(new_file_path).stat().st_size,
             file_path=new_file_path,
+            content_hash=content_hash,
+            artifact_key=artifact_key,
             converted_path=processed_info.get("converted_path"),
             thumbnail_path=processed_info.get("thumbnail_path"),
             total_pages=processed_info.get("total_pages", page_count),
@@ -302,6 +809,7 @@ async def organize_pdf(document_id: str, operations: OrganizePayload):
             updated_at=datetime.now(),
         )
         document_service.store_document(new_doc)
+        await search_service.index_document(new_doc, processed_info)
 
         # Return the new doc's core info for frontend update/redirect
         return {
@@ -327,3 +835,12 @@ async def organize_pdf(document_id: str, operations: OrganizePayload):
 @router.get("/health")
 async def health_check():
     return {"status": "healthy", "message": "Document Viewer API is running"}
+
+@router.get("/health/cache")
+async def render_cache_stats():
+    return page_cache.stats()
+
+@router.get("/health/commands")
+async def command_scheduler_stats():
+    """Running and queued external tool processes per tool and priority."""
+    return get_scheduler_stats()
@@ -0,0 +1,82 @@
+# app.py
+# The FastAPI application, served through main.py
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.middleware.cors import CORSMiddleware
+import os
+
+from api.documents import router as documents_router, job_service, document_service, search_service
+from config import settings
+from core.utils.office_pool import office_pool
+from core.utils.cache_manager import page_cache
+from core.utils.http_cache import CachedStaticFiles, IMMUTABLE, REVALIDATE
+from core.utils.video_streaming import stop_transcodes
+from core.utils.highlighting import stop_highlighting
+from core.utils.render_backends import stop_render_backends
+from services.artifact_store import ArtifactStore
+
+app = FastAPI(title="Document Viewer API", version="1.0.0")
+
+UPLOAD_PATH = "/api/documents/upload"
+
+
+# Registered before CORSMiddleware so that its responses still carry the CORS headers
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """
+    Refuse uploads whose Content-Length is too large, before the multipart
+    body is parsed and spooled to disk. Chunked uploads carry no length and
+    pass through; the ingest enforces the exact limit on every upload.
+    """
+    if request.method == "POST" and request.url.path == UPLOAD_PATH:
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > settings.MAX_FILE_SIZE + settings.UPLOAD_FORM_OVERHEAD:
+            return JSONResponse(
+                {"detail": f"File exceeds maximum size of {settings.MAX_FILE_SIZE} bytes."}, status_code=413
+            )
+    return await call_next(request)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[
+        "http://localhost:5173", "http://localhost:3000", "http://localhost:8081",
+        "http://localhost:8000", "http://localhost:8080", "http://localhost:8001",
+        "https://192.168.0.93:8081", "https://192.168.0.93:8001", "https://192.168.0.93:8080",
+        "https://docviewer-dev.dmacq.app"
+    ],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Uploads are named by document id and thumbnails by content hash, so neither changes in place.
+# Artifact directories also hold files rewritten in place (manifests, live HLS playlists), so they
+# revalidate; the API endpoints send immutable headers for versioned URLs.
+app.mount(f"/{settings.UPLOAD_DIR}", CachedStaticFiles(directory=settings.UPLOAD_DIR, cache_control=IMMUTABLE), name="uploads")
+app.mount(
+    f"/{settings.CONVERTED_DIR}",
+    CachedStaticFiles(directory=settings.CONVERTED_DIR, cache_control=REVALIDATE, hidden_names=(ArtifactStore.MANIFEST_NAME,)),
+    name="converted"
+)
+app.mount(f"/{settings.THUMBNAILS_DIR}", CachedStaticFiles(directory=settings.THUMBNAILS_DIR, cache_control=IMMUTABLE), name="thumbnails")
+
+app.include_router(documents_router, prefix="/api", tags=["Documents"])
+
+@app.on_event("startup")
+async def startup_event():
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    os.makedirs(settings.CONVERTED_DIR, exist_ok=True)
+    os.makedirs(settings.THUMBNAILS_DIR, exist_ok=True)
+    await office_pool.start()
+    await page_cache.start()
+    await job_service.start()
+    await search_service.prune_documents(document_service.documents)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_service.stop()
+    await stop_transcodes()
+    stop_highlighting()
+    stop_render_backends()
+    await page_cache.stop()
+    await office_pool.stop()
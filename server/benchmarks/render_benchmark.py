@@ -0,0 +1,73 @@
+# benchmarks/render_benchmark.py
+"""
+Compare the pdftoppm and pdfium render backends on one PDF.
+
+    cd server && python -m benchmarks.render_benchmark path/to/file.pdf [--pages 20] [--concurrency 4]
+
+Reports the time to first page (cold and warm handle), throughput for a
+sequential read in render windows, and throughput with concurrent readers.
+"""
+import sys
+import time
+import asyncio
+import argparse
+
+from config import settings
+from core.utils import render_backends
+
+
+async def _time(coro) -> float:
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+
+async def bench_backend(backend: render_backends.RenderBackend, pdf_path: str, pages: int, concurrency: int):
+    width = settings.PAGE_RENDER_WIDTH
+    window = settings.PAGE_RENDER_WINDOW
+    page_count = min(pages, await backend.get_page_count(pdf_path))
+    if page_count == 0:
+        print(f"{backend.name}: could not read {pdf_path}")
+        return
+
+    first_page = await _time(backend.render_pages(pdf_path, [1], width))
+    warm_page = await _time(backend.render_pages(pdf_path, [1], width))
+
+    async def sequential():
+        for start in range(1, page_count + 1, window):
+            await backend.render_pages(pdf_path, list(range(start, min(start + window, page_count + 1))), width)
+
+    sequential_time = await _time(sequential())
+
+    async def reader(offset: int):
+        for page in range(1 + offset, page_count + 1, concurrency):
+            await backend.render_pages(pdf_path, [page], width)
+
+    concurrent_time = await _time(asyncio.gather(*(reader(i) for i in range(concurrency))))
+
+    print(f"{backend.name}:")
+    print(f"  first page:        {first_page * 1000:8.1f} ms")
+    print(f"  first page (warm): {warm_page * 1000:8.1f} ms")
+    print(f"  sequential:        {page_count / sequential_time:8.1f} pages/s ({window}-page windows)")
+    print(f"  concurrent:        {page_count / concurrent_time:8.1f} pages/s ({concurrency} readers)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf")
+    parser.add_argument("--pages", type=int, default=20, help="Pages to render per run")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    backends = [render_backends.PdftoppmBackend()]
+    if render_backends.pdfium is not None:
+        backends.append(render_backends.PdfiumRenderBackend())
+    else:
+        print("pypdfium2 is not installed; only pdftoppm is measured", file=sys.stderr)
+
+    for backend in backends:
+        await bench_backend(backend, args.pdf, args.pages, args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import ClassVar , Dict
+from typing import ClassVar , Dict, List, Any
 
 
 class Settings(BaseSettings):
@@ -10,10 +10,130 @@ class Settings(BaseSettings):
 
         # File upload settings
         MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
+        UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1MB per read/write during ingest
+        UPLOAD_FORM_OVERHEAD: int = 64 * 1024  # Multipart framing allowed on top of MAX_FILE_SIZE
         UPLOAD_DIR: str = "uploads"
         CONVERTED_DIR: str = "converted"
         THUMBNAILS_DIR: str = "thumbnails"
 
+        # Background processing
+        PROCESSING_WORKERS: int = 2  # Documents processed concurrently
+        PROCESSING_QUEUE_SIZE: int = 100  # Pending jobs before uploads are refused
+        JOB_RETENTION: int = 3600  # Seconds a finished job stays available to /jobs
+        JOB_HISTORY_SIZE: int = 1000  # Finished jobs kept at most
+
+        # LibreOffice conversion pool (OFFICE_POOL_SIZE = 0 disables it)
+        OFFICE_POOL_SIZE: int = max(1, (os.cpu_count() or 2) // 2)
+        OFFICE_POOL_PYTHON: str = "/usr/bin/python3"  # Interpreter with python3-uno and unoserver
+        OFFICE_POOL_MAX_JOBS: int = 200  # Conversions before an instance is recycled
+        OFFICE_POOL_HEALTH_INTERVAL: int = 30  # Seconds between idle health checks
+        OFFICE_POOL_STARTUP_TIMEOUT: int = 60
+        OFFICE_POOL_ACQUIRE_TIMEOUT: int = 30  # Wait for an idle instance before falling back
+        OFFICE_CONVERSION_TIMEOUT: int = 180
+
+        # Maximum concurrent processes per external tool (see core/utils/command_utils.py)
+        TOOL_CONCURRENCY: Dict[str, int] = {
+            "pdftoppm": os.cpu_count() or 2,
+            "pdfium": os.cpu_count() or 2,  # Worker processes of the pdfium render backend
+            "libreoffice": 2,
+            "ffmpeg": 2,
+            "ffprobe": 4,
+            "ffmpeg-hls": 1,  # Long HLS transcodes, kept off the ffmpeg slots of short calls
+            "convert": 4,
+            "7z": 2,
+            "qpdf": 2,
+        }
+        # Per-tool resource limits for child processes: "cpu" seconds and "memory" bytes (address space)
+        TOOL_RLIMITS: Dict[str, Dict[str, int]] = {
+            "pdftoppm": {"cpu": 120, "memory": 2 * 1024 * 1024 * 1024},
+            "convert": {"cpu": 120, "memory": 2 * 1024 * 1024 * 1024},
+            "ffmpeg": {"memory": 4 * 1024 * 1024 * 1024},
+            "ffmpeg-hls": {"memory": 4 * 1024 * 1024 * 1024},
+        }
+        PROCESS_KILL_GRACE: int = 5  # Seconds between SIGTERM and SIGKILL
+        DISCONNECT_POLL_INTERVAL: float = 0.5  # Seconds between client disconnect checks
+
+        # Page rendering
+        PAGE_RENDER_WINDOW: int = 3  # Pages rendered per backend call when a page is requested
+        PAGE_RENDER_WINDOW_MAX: int = 12  # Upper bound while the viewer scrolls sequentially
+        PAGE_RENDER_WIDTH: int = 1200
+        RENDER_BACKEND: str = "pdfium"  # "pdfium" (worker processes, needs pypdfium2) or "pdftoppm"
+        RENDER_TIMEOUT: int = 30  # Seconds a pdfium call may take before its worker is killed
+        RENDER_HANDLE_CACHE_SIZE: int = 32  # Open PDF documents kept by each pdfium worker process
+        # Page renditions (/page/{n}?width=&dpr=&format=&quality=)
+        PAGE_RENDITION_MAX_WIDTH: int = 6000  # Pixels, after applying the device pixel ratio
+        PAGE_RENDITION_WIDTH_STEP: int = 64  # Widths are rounded up to a multiple so renditions are shared
+        PAGE_RENDITION_DEFAULT_QUALITY: int = 80
+        # Deep-zoom tiles (/page/{n}/tiles)
+        TILE_SIZE: int = 256
+        TILE_OVERLAP: int = 1
+        TILE_FORMAT: str = "webp"  # Falls back to png if Pillow cannot encode it
+        TILE_QUALITY: int = 80
+        TILE_MAX_SCALE: float = 4.0  # Pixels per PDF point at the deepest level (288 dpi)
+        TILE_MAX_DIMENSION: int = 32768  # Cap on the deepest level's longest side
+        TILE_PAGE_SIZE_CACHE_SIZE: int = 10000  # Page sizes remembered for tile geometry
+
+        # Render cache budget for converted/pages and thumbnails (see core/utils/cache_manager.py)
+        CACHE_MAX_BYTES: int = 10 * 1024 * 1024 * 1024  # 0 disables eviction
+        CACHE_PINNED_MAX_BYTES: int = 1024 * 1024 * 1024  # Separate budget of document thumbnails
+        CACHE_LOW_WATERMARK: float = 0.9  # Evict down to this fraction of the budget
+        CACHE_EVICTION_INTERVAL: int = 60  # Seconds between eviction checks and index flushes
+        CACHE_FREQUENCY_BONUS: int = 3600  # Seconds of recency credited per doubling of hits
+        CACHE_MIN_AGE: int = 60  # Files written or read more recently are never evicted
+        # HLS renditions of videos browsers cannot play natively (see core/utils/video_streaming.py)
+        HLS_LADDER: List[Dict[str, Any]] = [
+            {"height": 360, "video_bitrate": "800k", "audio_bitrate": "96k"},
+            {"height": 720, "video_bitrate": "2800k", "audio_bitrate": "128k"},
+            {"height": 1080, "video_bitrate": "5000k", "audio_bitrate": "192k"},
+        ]
+        HLS_SEGMENT_SECONDS: int = 4
+        HLS_TRANSCODE_TIMEOUT: int = 4 * 3600
+        # Scrub-preview sprite sheets of videos (see core/utils/storyboard.py)
+        STORYBOARD_INTERVAL: float = 5.0  # Seconds between thumbnails
+        STORYBOARD_MAX_FRAMES: int = 600  # Longer videos get a wider interval
+        STORYBOARD_THUMB_WIDTH: int = 160
+        STORYBOARD_COLUMNS: int = 10
+        STORYBOARD_ROWS: int = 10
+        STORYBOARD_TIMEOUT: int = 3600
+        FASTSTART_REMUX_TIMEOUT: int = 3600  # Copy-only, so bounded by disk throughput
+        STREAM_CHUNK_SIZE: int = 256 * 1024  # Bytes per read when serving a byte range
+        # Audio waveform peaks (/waveform?level=, see core/utils/waveform.py)
+        WAVEFORM_SAMPLE_RATE: int = 8000  # Audio is decoded to mono at this rate before peak detection
+        WAVEFORM_LEVELS: List[int] = [64, 256, 1024, 4096]  # Samples per pixel, finest first
+        WAVEFORM_BITS: int = 8  # 8 or 16 bits per min/max value
+        WAVEFORM_TIMEOUT: int = 1800
+        # Windowed text preview (/lines?start=&count=, see core/utils/line_index.py)
+        TEXT_LINES_MAX_COUNT: int = 5000  # Lines per request
+        TEXT_LINES_MAX_BYTES: int = 4 * 1024 * 1024  # Bytes read per request; longer windows are truncated
+        # Server-side code highlighting and Markdown rendering (see core/utils/highlighting.py)
+        HIGHLIGHT_WORKERS: int = 2  # Worker processes
+        HIGHLIGHT_CHUNK_LINES: int = 500  # Source lines per served chunk
+        HIGHLIGHT_MAX_BYTES: int = 5 * 1024 * 1024  # Larger files are previewed as plain text
+        HIGHLIGHT_STYLE: str = "default"  # Pygments style of the served stylesheet
+        # Full-text search (/search?q=, see services/search_service.py)
+        SEARCH_INDEX_PATH: str = "index/search.db"  # Outside CONVERTED_DIR, which is served statically
+        SEARCH_INDEX_BATCH_PAGES: int = 500  # Pages inserted per transaction
+        SEARCH_TEXT_PAGE_LINES: int = 200  # Plain text is indexed in pages of this many lines
+        SEARCH_MAX_TEXT_BYTES: int = 64 * 1024 * 1024  # Plain text beyond this is not indexed
+        SEARCH_SNIPPET_TOKENS: int = 16
+        SEARCH_EXTRACT_BATCH_PAGES: int = 50  # PDF pages per pdftotext run
+        SEARCH_EXTRACT_TIMEOUT: int = 300
+        # Per-page text layer with word boxes (/find?q=, /page/{n}/text, see core/utils/text_layer.py)
+        TEXT_LAYER_TIMEOUT: int = 600
+        TEXT_LAYER_CACHE_SIZE: int = 16  # Documents whose layer stays loaded for find requests
+        FIND_MAX_MATCHES: int = 1000  # Matches returned per /find request
+        # Archive members served on demand (/members/{path}, see core/utils/archive_access.py)
+        ARCHIVE_EXTRACT_BUDGET: int = 2 * 1024 * 1024 * 1024  # Bytes written to disk per archive
+        ARCHIVE_MEMBER_MAX_BYTES: int = 1024 * 1024 * 1024  # Larger members are refused
+        ARCHIVE_EXTRACT_TIMEOUT: int = 600
+        # Member index listing (/list_files, see core/utils/archive_access.py)
+        ARCHIVE_INDEX_CACHE_SIZE: int = 16  # Archives whose index stays loaded
+        ARCHIVE_LIST_PAGE_SIZE: int = 1000  # Default entries per /list_files page
+        ARCHIVE_LIST_MAX_PAGE_SIZE: int = 10000
+
+        # Part of every artifact ETag and ?v= URL version; bump when rendering output changes
+        RENDER_CACHE_VERSION: str = "1"
+
 
         HANDLER_REGISTRY: Dict[str, str] = {
             # PDF
@@ -123,6 +243,12 @@ class Settings(BaseSettings):
             '.webm': 'core.file_handlers.video_handler.VideoHandler',
             '.flv': 'core.file_handlers.video_handler.VideoHandler',
             '.wmv': 'core.file_handlers.video_handler.VideoHandler',
+            '.mts': 'core.file_handlers.video_handler.VideoHandler',
+            '.m2ts': 'core.file_handlers.video_handler.VideoHandler',
+            '.vob': 'core.file_handlers.video_handler.VideoHandler',
+            '.mpg': 'core.file_handlers.video_handler.VideoHandler',
+            '.mpeg': 'core.file_handlers.video_handler.VideoHandler',
+            '.3gp': 'core.file_handlers.video_handler.VideoHandler',
 
             # Audio
             '.mp3': 'core.file_handlers.audio_handler.AudioHandler',
@@ -195,6 +321,7 @@ class Settings(BaseSettings):
         '.mp3', '.wav', '.aac', '.m4a',
         #video
         '.mp4', '.mkv', '.mov', '.webm',
+        '.avi', '.wmv', '.flv', '.mts', '.m2ts', '.vob', '.mpg', '.mpeg', '.3gp',
                 # Ebooks
         '.lit', '.azw', '.azw3', '.fb2',
         # Comics
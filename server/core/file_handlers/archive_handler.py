@@ -1,36 +1,27 @@
 # core/file_handlers/archive_handler.py
 import os
-import zipfile
-import tarfile
-import rarfile
-import py7zr
 from pathlib import Path
 from typing import Dict, Any, Optional, List
-import shutil
 import logging
 
 from .base_handler import FileHandler
 from models.document import DocumentMetadata
 from core.utils.file_utils import format_file_size
-from config import settings
-from core.utils import command_utils
+from core.utils import archive_access
 from datetime import datetime
 
 
 class ArchiveHandler(FileHandler):
     async def process(self, file_path: str, doc_id: str) -> Dict[str, Any]:
-        """Process archive file - extract contents and create listing"""
-        extract_dir = os.path.join(settings.CONVERTED_DIR, doc_id, "extracted")
-        os.makedirs(extract_dir, exist_ok=True)
-
-        extracted = await self.extract_archive(file_path, extract_dir)
-        file_list = await self.list_archive_contents(file_path)
-
+        """
+        Process archive file - record the member index only. Members are read
+        from the archive when they are requested (see core/utils/archive_access.py).
+        """
+        member_index_path = await archive_access.build_member_index(file_path, doc_id)
         return {
             "total_pages": 1,
             "is_plain_text": False,
-            "extracted_path": extract_dir if extracted else None,
-            "file_list": file_list
+            "member_index_path": member_index_path
         }
 
     async def convert_to_pdf(self, file_path: str, doc_id: str) -> Optional[str]:
@@ -54,115 +45,33 @@ class ArchiveHandler(FileHandler):
         # In production, you would return a path to a generic archive icon
         return None
 
-    async def extract_archive(self, file_path: str, output_dir: str) -> bool:
-        """Extract archive contents to output directory"""
-        file_ext = Path(file_path).suffix.lower()
-
-        try:
-            if file_ext == '.zip':
-                with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                    zip_ref.extractall(output_dir)
-                return True
-
-            elif file_ext == '.tar':
-                with tarfile.open(file_path, 'r') as tar_ref:
-                    tar_ref.extractall(output_dir)
-                return True
-
-            elif file_ext == '.gz' or file_ext == '.tgz':
-                with tarfile.open(file_path, 'r:gz') as tar_ref:
-                    tar_ref.extractall(output_dir)
-                return True
-
-            elif file_ext == '.bz2' or file_ext == '.tbz2':
-                with tarfile.open(file_path, 'r:bz2') as tar_ref:
-                    tar_ref.extractall(output_dir)
-                return True
-
-            elif file_ext == '.rar':
-                with rarfile.RarFile(file_path, 'r') as rar_ref:
-                    rar_ref.extractall(output_dir)
-                return True
-
-            elif file_ext == '.xz':
-                with tarfile.open(file_path, 'r:xz') as tar_ref:
-                    tar_ref.extractall(output_dir)
-                return True
-
-            elif file_ext == '.7z':
-                with py7zr.SevenZipFile(file_path, mode='r') as zip_ref:
-                    zip_ref.extractall(output_dir)
-                return True
-
-            elif file_ext in ['.iso', '.dmg']:
-                cmd = ["7z", "x", f"-o{output_dir}", file_path, "-y"]
-                return_code, _, stderr = await command_utils.run_command(cmd)
-                if return_code != 0:
-                    print(f"Error extracting with 7z: {stderr}")
-                    return False
-                return True
-
-        except Exception as e:
-            print(f"Error extracting archive: {e}")
-            return False
-
-        return False
-
     async def list_archive_contents(self, file_path: str) -> List[str]:
-        """List files in archive without extracting"""
-        file_ext = Path(file_path).suffix.lower()
-        contents = []
-
+        """Paths of the files in an archive, listed without extracting"""
         try:
-            if file_ext == '.zip':
-                with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                    contents = zip_ref.namelist()
-            
-            elif file_ext == '.tar':
-                with tarfile.open(file_path, 'r:') as tar_ref:
-                    contents = tar_ref.getnames()
-
-            elif file_ext in ['.gz', '.tgz']:
-                with tarfile.open(file_path, 'r:gz') as tar_ref:
-                    contents = tar_ref.getnames()
-
-            elif file_ext in ['.bz2', '.tbz2']:
-                with tarfile.open(file_path, 'r:bz2') as tar_ref:
-                    contents = tar_ref.getnames()
-
-            elif file_ext == '.rar':
-                with rarfile.RarFile(file_path, 'r') as rar_ref:
-                    contents = rar_ref.namelist()
-
-            elif file_ext == '.xz':
-                with tarfile.open(file_path, 'r:xz') as tar_ref:
-                    contents = tar_ref.getnames()
-
-            elif file_ext == '.7z':
-                with py7zr.SevenZipFile(file_path, mode='r') as zip_ref:
-                    contents = zip_ref.getnames()
-
-            elif file_ext in ['.iso', '.dmg']:
-                cmd = ["7z", "l", file_path]
-                return_code, stdout, stderr = await command_utils.run_command(cmd)
-                if return_code == 0:
-                    # Complex parsing of 7z output might be needed here.
-                    # This is a simplified version.
-                    contents = [line for line in stdout.split('\n') if
-                                "Name" not in line and "----" not in line and line.strip()]
-                else:
-                    logging.error(f"Error listing with 7z: {stderr}")
-
+            members = await archive_access.list_members(file_path)
+            return [member[0] for member in members]
         except Exception as e:
             logging.error(f"Failed to list contents for {file_path}: {e}")
-
-        return contents
+            return []
 
     async def get_file_count(self, file_path: str) -> int:
         """Get number of files in archive"""
-        contents = await self.list_archive_contents(file_path)
-        return len(contents)
+        try:
+            return await archive_access.count_members(file_path)
+        except Exception as e:
+            logging.error(f"Failed to count files in {file_path}: {e}")
+            return 0
 
     async def get_page_as_image(self, source_path: str, page_number: int, doc_id: str) -> Optional[str]:
         """Archives do not have pages, so this method is not applicable."""
         return None
+
+    async def get_page_rendition(self, source_path: str, page_number: int, doc_id: str,
+                                 width: int, dpr: float = 1.0, image_format: str = "png",
+                                 quality: Optional[int] = None) -> Optional[str]:
+        """Archives do not have pages, so this method is not applicable."""
+        return None
+
+    async def get_page_pdf(self, source_path: str, doc_id: str) -> Optional[str]:
+        """Archives do not have pages, so this method is not applicable."""
+        return None
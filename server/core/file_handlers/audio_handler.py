@@ -1,6 +1,7 @@
 # core/file_handlers/audio_handler.py
 import os
 import json
+import asyncio
 import subprocess
 from pathlib import Path
 from typing import Dict, Any, Optional
@@ -8,18 +9,29 @@ from mutagen import File
 
 from .base_handler import FileHandler
 from models.document import DocumentMetadata
-from core.utils import command_utils
+from core.utils import command_utils, waveform
 from core.utils.file_utils import format_file_size
 from config import settings
 from datetime import datetime
 
 class AudioHandler(FileHandler):
     async def process(self, file_path: str, doc_id: str) -> Dict[str, Any]:
-        """Process audio file - generate thumbnail (waveform)"""
-        thumbnail_path = await self.generate_thumbnail(file_path, doc_id)
+        """
+        Process audio file - decode it once into multi-resolution waveform
+        peaks, and draw the thumbnail from those instead of decoding again.
+        """
+        waveform_path = await waveform.generate_waveform(file_path, doc_id)
+        thumbnail_path = None
+        if waveform_path:
+            thumbnail_path = await asyncio.to_thread(
+                waveform.render_thumbnail, waveform_path, os.path.join(settings.THUMBNAILS_DIR, f"{doc_id}_thumb.png")
+            )
+        if not thumbnail_path:
+            thumbnail_path = await self.generate_thumbnail(file_path, doc_id)
         return {
             "total_pages": 1,
             "thumbnail_path": thumbnail_path,
+            "waveform_path": waveform_path,
             "is_plain_text": False
         }
 
@@ -62,7 +74,7 @@ class AudioHandler(FileHandler):
             thumbnail_path
         ]
 
-        returncode, stdout, stderr = await command_utils.run_command(cmd)
+        returncode, stdout, stderr = await command_utils.run_command(cmd, priority=command_utils.Priority.BULK)
         if returncode == 0 and os.path.exists(thumbnail_path):
             return thumbnail_path
         return None
\ No newline at end of file
@@ -1,9 +1,19 @@
 # core/file_handlers/base_handler.py
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable, Awaitable, AsyncIterator, Tuple
 from models.document import DocumentMetadata
+from core.utils.text_extraction import pdf_page_texts
 
 class FileHandler(ABC):
+    # Set by the processing job to receive stage notifications from process()
+    stage_callback: Optional[Callable[[str], Awaitable[None]]] = None
+
+    async def report_stage(self, stage: str):
+        """Notify the processing job (if any) that a pipeline stage has finished"""
+        if self.stage_callback:
+            await self.stage_callback(stage)
+
     @abstractmethod
     async def process(self, file_path: str, doc_id: str) -> Dict[str, Any]:
         """
@@ -37,4 +47,38 @@ class FileHandler(ABC):
         Can be overridden by specific handlers for better performance
         """
         from services.conversion_service import ConversionService
-        return await ConversionService().get_page_as_image(source_path, page_number, doc_id)
\ No newline at end of file
+        return await ConversionService().get_page_as_image(source_path, page_number, doc_id)
+    async def get_page_rendition(self, source_path: str, page_number: int, doc_id: str,
+                                 width: int, dpr: float = 1.0, image_format: str = "png",
+                                 quality: Optional[int] = None) -> Optional[str]:
+        """
+        Get page rendered at a given width/pixel ratio in a given format
+        (default implementation using PDF conversion)
+        """
+        from services.conversion_service import ConversionService
+        return await ConversionService().get_page_rendition(
+            source_path, page_number, doc_id, width, dpr, image_format, quality
+        )
+
+    async def get_page_pdf(self, source_path: str, doc_id: str) -> Optional[str]:
+        """
+        Get the PDF that pages are rendered from (default implementation using PDF conversion)
+        Used for region rendering such as deep-zoom tiles
+        """
+        from services.conversion_service import ConversionService
+        return await ConversionService().ensure_pdf(source_path, doc_id)
+
+    async def iter_page_texts(self, file_path: str, processed_info: Dict[str, Any]) -> AsyncIterator[Tuple[int, str]]:
+        """
+        (page number, text) of every page, for the search index
+        (default implementation reading the PDF itself or the PDF it was converted to)
+        """
+        converted_path = processed_info.get("converted_path")
+        if converted_path and Path(converted_path).suffix.lower() == ".pdf":
+            pdf_path = converted_path
+        elif Path(file_path).suffix.lower() == ".pdf":
+            pdf_path = file_path
+        else:
+            return
+        async for page in pdf_page_texts(pdf_path):
+            yield page
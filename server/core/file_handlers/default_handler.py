@@ -4,7 +4,7 @@ from models.document import DocumentMetadata
 from datetime import datetime
 import os
 from core.utils.file_utils import format_file_size
-from core.utils.command_utils import run_command
+from core.utils.office_pool import convert_with_libreoffice
 from config import settings
 from typing import  Dict, Optional, Any
 from pathlib import Path
@@ -20,20 +20,8 @@ class DefaultHandler(FileHandler):
     async def convert_to_pdf(self, file_path: str, doc_id: str) -> Optional[str]:
         """Fallback conversion using LibreOffice"""
         output_dir = os.path.join(settings.CONVERTED_DIR, doc_id)
-        os.makedirs(output_dir, exist_ok=True)
         final_pdf_path = os.path.join(output_dir, f"{doc_id}.pdf")
-
-        cmd = ["libreoffice", "--headless", "--convert-to", "pdf",
-               "--outdir", output_dir, file_path]
-        returncode, stdout, stderr = await run_command(cmd)
-
-        if returncode == 0:
-            original_stem = Path(file_path).stem
-            generated_pdf = os.path.join(output_dir, f"{original_stem}.pdf")
-            if os.path.exists(generated_pdf):
-                os.rename(generated_pdf, final_pdf_path)
-            return final_pdf_path if os.path.exists(final_pdf_path) else None
-        return None
+        return await convert_with_libreoffice(file_path, output_dir, final_pdf_path)
 
     async def extract_metadata(self, file_path: str) -> DocumentMetadata:
         """Basic metadata extraction"""
@@ -62,7 +62,7 @@ class ImageHandler(FileHandler):
             thumbnail_path
         ]
 
-        returncode, stdout, stderr = await command_utils.run_command(cmd)
+        returncode, stdout, stderr = await command_utils.run_command(cmd, priority=command_utils.Priority.BULK)
         if returncode == 0 and os.path.exists(thumbnail_path):
             return thumbnail_path
 
@@ -6,7 +6,8 @@ import asyncio
 
 from .base_handler import FileHandler
 from models.document import DocumentMetadata
-from core.utils import command_utils
+from core.utils import render_backends
+from core.utils.office_pool import convert_with_libreoffice
 from core.utils.file_utils import format_file_size
 from config import settings
 from datetime import  datetime
@@ -16,7 +17,9 @@ class OfficeHandler(FileHandler):
         """Process office documents by converting to PDF"""
         converted_path = await self.convert_to_pdf(file_path, doc_id)
         total_pages = await self.get_page_count(converted_path) if converted_path else 1
+        await self.report_stage("converted")
         thumbnail_path = await self.generate_thumbnail(converted_path or file_path, doc_id)
+        await self.report_stage("thumbnailed")
 
         return {
             "total_pages": total_pages,
@@ -28,23 +31,8 @@ class OfficeHandler(FileHandler):
     async def convert_to_pdf(self, file_path: str, doc_id: str) -> Optional[str]:
         """Convert office document to PDF using LibreOffice"""
         output_dir = os.path.join(settings.CONVERTED_DIR, doc_id)
-        os.makedirs(output_dir, exist_ok=True)
         final_pdf_path = os.path.join(output_dir, f"{doc_id}.pdf")
-
-        cmd = [
-            "libreoffice", "--headless", "--convert-to", "pdf",
-            "--outdir", output_dir, file_path
-        ]
-
-        returncode, stdout, stderr = await command_utils.run_command(cmd)
-
-        if returncode == 0:
-            original_stem = Path(file_path).stem
-            generated_pdf = os.path.join(output_dir, f"{original_stem}.pdf")
-            if os.path.exists(generated_pdf):
-                os.rename(generated_pdf, final_pdf_path)
-            return final_pdf_path if os.path.exists(final_pdf_path) else None
-        return None
+        return await convert_with_libreoffice(file_path, output_dir, final_pdf_path)
 
     async def extract_metadata(self, file_path: str) -> DocumentMetadata:
         """Basic metadata extraction for office files"""
@@ -70,14 +58,5 @@ class OfficeHandler(FileHandler):
         if not file_path.endswith('.pdf'):
             return 1  # Fallback if not PDF
 
-        cmd = ["pdfinfo", file_path]
-        returncode, stdout, stderr = await command_utils.run_command(cmd, timeout=30)
-
-        if returncode == 0:
-            for line in stdout.splitlines():
-                if line.startswith("Pages:"):
-                    try:
-                        return int(line.split(":")[1].strip())
-                    except (ValueError, IndexError):
-                        pass
-        return 1
\ No newline at end of file
+        page_count = await render_backends.get_pdf_page_count(file_path)
+        return page_count or 1
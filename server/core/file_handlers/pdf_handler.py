@@ -7,7 +7,7 @@ from typing import Dict, Any, Optional
 
 from .base_handler import FileHandler
 from models.document import DocumentMetadata
-from core.utils import command_utils
+from core.utils import command_utils, render_backends
 from core.utils.file_utils import format_file_size
 from config import settings
 
@@ -15,10 +15,13 @@ class PdfHandler(FileHandler):
     async def process(self, file_path: str, doc_id: str) -> Dict[str, Any]:
         """Process PDF file - minimal processing needed"""
         total_pages = await self.get_page_count(file_path)
+        await self.report_stage("converted")
+        thumbnail_path = await self.generate_thumbnail(file_path, doc_id)
+        await self.report_stage("thumbnailed")
         return {
             "total_pages": total_pages,
             "converted_path": None,  # PDFs don't need conversion
-            "thumbnail_path": await self.generate_thumbnail(file_path, doc_id),
+            "thumbnail_path": thumbnail_path,
             "is_plain_text": False
         }
 
@@ -53,36 +56,19 @@ class PdfHandler(FileHandler):
         return metadata
 
     async def generate_thumbnail(self, file_path: str, doc_id: str) -> Optional[str]:
-        """Generate PDF thumbnail using pdftoppm"""
+        """Generate PDF thumbnail from the first page"""
         thumbnail_path = os.path.join(settings.THUMBNAILS_DIR, f"{doc_id}_thumb.png")
-        output_prefix = os.path.join(settings.THUMBNAILS_DIR, f"{doc_id}_thumb_temp")
 
-        cmd = [
-            "pdftoppm", "-png", "-f", "1", "-l", "1",
-            "-scale-to-x", "400", "-scale-to-y", "-1",
-            file_path, output_prefix
-        ]
-
-        returncode, stdout, stderr = await command_utils.run_command(cmd)
-
-        if returncode == 0:
-            # Find generated file (e.g., output_prefix-1.png)
-            generated_file = f"{output_prefix}-1.png"
-            if os.path.exists(generated_file):
-                os.rename(generated_file, thumbnail_path)
-                return thumbnail_path
+        rendered = await render_backends.render_pages(
+            file_path, [1], 400, command_utils.Priority.BULK
+        )
+        if 1 in rendered:
+            with open(thumbnail_path, 'wb') as f:
+                f.write(rendered[1])
+            return thumbnail_path
         return None
 
     async def get_page_count(self, pdf_path: str) -> int:
-        """Get PDF page count using pdfinfo"""
-        cmd = ["pdfinfo", pdf_path]
-        returncode, stdout, stderr = await command_utils.run_command(cmd, timeout=30)
-
-        if returncode == 0:
-            for line in stdout.splitlines():
-                if line.startswith("Pages:"):
-                    try:
-                        return int(line.split(":")[1].strip())
-                    except (ValueError, IndexError):
-                        pass
-        return 1  # Fallback to 1 page
\ No newline at end of file
+        """Get PDF page count from the render backend"""
+        page_count = await render_backends.get_pdf_page_count(pdf_path)
+        return page_count or 1  # Fallback to 1 page
@@ -1,19 +1,32 @@
 # core/file_handlers/text_handler.py
 import os
+import asyncio
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, AsyncIterator, Iterator, Tuple
 
 from .base_handler import FileHandler
 from models.document import DocumentMetadata
 from core.utils.file_utils import format_file_size
+from core.utils import line_index, highlighting
 from core.registry import extensions
+from config import settings
 from datetime import datetime
 
 class TextHandler(FileHandler):
     async def process(self, file_path: str, doc_id: str) -> Dict[str, Any]:
-        """Process text files - no conversion needed"""
+        """
+        Process text files - no conversion needed. Builds the line index for
+        windowed previews, and highlights code or renders Markdown in chunks.
+        """
+        line_index_path = await line_index.build_line_index(file_path, doc_id)
+        manifest = line_index.load_manifest(line_index_path) if line_index_path else None
+        highlight_path = await highlighting.render_document(
+            file_path, doc_id, (manifest or {}).get("encoding", "utf-8")
+        )
         return {
             "total_pages": 1,
+            "line_index_path": line_index_path,
+            "highlight_path": highlight_path,
             "is_plain_text": True
         }
 
@@ -23,14 +36,13 @@ class TextHandler(FileHandler):
 
     async def extract_metadata(self, file_path: str) -> DocumentMetadata:
         """Extract metadata from text files"""
-        # Count lines and characters
+        # Count lines and characters; reuses the scan made while indexing the file
         lines = 0
         chars = 0
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    lines += 1
-                    chars += len(line)
+            stats = await asyncio.to_thread(line_index.scan_text, file_path)
+            lines = stats["line_count"]
+            chars = stats["char_count"]
         except Exception:
             pass
 
@@ -45,4 +57,35 @@ class TextHandler(FileHandler):
 
     async def generate_thumbnail(self, file_path: str, doc_id: str) -> Optional[str]:
         """No thumbnail for text files"""
-        return None
\ No newline at end of file
+        return None
+
+    async def iter_page_texts(self, file_path: str, processed_info: Dict[str, Any]) -> AsyncIterator[Tuple[int, str]]:
+        """Text split into pages of SEARCH_TEXT_PAGE_LINES lines, up to SEARCH_MAX_TEXT_BYTES"""
+        manifest = line_index.load_manifest(processed_info.get("line_index_path") or "") or {}
+        pages = self._text_pages(file_path, manifest.get("encoding", "utf-8"))
+        while True:
+            # Each page is read off the event loop
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                break
+            yield page
+
+    @staticmethod
+    def _text_pages(file_path: str, encoding: str) -> Iterator[Tuple[int, str]]:
+        page_number = 0
+        remaining = settings.SEARCH_MAX_TEXT_BYTES
+        lines = []
+        with open(file_path, 'r', encoding=encoding, errors='replace') as f:
+            while remaining > 0:
+                # Bounded, so a file that is one enormous line is not read whole
+                line = f.readline(remaining)
+                if not line:
+                    break
+                lines.append(line)
+                remaining -= len(line)
+                if len(lines) == settings.SEARCH_TEXT_PAGE_LINES:
+                    page_number += 1
+                    yield page_number, "".join(lines)
+                    lines = []
+        if lines:
+            yield page_number + 1, "".join(lines)
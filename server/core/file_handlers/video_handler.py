@@ -7,21 +7,43 @@ from typing import Dict, Any, Optional
 
 from .base_handler import FileHandler
 from models.document import DocumentMetadata
-from core.utils import command_utils
+from core.utils import command_utils, storyboard, video_streaming
 from core.utils.file_utils import format_file_size
 from config import settings
 from datetime import  datetime
 
 class VideoHandler(FileHandler):
     async def process(self, file_path: str, doc_id: str) -> Dict[str, Any]:
-        """Process video file - generate thumbnail"""
-        thumbnail_path = await self.generate_thumbnail(file_path, doc_id)
-        return {
+        """
+        Process video file - generate the storyboard and poster thumbnail, and make
+        a rendition browsers can start playing early: HLS if they can't play the
+        file, a faststart copy if its index sits at the end.
+        """
+        probe = await video_streaming.probe_video(file_path)
+        duration = float(((probe or {}).get("format") or {}).get("duration") or 0)
+
+        # One decode for sprites, WebVTT track and poster scoring
+        storyboard_info = await storyboard.generate_storyboard(file_path, doc_id, duration)
+        if storyboard_info:
+            thumbnail_path = await self.generate_thumbnail(file_path, doc_id, storyboard_info["poster_time"])
+        else:
+            thumbnail_path = await self.generate_thumbnail(file_path, doc_id)
+        processed_info = {
             "total_pages": 1,
             "thumbnail_path": thumbnail_path,
+            "storyboard_path": (storyboard_info or {}).get("storyboard_path"),
             "is_plain_text": False
         }
 
+        if video_streaming.needs_transcode(file_path, probe):
+            # The transcode outlives the processing job; segments are playable as they appear
+            video_streaming.start_hls_transcode(file_path, doc_id, probe)
+            processed_info["hls_path"] = video_streaming.hls_master_path(doc_id)
+        elif video_streaming.needs_faststart(file_path):
+            # Served by /preview instead of the original
+            processed_info["converted_path"] = await video_streaming.ensure_faststart(file_path, doc_id)
+        return processed_info
+
     async def convert_to_pdf(self, file_path: str, doc_id: str) -> Optional[str]:
         """Videos cannot be converted to PDF"""
         return None
@@ -62,12 +84,12 @@ class VideoHandler(FileHandler):
 
         return metadata
 
-    async def generate_thumbnail(self, file_path: str, doc_id: str) -> Optional[str]:
-        """Generate video thumbnail using ffmpeg"""
+    async def generate_thumbnail(self, file_path: str, doc_id: str, at: float = 1.0) -> Optional[str]:
+        """Generate video thumbnail from the frame at `at` seconds using ffmpeg"""
         thumbnail_path = os.path.join(settings.THUMBNAILS_DIR, f"{doc_id}_thumb.png")
 
         cmd = [
-            "ffmpeg", "-ss", "00:00:01",  # Seek to 1 second
+            "ffmpeg", "-ss", f"{at:.3f}",  # Input seek: jumps to the nearest keyframe, no full decode
             "-i", file_path,
             "-vframes", "1",              # Capture 1 frame
             "-q:v", "3",                   # Quality level (1-31, 1=best)
@@ -75,7 +97,7 @@ class VideoHandler(FileHandler):
             thumbnail_path
         ]
 
-        returncode, stdout, stderr = await command_utils.run_command(cmd)
+        returncode, stdout, stderr = await command_utils.run_command(cmd, priority=command_utils.Priority.BULK)
         if returncode == 0 and os.path.exists(thumbnail_path):
             return thumbnail_path
         return None
\ No newline at end of file
@@ -0,0 +1,615 @@
+# core/utils/archive_access.py
+import os
+import re
+import bz2
+import gzip
+import json
+import lzma
+import uuid
+import bisect
+import shutil
+import asyncio
+import fnmatch
+import hashlib
+import tarfile
+import zipfile
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional, AsyncIterator, BinaryIO, Tuple
+
+import numpy as np
+import rarfile
+import py7zr
+
+from config import settings
+from core.utils import command_utils
+from core.utils.single_flight import SingleFlight, file_lock
+
+INDEX_MANIFEST = "index.json"
+# Columns of the member index: one row per member, sorted by normalized path
+NAMES_FILE = "names.txt"  # Normalized paths (no leading ./ or /, no trailing /) joined with \n
+ENTRIES_FILE = "entries.npy"  # ENTRY_DTYPE rows; -1 marks an unknown value
+ENTRY_DTYPE = np.dtype([
+    ("size", "<i8"),
+    ("packed", "<i8"),  # Compressed size
+    ("mtime", "<i8"),  # Seconds since the epoch
+    ("offset", "<i8"),  # Data offset in the (decompressed) tar
+    ("parent", "<i4"),  # Row of the containing directory, -1 at the root
+    ("is_dir", "u1"),
+])
+TAR_CACHE = "stream.tar"
+TAR_RECORD_SIZE = 20 * 512
+BUDGET_FILE = "budget.json"
+
+# Archive format by extension; compressed tars are decompressed once into TAR_CACHE
+FORMATS = {
+    '.zip': "zip",
+    '.tar': "tar",
+    '.gz': "tar.gz", '.tgz': "tar.gz",
+    '.bz2': "tar.bz2", '.tbz2': "tar.bz2",
+    '.xz': "tar.xz",
+    '.rar': "rar",
+    '.7z': "7z",
+    '.iso': "7z-cli", '.dmg': "7z-cli",
+}
+DECOMPRESSORS = {"tar.gz": gzip.open, "tar.bz2": bz2.open, "tar.xz": lzma.open}
+
+_extractions = SingleFlight()
+
+# Member counts of recently indexed archives, so metadata extraction does not list them again
+_counts: "OrderedDict[Tuple[str, int, int], int]" = OrderedDict()
+_COUNTS_SIZE = 64
+
+
+class MemberNotFoundError(Exception):
+    """The archive has no member with the requested path"""
+
+
+class ArchiveBudgetExceededError(Exception):
+    """Extracting the member would exceed the archive's ARCHIVE_EXTRACT_BUDGET or ARCHIVE_MEMBER_MAX_BYTES"""
+
+
+def archive_format(file_path: str) -> Optional[str]:
+    return FORMATS.get(Path(file_path).suffix.lower())
+
+
+def archive_dir(doc_id: str) -> str:
+    return os.path.join(settings.CONVERTED_DIR, doc_id, "archive")
+
+
+def member_index_path(doc_id: str) -> str:
+    return os.path.join(archive_dir(doc_id), INDEX_MANIFEST)
+
+
+def _stat_key(file_path: str) -> Tuple[str, int, int]:
+    stat = os.stat(file_path)
+    return os.path.realpath(file_path), stat.st_size, stat.st_mtime_ns
+
+
+async def build_member_index(file_path: str, doc_id: str) -> Optional[str]:
+    """
+    List the archive once, without extracting anything, and store its
+    members as columns. Returns the manifest path, or None on failure.
+    """
+    kind = archive_format(file_path)
+    if not kind:
+        return None
+    manifest_path = member_index_path(doc_id)
+    if os.path.exists(manifest_path):
+        return manifest_path
+    try:
+        members = await list_members(file_path)
+        manifest = await asyncio.to_thread(_write_columns, members, os.path.dirname(manifest_path))
+    except Exception as e:
+        print(f"Error indexing archive {file_path}: {e}")
+        return None
+
+    manifest["format"] = kind
+    temp_path = f"{manifest_path}.{uuid.uuid4().hex}.part"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
+
+    _counts[_stat_key(file_path)] = manifest["files"]
+    while len(_counts) > _COUNTS_SIZE:
+        _counts.popitem(last=False)
+    return manifest_path
+
+
+def _timestamp(value) -> int:
+    try:
+        if isinstance(value, tuple):
+            value = datetime(*value)
+        if isinstance(value, datetime):
+            return int(value.timestamp())
+        return int(value) if value is not None else -1
+    except (TypeError, ValueError, OverflowError, OSError):
+        return -1
+
+
+async def list_members(file_path: str) -> List[Tuple[str, int, int, int, bool, int]]:
+    """(name, size, packed size, mtime, is_dir, tar data offset) of every member, as the archive lists them"""
+    kind = archive_format(file_path)
+    if kind == "7z-cli":
+        return await _list_with_7z(file_path)
+    return await asyncio.to_thread(_list_members, file_path, kind)
+
+
+def _list_members(file_path: str, kind: str) -> List[Tuple[str, int, int, int, bool, int]]:
+    if kind == "zip":
+        with zipfile.ZipFile(file_path) as archive:
+            return [
+                (info.filename, info.file_size, info.compress_size, _timestamp(info.date_time), info.is_dir(), -1)
+                for info in archive.infolist()
+            ]
+    if kind == "rar":
+        with rarfile.RarFile(file_path) as archive:
+            return [
+                (info.filename, info.file_size, info.compress_size, _timestamp(info.mtime or info.date_time),
+                 info.is_dir(), -1)
+                for info in archive.infolist()
+            ]
+    if kind == "7z":
+        with py7zr.SevenZipFile(file_path, mode='r') as archive:
+            return [
+                (info.filename, info.uncompressed or 0, info.compressed if info.compressed is not None else -1,
+                 _timestamp(info.creationtime), info.is_directory, -1)
+                for info in archive.list()
+            ]
+    # Tars: the data offset of each member lets reads seek straight to it
+    with tarfile.open(file_path, 'r:*') as archive:
+        return [
+            (info.name, info.size, -1, _timestamp(info.mtime), info.isdir(), info.offset_data)
+            for info in archive
+            if info.isfile() or info.isdir()
+        ]
+
+
+async def _list_with_7z(file_path: str) -> List[Tuple[str, int, int, int, bool, int]]:
+    cmd = ["7z", "l", "-slt", file_path]
+    returncode, stdout, stderr = await command_utils.run_command(cmd, priority=command_utils.Priority.BULK)
+    if returncode != 0:
+        raise RuntimeError(stderr.strip()[-500:])
+    return parse_7z_listing(stdout)
+
+
+def parse_7z_listing(output: str) -> List[Tuple[str, int, int, int, bool, int]]:
+    """
+    Members of a `7z l -slt` listing: a "Key = Value" block per member after
+    the "----------" line. The blocks before it describe the archive itself.
+    """
+    output = output.replace("\r\n", "\n")
+    _, separator, listing = output.partition("\n----------\n")
+    members = []
+    for block in listing.split("\n\n") if separator else []:
+        fields = {}
+        for line in block.splitlines():
+            key, equals, value = line.partition(" =")
+            if equals:
+                fields[key] = value.strip()
+        if not fields.get("Path"):
+            continue
+        is_dir = fields.get("Folder") == "+" or fields.get("Attributes", "").startswith("D")
+        try:
+            mtime = int(datetime.strptime(fields.get("Modified", "")[:19], "%Y-%m-%d %H:%M:%S").timestamp())
+        except ValueError:
+            mtime = -1
+        size = fields.get("Size", "")
+        packed = fields.get("Packed Size", "")
+        members.append((
+            fields["Path"],
+            int(size) if size.isdigit() else 0,
+            int(packed) if packed.isdigit() else -1,
+            mtime,
+            is_dir,
+            -1,
+        ))
+    return members
+
+
+def _normalize(name: str) -> str:
+    name = name.replace("\\", "/").replace("\n", " ")
+    while name.startswith("./"):
+        name = name[2:]
+    return name.strip("/")
+
+
+def _write_columns(members, output_dir: str) -> Dict[str, Any]:
+    """
+    Write the sorted names and the entry columns. Directories the archive
+    only implies are added, so every member has a parent row. Returns the
+    manifest fields.
+    """
+    rows: Dict[str, tuple] = {}
+    raw_names: Dict[str, str] = {}
+    for name, size, packed, mtime, is_dir, offset in members:
+        path = _normalize(name)
+        if not path or path == ".":
+            continue
+        # A later member of the same path replaces the earlier one, as on extraction
+        rows[path] = (size, packed, mtime, offset, bool(is_dir))
+        if name != path and not is_dir:
+            raw_names[path] = name
+        else:
+            raw_names.pop(path, None)
+        parent = path.rpartition("/")[0]
+        while parent and parent not in rows:
+            rows[parent] = (0, -1, -1, -1, True)
+            parent = parent.rpartition("/")[0]
+
+    names = sorted(rows)
+    position = {name: row for row, name in enumerate(names)}
+    entries = np.zeros(len(names), dtype=ENTRY_DTYPE)
+    for row, name in enumerate(names):
+        size, packed, mtime, offset, is_dir = rows[name]
+        parent = name.rpartition("/")[0]
+        entries[row] = (size, packed, mtime, offset, position[parent] if parent else -1, is_dir)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for file_name, write in (
+        (NAMES_FILE, lambda f: f.write("\n".join(names).encode('utf-8'))),
+        (ENTRIES_FILE, lambda f: np.save(f, entries)),
+    ):
+        path = os.path.join(output_dir, file_name)
+        temp_path = f"{path}.{uuid.uuid4().hex}.part"
+        with open(temp_path, 'wb') as f:
+            write(f)
+        os.replace(temp_path, path)
+
+    files = ~entries["is_dir"].astype(bool)
+    return {
+        "entries": len(names),
+        "files": int(files.sum()),
+        "totalSize": int(entries["size"][files].sum()),
+        # Archive names of the files whose path was normalized, by path
+        "rawNames": {position[path]: name for path, name in raw_names.items()},
+    }
+
+
+class ArchiveIndex:
+    """Read access to a stored member index; the entry columns are memory-mapped"""
+
+    def __init__(self, manifest_path: str):
+        directory = os.path.dirname(manifest_path)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        self.format = manifest["format"]
+        self.file_count = manifest["files"]
+        self.total_size = manifest["totalSize"]
+        self.raw_names = {int(row): name for row, name in manifest["rawNames"].items()}
+        self.entries = np.load(os.path.join(directory, ENTRIES_FILE), mmap_mode='r')
+        with open(os.path.join(directory, NAMES_FILE), encoding='utf-8') as f:
+            self.names = f.read().split("\n") if len(self.entries) else []
+
+    def row(self, path: str) -> Optional[int]:
+        path = _normalize(path)
+        row = bisect.bisect_left(self.names, path)
+        return row if path and row < len(self.names) and self.names[row] == path else None
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        if not prefix:
+            return 0, len(self.names)
+        return bisect.bisect_left(self.names, prefix), bisect.bisect_left(self.names, prefix + "\U0010ffff")
+
+    def member(self, path: str) -> Dict[str, Any]:
+        """The file member at path, as open_member takes it"""
+        row = self.row(path)
+        if row is None or self.entries["is_dir"][row]:
+            raise MemberNotFoundError(f"No member {path} in this archive.")
+        entry = self.entries[row]
+        return {
+            "name": self.raw_names.get(row, self.names[row]),
+            "size": int(entry["size"]),
+            "offset": int(entry["offset"]),
+        }
+
+    def entry(self, row: int) -> Dict[str, Any]:
+        size, packed, mtime, _, _, is_dir = self.entries[row].tolist()
+        path = self.names[row]
+        return {
+            "name": path.rpartition("/")[2],
+            "path": path,
+            "isDir": bool(is_dir),
+            "size": size,
+            "compressedSize": packed if packed >= 0 else None,
+            "modified": datetime.fromtimestamp(mtime, timezone.utc).isoformat() if mtime >= 0 else None,
+        }
+
+    def list(self, path: str = "", recursive: bool = False, prefix: str = "", pattern: Optional[str] = None,
+             offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+        """
+        One page of the members under the directory path: its direct
+        children (directories first) or, if recursive, everything below it
+        in path order. prefix and the glob pattern apply to paths relative
+        to the directory.
+        """
+        base = _normalize(path)
+        parent = -1
+        if base:
+            parent = self.row(base)
+            if parent is None or not self.entries["is_dir"][parent]:
+                raise MemberNotFoundError(f"No directory {path} in this archive.")
+            base += "/"
+
+        # Members sharing a prefix are one contiguous run of the sorted names
+        low, high = self._prefix_range(base + prefix)
+        if recursive:
+            rows = np.arange(low, high)
+        else:
+            rows = np.flatnonzero(self.entries["parent"] == parent)
+            rows = rows[(rows >= low) & (rows < high)]
+            rows = rows[np.argsort(self.entries["is_dir"][rows] == 0, kind='stable')]
+        if pattern:
+            regex = re.compile(fnmatch.translate(pattern))
+            rows = np.fromiter(
+                (row for row in rows if regex.match(self.names[row][len(base):])), dtype=np.int64
+            )
+        return {
+            "path": base.rstrip("/"),
+            "total": len(rows),
+            "offset": offset,
+            "limit": limit,
+            "entries": [self.entry(int(row)) for row in rows[offset:offset + limit]],
+        }
+
+
+_indexes: "OrderedDict[str, ArchiveIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def open_archive_index(manifest_path: str) -> Optional[ArchiveIndex]:
+    """Recently used indexes stay loaded, up to ARCHIVE_INDEX_CACHE_SIZE; None if there is none"""
+    with _indexes_lock:
+        index = _indexes.get(manifest_path)
+        if index is not None:
+            _indexes.move_to_end(manifest_path)
+            return index
+    try:
+        index = ArchiveIndex(manifest_path)
+    except (OSError, ValueError, KeyError):
+        return None
+    with _indexes_lock:
+        _indexes[manifest_path] = index
+        while len(_indexes) > settings.ARCHIVE_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+async def count_members(file_path: str) -> int:
+    """Number of files in an archive; archives indexed recently are not listed again"""
+    key = _stat_key(file_path)
+    if key in _counts:
+        return _counts[key]
+    members = await list_members(file_path)
+    return sum(1 for member in members if not member[4])
+
+
+async def open_member(file_path: str, doc_id: str, index: ArchiveIndex,
+                      member: Dict[str, Any]) -> Tuple[AsyncIterator[bytes], int]:
+    """
+    Stream one member: zip and rar members are decompressed straight from
+    the archive, plain tar members are read at their offset, compressed tars
+    go through a once-decompressed tar, and 7z/ISO/DMG members are extracted
+    once into the archive's cache. Disk extraction counts against the budget.
+    """
+    if member["size"] > settings.ARCHIVE_MEMBER_MAX_BYTES:
+        raise ArchiveBudgetExceededError(f"{member['name']} is larger than ARCHIVE_MEMBER_MAX_BYTES.")
+
+    kind = index.format
+    if kind in ("zip", "rar"):
+        opener = _zip_opener if kind == "zip" else _rar_opener
+        return _read_chunks(lambda: opener(file_path, member["name"]), member["size"]), member["size"]
+    if kind == "tar":
+        return _read_chunks(lambda: _open_at(file_path, member["offset"]), member["size"]), member["size"]
+    if kind in DECOMPRESSORS:
+        tar_path = await _ensure_tar_cache(file_path, doc_id, kind)
+        return _read_chunks(lambda: _open_at(tar_path, member["offset"]), member["size"]), member["size"]
+
+    member_path = await _ensure_extracted_member(file_path, doc_id, kind, member)
+    size = os.path.getsize(member_path)
+    return _read_chunks(lambda: open(member_path, 'rb'), size), size
+
+
+async def extract_member(file_path: str, doc_id: str, index: ArchiveIndex, member: Dict[str, Any],
+                         target_path: str) -> str:
+    """
+    Write one member to target_path, once; the copy counts against the
+    archive's budget. Members of kinds that are extracted to disk anyway
+    (7z, ISO, DMG) are hard-linked from there, so they are stored and
+    charged once.
+    """
+    if os.path.exists(target_path):
+        return target_path
+    return await _extractions.do(
+        f"copy:{target_path}", lambda: _copy_member(file_path, doc_id, index, member, target_path)
+    )
+
+
+async def _copy_member(file_path: str, doc_id: str, index: ArchiveIndex, member: Dict[str, Any],
+                       target_path: str) -> str:
+    if os.path.exists(target_path):
+        return target_path
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    if member["size"] > settings.ARCHIVE_MEMBER_MAX_BYTES:
+        raise ArchiveBudgetExceededError(f"{member['name']} is larger than ARCHIVE_MEMBER_MAX_BYTES.")
+
+    if index.format not in ("zip", "rar", "tar") and index.format not in DECOMPRESSORS:
+        # Already extracted to disk (and charged) once; link that file instead of copying it
+        member_path = await _ensure_extracted_member(file_path, doc_id, index.format, member)
+        try:
+            os.link(member_path, target_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            os.replace(member_path, target_path)
+        return target_path
+
+    chunks, size = await open_member(file_path, doc_id, index, member)
+    await _charge_budget(doc_id, size)
+    temp_path = f"{target_path}.{uuid.uuid4().hex}.part"
+    try:
+        with open(temp_path, 'wb') as f:
+            async for chunk in chunks:
+                await asyncio.to_thread(f.write, chunk)
+        os.replace(temp_path, target_path)
+    except BaseException:
+        await asyncio.shield(_refund_budget(doc_id, size))
+        raise
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return target_path
+
+
+def _zip_opener(file_path: str, name: str) -> BinaryIO:
+    archive = zipfile.ZipFile(file_path)
+    stream = archive.open(name)
+    # The member stream keeps its own handle; closing the archive object is safe
+    archive.close()
+    return stream
+
+
+def _rar_opener(file_path: str, name: str) -> BinaryIO:
+    return rarfile.RarFile(file_path).open(name)
+
+
+def _open_at(path: str, offset: int) -> BinaryIO:
+    f = open(path, 'rb')
+    f.seek(offset)
+    return f
+
+
+async def _read_chunks(opener, size: int) -> AsyncIterator[bytes]:
+    """Read at most size bytes off the event loop, so a lying header cannot stream more"""
+    stream = await asyncio.to_thread(opener)
+    try:
+        remaining = size
+        while remaining > 0:
+            chunk = await asyncio.to_thread(stream.read, min(settings.STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(stream.close)
+
+
+async def _charge_budget(doc_id: str, size: int):
+    """Reserve size bytes of the archive's extraction budget"""
+    await _update_budget(doc_id, size)
+
+
+async def _refund_budget(doc_id: str, size: int):
+    """Give back a reservation whose extraction failed"""
+    await _update_budget(doc_id, -size)
+
+
+async def _update_budget(doc_id: str, size: int):
+    budget_path = os.path.join(archive_dir(doc_id), BUDGET_FILE)
+    async with file_lock(budget_path):
+        try:
+            with open(budget_path) as f:
+                used = json.load(f)["used"]
+        except (OSError, ValueError, KeyError):
+            used = 0
+        if size > 0 and used + size > settings.ARCHIVE_EXTRACT_BUDGET:
+            raise ArchiveBudgetExceededError("The extraction budget of this archive is used up.")
+        with open(budget_path, 'w') as f:
+            json.dump({"used": max(0, used + size)}, f)
+
+
+async def _ensure_tar_cache(file_path: str, doc_id: str, kind: str) -> str:
+    tar_path = os.path.join(archive_dir(doc_id), TAR_CACHE)
+    if os.path.exists(tar_path):
+        return tar_path
+    return await _extractions.do(f"tar:{tar_path}", lambda: _decompress_tar(file_path, doc_id, kind, tar_path))
+
+
+async def _decompress_tar(file_path: str, doc_id: str, kind: str, tar_path: str) -> str:
+    if os.path.exists(tar_path):
+        return tar_path
+    index = open_archive_index(member_index_path(doc_id))
+    # The decompressed tar is a little larger than its members: per member a 512-byte header, padding
+    # to the next block and possibly a long-name or pax header; at the end, two zero blocks and
+    # padding to the 10 KiB record
+    expected = index.total_size + sum(2048 + len(name) for name in index.names) + TAR_RECORD_SIZE if index else 0
+    await _charge_budget(doc_id, expected)
+
+    def decompress():
+        partial_path = f"{tar_path}.{uuid.uuid4().hex}.part"
+        try:
+            with DECOMPRESSORS[kind](file_path, 'rb') as source, open(partial_path, 'wb') as target:
+                # The headers decide the charge; data past it (e.g. after the end-of-archive marker) is refused
+                remaining = expected
+                while True:
+                    chunk = source.read(min(settings.STREAM_CHUNK_SIZE, remaining + 1))
+                    if not chunk:
+                        break
+                    if len(chunk) > remaining:
+                        raise ArchiveBudgetExceededError(
+                            "The archive decompresses to more than its members account for."
+                        )
+                    remaining -= len(chunk)
+                    target.write(chunk)
+            os.replace(partial_path, tar_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    try:
+        await asyncio.to_thread(decompress)
+    except BaseException:
+        await asyncio.shield(_refund_budget(doc_id, expected))
+        raise
+    return tar_path
+
+
+async def _ensure_extracted_member(file_path: str, doc_id: str, kind: str, member: Dict[str, Any]) -> str:
+    name_hash = hashlib.sha1(member["name"].encode()).hexdigest()
+    member_path = os.path.join(archive_dir(doc_id), "members", name_hash)
+    if os.path.exists(member_path):
+        return member_path
+    return await _extractions.do(
+        f"member:{member_path}", lambda: _extract_member(file_path, doc_id, kind, member, member_path)
+    )
+
+
+async def _extract_member(file_path: str, doc_id: str, kind: str, member: Dict[str, Any], member_path: str) -> str:
+    if os.path.exists(member_path):
+        return member_path
+    if kind != "7z" and any(char in member["name"] for char in "*?"):
+        # The 7z CLI would take them as wildcards and extract every matching member
+        raise MemberNotFoundError(f"{member['name']} cannot be extracted by name.")
+    await _charge_budget(doc_id, member["size"])
+
+    temp_dir = f"{member_path}.{uuid.uuid4().hex}.part"
+    os.makedirs(temp_dir)
+    try:
+        if kind == "7z":
+            def extract():
+                with py7zr.SevenZipFile(file_path, mode='r') as archive:
+                    archive.extract(path=temp_dir, targets=[member["name"]])
+            await asyncio.to_thread(extract)
+        else:
+            # "--" ends switch and @listfile parsing, so member names are never read as either
+            cmd = ["7z", "x", f"-o{temp_dir}", "-y", "--", file_path, member["name"]]
+            returncode, stdout, stderr = await command_utils.run_command(
+                cmd, timeout=settings.ARCHIVE_EXTRACT_TIMEOUT, priority=command_utils.Priority.INTERACTIVE
+            )
+            if returncode != 0:
+                raise RuntimeError(f"7z could not extract {member['name']}: {stderr.strip()[-500:]}")
+
+        extracted = os.path.realpath(os.path.join(temp_dir, member["name"]))
+        if not extracted.startswith(os.path.realpath(temp_dir) + os.sep) or not os.path.isfile(extracted):
+            raise MemberNotFoundError(f"No member {member['name']} in this archive.")
+        if os.path.getsize(extracted) > member["size"]:
+            raise ArchiveBudgetExceededError(f"{member['name']} is larger than the archive listing says.")
+        os.replace(extracted, member_path)
+    except BaseException:
+        await asyncio.shield(_refund_budget(doc_id, member["size"]))
+        raise
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return member_path
@@ -0,0 +1,270 @@
+# core/utils/cache_manager.py
+import os
+import json
+import math
+import time
+import asyncio
+import threading
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from config import settings
+
+
+class CacheManager:
+    """
+    Keeps rendered pages, renditions, tiles and thumbnails within
+    CACHE_MAX_BYTES. The cache directories are scanned once at startup;
+    after that, renders report the files they write and lookups pick up
+    files written (or removed) by other worker processes, so the total size
+    is kept without walking the tree. Lookups record recency and hit counts
+    in an access index that is flushed to disk when it changed, and a
+    background loop evicts the lowest scoring files down to
+    CACHE_LOW_WATERMARK of the budget. A file's score is its last access
+    time plus CACHE_FREQUENCY_BONUS seconds per doubling of its hits, so
+    frequently read pages outlive a one-off scan through a large document.
+    Evicted files are simply re-rendered on the next request. Document
+    thumbnails are not re-rendered, so they are pinned: they never count
+    against the render budget, only against their own CACHE_PINNED_MAX_BYTES.
+    """
+
+    def __init__(self):
+        # path -> [last access (epoch seconds), hits]
+        self.index: Dict[str, List[float]] = {}
+        # path -> (size, mtime) of every cached file known to this process
+        self.entries: Dict[str, Tuple[int, float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.size = 0
+        self.pinned_size = 0
+        self.dirty = False
+        self.task: Optional[asyncio.Task] = None
+        # Guards index and entries, which eviction reads from a worker thread
+        self.lock = threading.Lock()
+        self._loaded = False
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(settings.CONVERTED_DIR, ".cache_index.json")
+
+    @property
+    def cache_dirs(self) -> List[str]:
+        return [os.path.join(settings.CONVERTED_DIR, "pages"), settings.THUMBNAILS_DIR]
+
+    async def start(self):
+        """Scan the cache and start background eviction (called on application startup)"""
+        if self.task or settings.CACHE_MAX_BYTES <= 0:
+            return
+        self._load_index()
+        await asyncio.to_thread(self._rescan)
+        self.task = asyncio.create_task(self._eviction_loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        self._save_index()
+
+    def lookup(self, path: str) -> bool:
+        """Return whether a cached file exists, counting the hit or miss and recording the access"""
+        self._load_index()
+        stat = self._stat(path)
+        exists = stat is not None
+        with self.lock:
+            if exists and path not in self.entries:
+                # Written by another worker process
+                self._track(path, stat.st_size, stat.st_mtime)
+            elif not exists and path in self.entries:
+                # Evicted by another worker process
+                self._untrack(path)
+            entry = self.index.setdefault(path, [0.0, 0])
+            entry[0] = time.time()
+            if exists:
+                entry[1] += 1
+            self.dirty = True
+        if exists:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return exists
+
+    def record(self, path: str, size: int):
+        """Account for a file a render just wrote"""
+        with self.lock:
+            self._track(path, size, time.time())
+
+    def forget(self, path: str):
+        """Stop tracking a removed file, or every file under a removed directory"""
+        prefix = os.path.join(path, "")
+        with self.lock:
+            for known in [known for known in self.entries if known == path or known.startswith(prefix)]:
+                self._untrack(known)
+                self.index.pop(known, None)
+            self.dirty = True
+
+    @staticmethod
+    def is_pinned(path: str) -> bool:
+        # Document thumbnails are served statically and nothing renders them again
+        return path.endswith("_thumb.png")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "max_bytes": settings.CACHE_MAX_BYTES,
+            "size_bytes": self.size,
+            "pinned_max_bytes": settings.CACHE_PINNED_MAX_BYTES,
+            "pinned_bytes": self.pinned_size,
+            "files": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+    def _track(self, path: str, size: int, mtime: float):
+        """Add or update a file's size; must be called with the lock held"""
+        previous = self.entries.get(path)
+        growth = size - (previous[0] if previous else 0)
+        self.size += growth
+        if self.is_pinned(path):
+            self.pinned_size += growth
+        self.entries[path] = (size, mtime)
+
+    def _untrack(self, path: str):
+        """Drop a file's size; must be called with the lock held"""
+        size = self.entries.pop(path)[0]
+        self.size -= size
+        if self.is_pinned(path):
+            self.pinned_size -= size
+
+    def _score(self, index: Dict[str, List[float]], path: str, mtime: float) -> float:
+        last_access, hits = index.get(path, (mtime, 0))
+        return max(last_access, mtime) + settings.CACHE_FREQUENCY_BONUS * math.log2(1 + hits)
+
+    async def _eviction_loop(self):
+        while True:
+            await asyncio.sleep(settings.CACHE_EVICTION_INTERVAL)
+            try:
+                if self.size - self.pinned_size > settings.CACHE_MAX_BYTES or \
+                        self.pinned_size > settings.CACHE_PINNED_MAX_BYTES:
+                    await asyncio.to_thread(self.evict)
+                if self.dirty:
+                    await asyncio.to_thread(self._save_index)
+            except Exception as e:
+                print(f"Cache eviction failed: {e}")
+
+    def evict(self):
+        """
+        Evict the lowest scoring known files until usage is under the low
+        watermark, separately for rendered files and pinned thumbnails
+        """
+        self._evict(False, settings.CACHE_MAX_BYTES, lambda: self.size - self.pinned_size)
+        self._evict(True, settings.CACHE_PINNED_MAX_BYTES, lambda: self.pinned_size)
+
+    def _evict(self, pinned: bool, budget: int, usage: Callable[[], int]):
+        if usage() <= budget:
+            return
+        with self.lock:
+            files = dict(self.entries)
+            index = {path: list(entry) for path, entry in self.index.items()}
+
+        target = budget * settings.CACHE_LOW_WATERMARK
+        now = time.time()
+        candidates = sorted(
+            (self._score(index, path, mtime), path, size)
+            for path, (size, mtime) in files.items()
+            if self.is_pinned(path) == pinned
+            and now - max(mtime, index.get(path, (0.0, 0))[0]) >= settings.CACHE_MIN_AGE
+        )
+        for _, path, size in candidates:
+            if usage() <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                size = 0  # Already gone; only the accounting is corrected
+            except OSError as e:
+                print(f"Could not evict {path}: {e}")
+                continue
+            self.forget(path)
+            if size:
+                self.evictions += 1
+                self.evicted_bytes += size
+
+    def _rescan(self):
+        """Rebuild the size accounting from disk"""
+        files = self._scan()
+        with self.lock:
+            self.entries = files
+            self.size = sum(size for size, _ in files.values())
+            self.pinned_size = sum(size for path, (size, _) in files.items() if self.is_pinned(path))
+            for path in [path for path in self.index if path not in files]:
+                del self.index[path]
+
+    def _scan(self) -> Dict[str, Tuple[int, float]]:
+        files = {}
+        for cache_dir in self.cache_dirs:
+            for root, _, names in os.walk(cache_dir):
+                for name in names:
+                    if name.endswith(".part"):
+                        continue  # Render in progress
+                    path = os.path.join(root, name)
+                    stat = self._stat(path)
+                    if stat is not None:
+                        files[path] = (stat.st_size, stat.st_mtime)
+        return files
+
+    @staticmethod
+    def _stat(path: str) -> Optional[os.stat_result]:
+        try:
+            return os.stat(path)
+        except FileNotFoundError:
+            return None
+
+    def _load_index(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        stored = self._read_index()
+        with self.lock:
+            self._merge(stored.get("entries", {}))
+
+    def _read_index(self) -> Dict[str, Any]:
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index(self):
+        """Write the access index, merging what other worker processes recorded"""
+        stored = self._read_index()
+        with self.lock:
+            self._merge(stored.get("entries", {}))
+            # Only files that still exist are worth remembering
+            for path in [path for path in self.index if path not in self.entries]:
+                del self.index[path]
+            self.dirty = False
+        self._write_index()
+
+    def _write_index(self):
+        with self.lock:
+            snapshot = {"entries": {path: list(entry) for path, entry in self.index.items()}}
+        # Write under a temporary name so other workers never read a partial index
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, self.index_path)
+
+    def _merge(self, entries: Dict[str, List[float]]):
+        """Fold stored entries into the index; must be called with the lock held"""
+        for path, (last_access, hits) in entries.items():
+            entry = self.index.setdefault(path, [last_access, hits])
+            entry[0] = max(entry[0], last_access)
+            entry[1] = max(entry[1], hits)
+
+
+page_cache = CacheManager()
@@ -1,26 +1,194 @@
 # core/utils/command_utils.py
+import os
+import heapq
+import signal
+import shutil
 import asyncio
+import itertools
+from enum import IntEnum
+from typing import Dict, Any, List, Optional, Tuple
 
-async def run_command(cmd: list[str], timeout: int = 180) -> tuple[int, str, str]:
-    """Robust helper to run shell commands asynchronously with timeout"""
+from config import settings
+
+
+class Priority(IntEnum):
+    """Scheduling class of a command; lower values run first"""
+    INTERACTIVE = 0  # A user is waiting on the result, e.g. /page/{n} renders
+    NORMAL = 1
+    BULK = 2  # Background work such as thumbnails and archive extraction
+
+
+# Executables that share a concurrency limit with another tool
+TOOL_ALIASES = {
+    "soffice": "libreoffice",
+    "pdftocairo": "pdftoppm",
+    "pdftotext": "pdftoppm",
+    "magick": "convert",
+    "7za": "7z",
+    "7zz": "7z",
+}
+
+
+class ToolLimiter:
+    """
+    Counting semaphore for one external tool. When every slot is busy,
+    waiters are woken in priority order and FIFO within a priority.
+    """
+
+    def __init__(self, tool: str, limit: int):
+        self.tool = tool
+        self.limit = limit
+        self.running = 0
+        self.completed = 0
+        self.queued: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    async def acquire(self, priority: Priority):
+        if self.running < self.limit and not self._waiters:
+            self.running += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), future))
+        self.queued[priority] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the waiter was cancelled
+                self.release()
+            raise
+        finally:
+            self.queued[priority] -= 1
+
+    def release(self):
+        self.completed += 1
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter
+                future.set_result(None)
+                return
+        self.running -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "queued": {priority.name.lower(): count for priority, count in self.queued.items()},
+            "completed": self.completed
+        }
+
+
+_limiters: Dict[str, ToolLimiter] = {}
+
+
+def get_tool_name(cmd: list[str]) -> str:
+    tool = os.path.basename(cmd[0]) if cmd else ""
+    return TOOL_ALIASES.get(tool, tool)
+
+
+def get_limiter(tool: str) -> Optional[ToolLimiter]:
+    """Limiter for a tool, or None if settings.TOOL_CONCURRENCY does not cap it"""
+    limit = settings.TOOL_CONCURRENCY.get(tool)
+    if not limit:
+        return None
+    if tool not in _limiters:
+        _limiters[tool] = ToolLimiter(tool, limit)
+    return _limiters[tool]
+
+
+def get_scheduler_stats() -> Dict[str, Dict[str, Any]]:
+    """Running and queued command counts per tool"""
+    return {
+        tool: (_limiters[tool].stats() if tool in _limiters else ToolLimiter(tool, limit).stats())
+        for tool, limit in settings.TOOL_CONCURRENCY.items()
+    }
+
+
+# Applies TOOL_RLIMITS from outside Python: a preexec_fn runs in the forked child of a
+# multithreaded process (to_thread workers), where it can deadlock on a lock another thread held
+_PRLIMIT = shutil.which("prlimit")
+
+
+def _with_rlimits(cmd: list[str], tool: str) -> list[str]:
+    """cmd wrapped in prlimit(1) so that settings.TOOL_RLIMITS apply to the child process"""
+    limits = settings.TOOL_RLIMITS.get(tool) or {}
+    options = []
+    if limits.get("cpu"):
+        options.append(f"--cpu={limits['cpu']}")
+    if limits.get("memory"):
+        options.append(f"--as={limits['memory']}")
+    if not options or not _PRLIMIT:
+        return cmd
+    return [_PRLIMIT, *options, "--", *cmd]
+
+
+async def terminate_process_group(process: asyncio.subprocess.Process):
+    """SIGTERM the process group, then SIGKILL it if it outlives the grace period"""
+    if process.returncode is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        await asyncio.wait_for(process.wait(), timeout=settings.PROCESS_KILL_GRACE)
+        return
+    except asyncio.TimeoutError:
+        pass
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        return
+    await process.wait()
+
+
+async def run_command(cmd: list[str], timeout: int = 180, priority: Priority = Priority.NORMAL,
+                      tool: Optional[str] = None) -> tuple[int, str, str]:
+    """
+    Robust helper to run shell commands asynchronously with timeout.
+    Commands wait for a slot of their tool's concurrency limit; higher
+    priority commands are started first. `tool` overrides the limit (and
+    resource limits) the executable would get, for long-running work that
+    must not hold the slots of its short calls. The timeout is a wall-clock
+    deadline for the whole run. Each command gets its own process group,
+    which is terminated on timeout or when the calling task is cancelled.
+    """
+    tool = tool or get_tool_name(cmd)
+    argv = _with_rlimits(cmd, tool)
+    if argv is not cmd and not shutil.which(cmd[0]):
+        # prlimit would start and report the missing executable as its own failure
+        return -1, "", f"Command not found: '{cmd[0]}'. Ensure it's installed and in PATH."
+    limiter = get_limiter(tool)
+    if limiter:
+        await limiter.acquire(priority)
+    process = None
     try:
-        process = await asyncio.wait_for(
-            asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            ),
-            timeout=timeout
+        process = await asyncio.create_subprocess_exec(
+            *argv,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True
         )
-        stdout, stderr = await process.communicate()
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
         return (
             process.returncode,
             stdout.decode(errors='ignore'),
             stderr.decode(errors='ignore')
         )
     except asyncio.TimeoutError:
+        await terminate_process_group(process)
         return -1, "", f"Command '{' '.join(cmd)}' timed out after {timeout} seconds."
+    except asyncio.CancelledError:
+        if process:
+            await terminate_process_group(process)
+        raise
     except FileNotFoundError:
         return -1, "", f"Command not found: '{cmd[0]}'. Ensure it's installed and in PATH."
     except Exception as e:
-        return -1, "", f"Failed to execute command '{' '.join(cmd)}'. Error: {str(e)}"
\ No newline at end of file
+        return -1, "", f"Failed to execute command '{' '.join(cmd)}'. Error: {str(e)}"
+    finally:
+        if limiter:
+            limiter.release()
@@ -1,5 +1,6 @@
 # core/utils/file_utils.py
 import os
+import hashlib
 import magic
 from pathlib import Path
 
@@ -11,6 +12,22 @@ def get_mime_type(file_path: str) -> str:
     except Exception:
         return 'application/octet-stream'
 
+def get_mime_type_from_buffer(buffer: bytes) -> str:
+    """Get MIME type from the leading bytes of a file using python-magic"""
+    try:
+        mime = magic.Magic(mime=True)
+        return mime.from_buffer(buffer)
+    except Exception:
+        return 'application/octet-stream'
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Compute the SHA-256 hex digest of a file on disk"""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
 def format_file_size(size_bytes: int) -> str:
     """Format file size in human-readable format"""
     if size_bytes == 0:
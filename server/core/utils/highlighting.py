@@ -0,0 +1,276 @@
+# core/utils/highlighting.py
+import os
+import re
+import json
+import html
+import uuid
+import shutil
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from config import settings
+from core.registry import extensions
+
+try:
+    from pygments.lexers import get_lexer_for_filename
+    from pygments.lexers.special import TextLexer
+    from pygments.formatters import HtmlFormatter
+    from pygments.token import STANDARD_TYPES
+    from pygments.util import ClassNotFound
+except ImportError:  # Optional: without it code is served as plain text only
+    get_lexer_for_filename = None
+
+try:
+    import markdown
+    from markdown.blockprocessors import ReferenceProcessor
+    from markdown.treeprocessors import Treeprocessor
+except ImportError:  # Optional: without it Markdown is served as plain text only
+    markdown = None
+    Treeprocessor = object
+
+HIGHLIGHT_MANIFEST = "highlight.json"
+CSS_CLASS = "highlight"
+MARKDOWN_EXTENSIONS = ['.md']
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+# Link and image URLs of rendered Markdown keep only these schemes (relative URLs have none)
+SAFE_URL_SCHEMES = {"http", "https", "mailto", "ftp"}
+_URL_SCHEME = re.compile(r"^([a-zA-Z][a-zA-Z0-9+.-]*):")
+
+
+def highlight_dir(doc_id: str) -> str:
+    return os.path.join(settings.CONVERTED_DIR, doc_id, "highlight")
+
+
+def chunk_file(manifest_path: str, chunk: int) -> str:
+    return os.path.join(os.path.dirname(manifest_path), f"chunk_{chunk}.json")
+
+
+def load_manifest(manifest_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def render_mode(file_path: str) -> Optional[str]:
+    """"code" or "markdown" if the file gets a server-side rendering, else None"""
+    extension = Path(file_path).suffix.lower()
+    if extension in MARKDOWN_EXTENSIONS and markdown is not None:
+        return "markdown"
+    if extension in extensions.CODE_EXTENSIONS and get_lexer_for_filename is not None:
+        return "code"
+    return None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Spawned, not forked: forking the threaded server can copy a lock another thread holds
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.HIGHLIGHT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def stop_highlighting():
+    """Shut the worker pool down (called on application shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def render_document(file_path: str, doc_id: str, encoding: str = "utf-8") -> Optional[str]:
+    """
+    Highlight code, or render Markdown, into chunks of HIGHLIGHT_CHUNK_LINES
+    source lines in the worker pool. Files above HIGHLIGHT_MAX_BYTES are left
+    as plain text. Returns the manifest path, or None if nothing was rendered.
+    """
+    mode = render_mode(file_path)
+    if not mode or os.path.getsize(file_path) > settings.HIGHLIGHT_MAX_BYTES:
+        return None
+
+    output_dir = highlight_dir(doc_id)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            _get_executor(), _render_document, file_path, output_dir, mode, encoding, settings.HIGHLIGHT_CHUNK_LINES
+        )
+    except Exception as e:
+        print(f"Highlighting failed for {file_path}: {e}")
+        return None
+
+
+def _render_document(file_path: str, output_dir: str, mode: str, encoding: str, chunk_lines: int) -> str:
+    """Runs in a worker process: writes the chunks and the manifest into output_dir"""
+    # Leftovers of an interrupted run are started over
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, HIGHLIGHT_MANIFEST)
+
+    with open(file_path, 'r', encoding=encoding, errors='replace') as f:
+        # Only \n ends a line, as in the line index
+        text = f.read().replace("\r\n", "\n").replace("\r", "")
+
+    if mode == "markdown":
+        chunks = _markdown_chunks(text, chunk_lines)
+        language = "markdown"
+    else:
+        lexer = _lexer_for(file_path, text)
+        chunks = _code_chunks(text, lexer, chunk_lines)
+        language = lexer.name
+
+    chunk_count = 0
+    line_count = 0
+    for chunk_count, chunk in enumerate(chunks, start=1):
+        _write_atomic(chunk_file(manifest_path, chunk_count - 1), json.dumps(chunk, separators=(",", ":")))
+        line_count = chunk["start"] + chunk["lineCount"]
+
+    manifest = {
+        "mode": mode,
+        "language": language,
+        "chunkLines": chunk_lines,
+        "chunks": chunk_count,
+        "lineCount": line_count,
+        "cssClass": CSS_CLASS,
+        "css": HtmlFormatter(style=settings.HIGHLIGHT_STYLE).get_style_defs(f".{CSS_CLASS}"),
+    }
+    _write_atomic(manifest_path, json.dumps(manifest))
+    return manifest_path
+
+
+def _lexer_for(file_path: str, text: str):
+    try:
+        return get_lexer_for_filename(file_path, text[:4096], stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return TextLexer(stripnl=False, ensurenl=False)
+
+
+def _token_class(ttype, cache: Dict[Any, str]) -> str:
+    """Short Pygments CSS class of a token type, as HtmlFormatter would use"""
+    if ttype not in cache:
+        current = ttype
+        while current not in STANDARD_TYPES:
+            current = current.parent
+        cache[ttype] = STANDARD_TYPES[current]
+    return cache[ttype]
+
+
+def _code_chunks(text: str, lexer, chunk_lines: int):
+    """One list of HTML lines per chunk; a token spanning lines is split into one span per line"""
+    classes: Dict[Any, str] = {}
+    lines: List[str] = []
+    current: List[str] = []
+    start = 0
+    for ttype, value in lexer.get_tokens(text):
+        css_class = _token_class(ttype, classes)
+        parts = value.split("\n")
+        for i, part in enumerate(parts):
+            if i:
+                lines.append("".join(current))
+                current = []
+                if len(lines) == chunk_lines:
+                    yield {"start": start, "lineCount": len(lines), "lines": lines}
+                    start += len(lines)
+                    lines = []
+            if part:
+                escaped = html.escape(part, quote=False)
+                current.append(f'<span class="{css_class}">{escaped}</span>' if css_class else escaped)
+    if current:
+        lines.append("".join(current))
+    if lines:
+        yield {"start": start, "lineCount": len(lines), "lines": lines}
+
+
+class _SafeUrls(Treeprocessor):
+    """Drop link and image URLs whose scheme could run script (javascript:, data:, ...)"""
+
+    def run(self, root):
+        for element in root.iter():
+            for attribute in ("href", "src"):
+                url = element.get(attribute)
+                if url is None:
+                    continue
+                # Browsers ignore control characters and whitespace inside a scheme
+                scheme = _URL_SCHEME.match(re.sub(r"[\x00-\x20]", "", url))
+                if scheme and scheme.group(1).lower() not in SAFE_URL_SCHEMES:
+                    del element.attrib[attribute]
+
+
+def _markdown_renderer():
+    """
+    Markdown renderer whose output is safe to serve as HTML: raw HTML in
+    the source is escaped like text rather than passed through, and unsafe
+    link URLs are dropped
+    """
+    renderer = markdown.Markdown(
+        extensions=["fenced_code", "tables", "codehilite"],
+        extension_configs={"codehilite": {"css_class": CSS_CLASS, "pygments_style": settings.HIGHLIGHT_STYLE}}
+    )
+    renderer.preprocessors.deregister("html_block")
+    renderer.inlinePatterns.deregister("html")
+    renderer.treeprocessors.register(_SafeUrls(renderer), "safe_urls", 0)
+    return renderer
+
+
+def _markdown_references(source: List[str]) -> Dict[str, Any]:
+    """Reference link definitions of the whole document (outside code fences), parsed as Markdown does"""
+    references = {}
+    fence = None
+    lines = []
+    for line in source:
+        stripped = line.lstrip()
+        if fence:
+            if stripped.startswith(fence):
+                fence = None
+            continue
+        if stripped.startswith(("```", "~~~")):
+            fence = stripped[:3]
+            continue
+        lines.append(line)
+    for match in ReferenceProcessor.RE.finditer("\n".join(lines)):
+        link = match.group(2).lstrip('<').rstrip('>')
+        references.setdefault(match.group(1).strip().lower(), (link, match.group(5) or match.group(6)))
+    return references
+
+
+def _markdown_chunks(text: str, chunk_lines: int):
+    """
+    Rendered HTML of consecutive runs of about chunk_lines source lines.
+    Runs only end on a blank line outside a fenced code block, so no block
+    element is split between chunks. Reference links resolve against the
+    definitions of the whole document, whichever chunk holds them.
+    """
+    source = text.split("\n")
+    if text.endswith("\n"):
+        source.pop()
+    renderer = _markdown_renderer()
+    references = _markdown_references(source)
+    start = 0
+    fence = None
+    for i, line in enumerate(source):
+        stripped = line.lstrip()
+        if fence:
+            if stripped.startswith(fence):
+                fence = None
+        elif stripped.startswith(("```", "~~~")):
+            fence = stripped[:3]
+        if (not fence and not line.strip() and i + 1 - start >= chunk_lines) or i == len(source) - 1:
+            renderer.reset()
+            renderer.references.update(references)
+            html_chunk = renderer.convert("\n".join(source[start:i + 1]))
+            yield {"start": start, "lineCount": i + 1 - start, "html": html_chunk}
+            start = i + 1
+
+
+def _write_atomic(path: str, content: str):
+    temp_path = f"{path}.{uuid.uuid4().hex}.part"
+    with open(temp_path, 'w') as f:
+        f.write(content)
+    os.replace(temp_path, path)
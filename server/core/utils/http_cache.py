@@ -0,0 +1,202 @@
+# core/utils/http_cache.py
+import os
+import json
+import hashlib
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+from typing import Any, Dict, Optional, Tuple
+
+import aiofiles
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+from config import settings
+from models.document import Document
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"  # Cache, but check the ETag before every reuse
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag from the values that determine a response's bytes"""
+    digest = hashlib.sha256("\0".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def document_version(document: Document) -> str:
+    """Value of the ?v= query parameter that marks a URL as content-addressed"""
+    return f"{(document.content_hash or document.id)[:16]}.{settings.RENDER_CACHE_VERSION}"
+
+
+def versioned_url(document: Document, url: str) -> str:
+    return f"{url}{'&' if '?' in url else '?'}v={document_version(document)}"
+
+
+def is_not_modified(request_headers: Headers, etag: str, last_modified: Optional[float] = None) -> bool:
+    """Evaluate If-None-Match, or If-Modified-Since when no If-None-Match was sent"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # If-None-Match uses the weak comparison
+        return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def artifact_headers(request: Request, document: Document, *variant: Any, immutable: bool = True) -> Dict[str, str]:
+    """
+    Caching headers for a response derived from a document's content.
+    The ETag is computed from the content hash and `variant` (the endpoint
+    and its parameters), so it is known before anything is rendered.
+    Versioned URLs (?v=document_version) are immutable; others revalidate.
+    """
+    headers = {
+        "etag": make_etag(document.content_hash or document.id, settings.RENDER_CACHE_VERSION, *variant),
+        "cache-control": IMMUTABLE if immutable and request.query_params.get("v") == document_version(document)
+        else REVALIDATE,
+    }
+    try:
+        headers["last-modified"] = formatdate(os.path.getmtime(document.file_path), usegmt=True)
+    except OSError:
+        pass
+    return headers
+
+
+def not_modified(request: Request, headers: Dict[str, str]) -> Optional[Response]:
+    """304 response if the client's copy is still current, else None"""
+    last_modified = headers.get("last-modified")
+    last_modified_ts = parsedate_to_datetime(last_modified).timestamp() if last_modified else None
+    if is_not_modified(request.headers, headers["etag"], last_modified_ts):
+        return NotModifiedResponse(Headers(headers))
+    return None
+
+
+def cached_json_response(request: Request, content: Any, cache_control: str = REVALIDATE) -> Response:
+    """JSON response validated by a hash of its body"""
+    body = json.dumps(jsonable_encoder(content), separators=(",", ":")).encode()
+    headers = {"etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"', "cache-control": cache_control}
+    if is_not_modified(request.headers, headers["etag"]):
+        return NotModifiedResponse(Headers(headers))
+    return Response(body, media_type="application/json", headers=headers)
+
+
+class RangeNotSatisfiableError(Exception):
+    """Raised when a requested byte range lies outside the file"""
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) of a single "bytes=" range, or None to send the
+    whole file (no header, a malformed one, or several ranges).
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, separator, last = range_header[len("bytes="):].strip().partition("-")
+    if not separator:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(last)
+            if suffix < 0:
+                return None
+            start, end = max(0, size - suffix), size - 1
+            if suffix == 0:
+                raise RangeNotSatisfiableError(range_header)
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiableError(range_header)
+    return start, end
+
+
+def ranged_file_response(request: Request, path: str, headers: Dict[str, str],
+                         media_type: Optional[str] = None, filename: Optional[str] = None) -> Response:
+    """
+    FileResponse with byte-range support: a satisfiable Range returns 206 with
+    just those bytes, an unsatisfiable one 416. If-Range falls back to the
+    full file when the client's copy is outdated.
+    """
+    headers = {**headers, "accept-ranges": "bytes"}
+    media_type = media_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if filename:
+        quoted = quote(filename)
+        headers["content-disposition"] = (
+            f"attachment; filename*=utf-8''{quoted}" if quoted != filename
+            else f'attachment; filename="{filename}"'
+        )
+    size = os.path.getsize(path)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range not in (headers.get("etag"), headers.get("last-modified")):
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiableError:
+        return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    start, end = byte_range
+
+    async def send_range():
+        async with aiofiles.open(path, 'rb') as f:
+            await f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await f.read(min(settings.STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(end - start + 1)
+    return StreamingResponse(send_range(), status_code=206, media_type=media_type, headers=headers)
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles with quoted ETags and an explicit Cache-Control. Dot files
+    (locks, indexes, partial writes) and `hidden_names` are internal
+    bookkeeping and answered with 404.
+    """
+
+    def __init__(self, *args, cache_control: str = REVALIDATE, hidden_names: Tuple[str, ...] = (), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+        self.hidden_names = frozenset(hidden_names)
+
+    def lookup_path(self, path: str) -> Tuple[str, Optional[os.stat_result]]:
+        parts = [part for part in path.replace(os.sep, "/").split("/") if part]
+        if any(part.startswith(".") or part in self.hidden_names for part in parts):
+            return "", None
+        return super().lookup_path(path)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        headers = {
+            "etag": make_etag(full_path, stat_result.st_size, stat_result.st_mtime_ns),
+            "cache-control": self.cache_control,
+        }
+        if is_not_modified(Headers(scope=scope), headers["etag"], stat_result.st_mtime):
+            return NotModifiedResponse(Headers(headers))
+        return FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result,
+            method=scope["method"], headers=headers
+        )
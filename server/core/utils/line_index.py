@@ -0,0 +1,176 @@
+# core/utils/line_index.py
+import os
+import json
+import uuid
+import codecs
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+
+LINE_INDEX_FILE = "lines.idx"  # Little-endian uint64 byte offset of every line start
+LINE_INDEX_MANIFEST = "lines.json"
+SCAN_BLOCK_SIZE = 64 * 1024 * 1024  # Even, so UTF-16 code units never straddle blocks
+
+BOMS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+
+# Text statistics of recently indexed files, so metadata extraction does not scan them again
+_stats_cache: "OrderedDict[Tuple[str, int, int], Dict[str, Any]]" = OrderedDict()
+_STATS_CACHE_SIZE = 64
+
+
+def line_index_dir(doc_id: str) -> str:
+    return os.path.join(settings.CONVERTED_DIR, doc_id, "lines")
+
+
+def line_index_manifest_path(doc_id: str) -> str:
+    return os.path.join(line_index_dir(doc_id), LINE_INDEX_MANIFEST)
+
+
+def load_manifest(manifest_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def detect_encoding(head: bytes) -> Tuple[str, int]:
+    """Encoding of a text file from its first bytes, and the length of its byte order mark"""
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    try:
+        # The sample may end inside a multi-byte sequence
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8", 0
+    except UnicodeDecodeError:
+        return "cp1252", 0
+
+
+async def build_line_index(file_path: str, doc_id: str) -> Optional[str]:
+    """Index the start offset of every line of a text file; returns the manifest path"""
+    try:
+        return await asyncio.to_thread(_build_line_index, file_path, doc_id)
+    except OSError as e:
+        print(f"Line index generation failed for {file_path}: {e}")
+        return None
+
+
+def _build_line_index(file_path: str, doc_id: str) -> str:
+    output_dir = line_index_dir(doc_id)
+    os.makedirs(output_dir, exist_ok=True)
+    index_path = os.path.join(output_dir, LINE_INDEX_FILE)
+    manifest_path = line_index_manifest_path(doc_id)
+
+    stats = scan_text(file_path, index_path)
+    manifest = {**stats, "index": LINE_INDEX_FILE}
+    temp_path = f"{manifest_path}.{uuid.uuid4().hex}.part"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
+    return manifest_path
+
+
+def scan_text(file_path: str, index_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    One pass over a memmap of the file, block by block: newlines are found
+    with numpy and, when index_path is given, the offsets of the lines they
+    start are appended to it. Characters are counted in the same pass.
+    """
+    stat = os.stat(file_path)
+    key = (os.path.realpath(file_path), stat.st_size, stat.st_mtime_ns)
+    if index_path is None and key in _stats_cache:
+        return _stats_cache[key]
+
+    size = stat.st_size
+    with open(file_path, 'rb') as f:
+        encoding, bom_length = detect_encoding(f.read(64 * 1024))
+    unit = 2 if encoding.startswith("utf-16") else 1
+
+    temp_path = f"{index_path}.{uuid.uuid4().hex}.part" if index_path else None
+    index_file = open(temp_path, 'wb') if temp_path else None
+    line_count = 0
+    char_count = 0
+    try:
+        if size > bom_length:
+            data = np.memmap(file_path, dtype=np.uint8, mode='r', shape=(size,))
+            # The first line starts after the byte order mark
+            line_count = 1
+            if index_file:
+                index_file.write(np.array([bom_length], dtype='<u8').tobytes())
+            for start in range(bom_length, size, SCAN_BLOCK_SIZE):
+                block = np.asarray(data[start:start + SCAN_BLOCK_SIZE])
+                if unit == 2:
+                    units = block[:len(block) // 2 * 2].view('<u2' if encoding == "utf-16-le" else '>u2')
+                    newlines = np.flatnonzero(units == 0x0A) * 2
+                    # Low surrogates continue the character of the preceding high surrogate
+                    char_count += len(units) - int(np.count_nonzero((units >= 0xDC00) & (units < 0xE000)))
+                else:
+                    newlines = np.flatnonzero(block == 0x0A)
+                    continuation = 0
+                    if encoding != "cp1252":
+                        # UTF-8 continuation bytes don't start a character
+                        continuation = int(np.count_nonzero((block & 0xC0) == 0x80))
+                    char_count += len(block) - continuation
+                line_starts = (newlines + (start + unit)).astype('<u8')
+                # A trailing newline ends the last line rather than starting one
+                line_starts = line_starts[line_starts < size]
+                line_count += len(line_starts)
+                if index_file:
+                    index_file.write(line_starts.tobytes())
+            del data
+    except BaseException:
+        if index_file:
+            index_file.close()
+            os.remove(temp_path)
+        raise
+    if index_file:
+        index_file.close()
+        os.replace(temp_path, index_path)
+
+    stats = {"encoding": encoding, "size": size, "line_count": line_count, "char_count": char_count}
+    _stats_cache[key] = stats
+    while len(_stats_cache) > _STATS_CACHE_SIZE:
+        _stats_cache.popitem(last=False)
+    return stats
+
+
+def read_lines(file_path: str, manifest_path: str, manifest: Dict[str, Any], start: int, count: int) -> Dict[str, Any]:
+    """
+    Lines start .. start + count - 1 (0-based), located with two index lookups
+    and read with one seek. Reads stop after TEXT_LINES_MAX_BYTES, so a
+    single enormous line is cut short and reported as truncated.
+    """
+    line_count = manifest["line_count"]
+    if start >= line_count or count <= 0:
+        return {"lines": [], "truncated": False}
+    end_line = min(start + count, line_count)
+
+    index_path = os.path.join(os.path.dirname(manifest_path), manifest["index"])
+    offsets = np.memmap(index_path, dtype='<u8', mode='r', shape=(line_count,))
+    begin = int(offsets[start])
+    end = int(offsets[end_line]) if end_line < line_count else manifest["size"]
+    del offsets
+
+    length = min(end - begin, settings.TEXT_LINES_MAX_BYTES)
+    with open(file_path, 'rb') as f:
+        f.seek(begin)
+        raw = f.read(length)
+    encoding = "utf-8" if manifest["encoding"] == "utf-8-sig" else manifest["encoding"]
+    text = raw.decode(encoding, errors='replace')
+    # Only \n delimits lines in the index; a preceding \r is dropped with it
+    lines = text.split("\n")
+    if text.endswith("\n"):
+        lines.pop()
+    return {
+        "lines": [line[:-1] if line.endswith("\r") else line for line in lines],
+        "truncated": length < end - begin,
+    }
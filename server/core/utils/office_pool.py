@@ -0,0 +1,269 @@
+# core/utils/office_pool.py
+import os
+import signal
+import socket
+import asyncio
+import shutil
+import tempfile
+import xmlrpc.client
+from pathlib import Path
+from typing import List, Optional, Set
+
+from config import settings
+from core.utils import command_utils
+from core.utils.single_flight import SingleFlight
+
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    """XML-RPC transport with a socket timeout so a hung instance cannot block forever"""
+
+    def __init__(self, timeout: float):
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+
+def _find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class OfficeInstance:
+    """
+    One long-lived headless LibreOffice behind a unoserver XML-RPC endpoint.
+    Each instance has its own user profile so concurrent conversions never
+    share -env:UserInstallation.
+    """
+
+    def __init__(self, index: int):
+        self.index = index
+        self.port: Optional[int] = None
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.jobs_done = 0
+        self.profile_dir = os.path.join(
+            tempfile.gettempdir(), f"docviewer-lo-{os.getpid()}-{index}"
+        )
+
+    def _proxy(self, timeout: float) -> xmlrpc.client.ServerProxy:
+        return xmlrpc.client.ServerProxy(
+            f"http://127.0.0.1:{self.port}",
+            transport=_TimeoutTransport(timeout),
+            allow_none=True
+        )
+
+    async def start(self) -> bool:
+        """Launch the instance and wait until it answers a health check"""
+        self.port = _find_free_port()
+        self.jobs_done = 0
+        cmd = [
+            settings.OFFICE_POOL_PYTHON, "-m", "unoserver.server",
+            "--port", str(self.port),
+            "--uno-port", str(_find_free_port()),
+            "--executable", "libreoffice",
+            "--user-installation", self.profile_dir,
+        ]
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                start_new_session=True  # Lets stop() kill soffice along with unoserver
+            )
+        except (FileNotFoundError, PermissionError) as e:
+            print(f"Could not start LibreOffice instance {self.index}: {e}")
+            return False
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.OFFICE_POOL_STARTUP_TIMEOUT
+        while loop.time() < deadline:
+            if self.process.returncode is not None:
+                break
+            if await self.is_healthy():
+                return True
+            await asyncio.sleep(1)
+
+        print(f"LibreOffice instance {self.index} did not become ready")
+        await self.stop()
+        return False
+
+    async def stop(self):
+        """Kill the instance's whole process group and drop its profile"""
+        if self.process and self.process.returncode is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await self.process.wait()
+        self.process = None
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    async def restart(self) -> bool:
+        await self.stop()
+        return await self.start()
+
+    async def is_healthy(self) -> bool:
+        if not self.process or self.process.returncode is not None:
+            return False
+        try:
+            info = await asyncio.to_thread(lambda: self._proxy(5).info())
+            return bool(info)
+        except Exception:
+            return False
+
+    async def convert(self, file_path: str, output_path: str, timeout: int) -> bool:
+        """Convert a local file to PDF through the instance's socket"""
+        await asyncio.to_thread(
+            lambda: self._proxy(timeout).convert(
+                os.path.abspath(file_path), None, os.path.abspath(output_path), "pdf"
+            )
+        )
+        self.jobs_done += 1
+        return os.path.exists(output_path)
+
+
+class OfficeConversionPool:
+    """
+    Pool of OfficeInstance workers taking conversions from a queue of idle
+    instances. Instances are recycled after OFFICE_POOL_MAX_JOBS conversions,
+    restarted when a conversion fails or times out, and health-checked while
+    idle every OFFICE_POOL_HEALTH_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.instances: List[OfficeInstance] = []
+        self.idle: Optional[asyncio.Queue] = None
+        self.tasks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.idle is not None
+
+    async def start(self):
+        """Start the pool in the background (called on application startup)"""
+        if self.enabled or settings.OFFICE_POOL_SIZE <= 0:
+            return
+        self.idle = asyncio.Queue()
+        self.instances = [OfficeInstance(i) for i in range(settings.OFFICE_POOL_SIZE)]
+        for instance in self.instances:
+            self._spawn(self._launch(instance))
+        self._spawn(self._health_loop())
+
+    async def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*list(self.tasks), return_exceptions=True)
+        await asyncio.gather(*(instance.stop() for instance in self.instances))
+        self.instances = []
+        self.tasks = set()
+        self.idle = None
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _launch(self, instance: OfficeInstance):
+        # A failed start still enters the queue; the health loop retries it later
+        await instance.start()
+        self.idle.put_nowait(instance)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(settings.OFFICE_POOL_HEALTH_INTERVAL)
+            for _ in range(self.idle.qsize()):
+                instance = self.idle.get_nowait()
+                if not await instance.is_healthy():
+                    print(f"Restarting unhealthy LibreOffice instance {instance.index}")
+                    await instance.restart()
+                self.idle.put_nowait(instance)
+
+    async def convert(self, file_path: str, output_path: str) -> bool:
+        """Run one conversion on an idle instance; False means the caller should fall back"""
+        if not self.enabled:
+            return False
+        try:
+            instance = await asyncio.wait_for(
+                self.idle.get(), timeout=settings.OFFICE_POOL_ACQUIRE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            return False
+
+        recycle = False
+        try:
+            if not instance.process:
+                return False
+            converted = await asyncio.wait_for(
+                instance.convert(file_path, output_path, settings.OFFICE_CONVERSION_TIMEOUT),
+                timeout=settings.OFFICE_CONVERSION_TIMEOUT
+            )
+            recycle = instance.jobs_done >= settings.OFFICE_POOL_MAX_JOBS
+            return converted
+        except Exception as e:
+            print(f"LibreOffice instance {instance.index} failed on {file_path}: {e}")
+            recycle = True
+            return False
+        finally:
+            if recycle:
+                self._spawn(self._recycle(instance))
+            else:
+                self.idle.put_nowait(instance)
+
+    async def _recycle(self, instance: OfficeInstance):
+        """Restart an instance off the request path, then hand it back to the pool"""
+        await instance.restart()
+        self.idle.put_nowait(instance)
+
+
+office_pool = OfficeConversionPool()
+_conversions = SingleFlight()
+
+
+async def convert_with_libreoffice(file_path: str, output_dir: str, final_pdf_path: str) -> Optional[str]:
+    """
+    Convert a document to PDF with LibreOffice.
+    Uses the persistent pool when it is running and falls back to a one-shot
+    headless run with its own throwaway user profile. Concurrent conversions
+    to the same target share one run.
+    """
+    return await _conversions.do(
+        f"pdf:{final_pdf_path}",
+        lambda: _convert_with_libreoffice(file_path, output_dir, final_pdf_path)
+    )
+
+
+async def _convert_with_libreoffice(file_path: str, output_dir: str, final_pdf_path: str) -> Optional[str]:
+    # Targets are content-addressed, so an existing PDF is the same conversion
+    if os.path.exists(final_pdf_path):
+        return final_pdf_path
+    os.makedirs(output_dir, exist_ok=True)
+    # Write under a temporary name so readers never see a partial PDF
+    partial_pdf_path = f"{final_pdf_path}.part"
+    if await office_pool.convert(file_path, partial_pdf_path):
+        os.replace(partial_pdf_path, final_pdf_path)
+        return final_pdf_path
+
+    profile_dir = tempfile.mkdtemp(prefix="docviewer-lo-")
+    try:
+        cmd = [
+            "libreoffice", "--headless",
+            f"-env:UserInstallation={Path(profile_dir).as_uri()}",
+            "--convert-to", "pdf", "--outdir", output_dir, file_path
+        ]
+        returncode, stdout, stderr = await command_utils.run_command(
+            cmd, timeout=settings.OFFICE_CONVERSION_TIMEOUT
+        )
+    finally:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+    if returncode == 0:
+        original_stem = Path(file_path).stem
+        generated_pdf = os.path.join(output_dir, f"{original_stem}.pdf")
+        if os.path.exists(generated_pdf) and generated_pdf != final_pdf_path:
+            os.rename(generated_pdf, final_pdf_path)
+        return final_pdf_path if os.path.exists(final_pdf_path) else None
+    return None
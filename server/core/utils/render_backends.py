@@ -0,0 +1,439 @@
+# core/utils/render_backends.py
+import io
+import os
+import re
+import math
+import glob
+import asyncio
+import tempfile
+import multiprocessing
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from core.utils import command_utils
+
+from PIL import Image
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # Optional: without it every render goes through pdftoppm
+    pdfium = None
+
+try:
+    import pillow_avif  # noqa: F401 - registers the AVIF codec with Pillow
+except ImportError:
+    pass
+
+# Raster output formats: name -> Pillow format
+IMAGE_FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP", "avif": "AVIF"}
+
+
+def supported_image_formats() -> List[str]:
+    """Raster formats Pillow can encode in this environment"""
+    available = set(Image.registered_extensions().values())
+    return [name for name, pil_format in IMAGE_FORMATS.items() if pil_format in available]
+
+
+def encode_image(image: "Image.Image", image_format: str = "png", quality: int = 90) -> bytes:
+    """Encode a rendered page; quality is ignored for PNG"""
+    pil_format = IMAGE_FORMATS[image_format]
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    if pil_format == "PNG":
+        image.save(buffer, pil_format)
+    else:
+        image.save(buffer, pil_format, quality=quality)
+    return buffer.getvalue()
+
+
+class RenderBackend(ABC):
+    """Rasterizes PDF pages to encoded image bytes"""
+    name: str = ""
+
+    @abstractmethod
+    async def render_pages(self, pdf_path: str, pages: List[int], width: int,
+                           priority: command_utils.Priority = command_utils.Priority.NORMAL,
+                           image_format: str = "png", quality: int = 90) -> Dict[int, bytes]:
+        """
+        Render a contiguous range of 1-based pages scaled to `width` pixels.
+        Returns encoded image bytes per page (see IMAGE_FORMATS); pages past
+        the end of the document are omitted.
+        """
+        pass
+
+    @abstractmethod
+    async def get_page_count(self, pdf_path: str) -> int:
+        """Return the number of pages, or 0 if the PDF cannot be read"""
+        pass
+
+    @abstractmethod
+    async def get_page_size(self, pdf_path: str, page_number: int) -> Optional[Tuple[float, float]]:
+        """Return the (width, height) of a page in PDF points, or None if unavailable"""
+        pass
+
+    @abstractmethod
+    async def render_region(self, pdf_path: str, page_number: int, scale: float,
+                            x: int, y: int, width: int, height: int,
+                            priority: command_utils.Priority = command_utils.Priority.NORMAL,
+                            image_format: str = "png", quality: int = 90) -> Optional[bytes]:
+        """
+        Render only a rectangle of a page. The page is scaled by `scale`
+        pixels per PDF point and (x, y, width, height) is the pixel rectangle
+        to cut from it, so memory depends on the region, not the page size.
+        """
+        pass
+
+
+class PdftoppmBackend(RenderBackend):
+    """Forks poppler's pdftoppm/pdfinfo for every call"""
+    name = "pdftoppm"
+
+    async def render_pages(self, pdf_path: str, pages: List[int], width: int,
+                           priority: command_utils.Priority = command_utils.Priority.NORMAL,
+                           image_format: str = "png", quality: int = 90) -> Dict[int, bytes]:
+        with tempfile.TemporaryDirectory(dir=settings.CONVERTED_DIR) as temp_dir:
+            output_prefix = os.path.join(temp_dir, "page")
+            cmd = [
+                "pdftoppm", "-png",
+                "-f", str(pages[0]), "-l", str(pages[-1]),
+                "-scale-to-x", str(width), "-scale-to-y", "-1",
+                pdf_path, output_prefix
+            ]
+            returncode, stdout, stderr = await command_utils.run_command(cmd, priority=priority)
+
+            # pdftoppm names pages <prefix>-<zero padded page number>.png
+            rendered = {}
+            for generated_file in glob.glob(f"{output_prefix}-*.png"):
+                page = int(generated_file[len(output_prefix) + 1:-len(".png")])
+                if image_format == "png":
+                    with open(generated_file, 'rb') as f:
+                        rendered[page] = f.read()
+                else:
+                    with Image.open(generated_file) as image:
+                        rendered[page] = encode_image(image, image_format, quality)
+            if returncode != 0 and not rendered:
+                raise RuntimeError(f"pdftoppm failed for {pdf_path}: {stderr.strip()}")
+            return rendered
+
+    async def get_page_count(self, pdf_path: str) -> int:
+        cmd = ["pdfinfo", pdf_path]
+        returncode, stdout, stderr = await command_utils.run_command(cmd, timeout=30)
+
+        if returncode == 0:
+            for line in stdout.splitlines():
+                if line.startswith("Pages:"):
+                    try:
+                        return int(line.split(":")[1].strip())
+                    except (ValueError, IndexError):
+                        pass
+        return 0
+
+    async def get_page_size(self, pdf_path: str, page_number: int) -> Optional[Tuple[float, float]]:
+        cmd = ["pdfinfo", "-f", str(page_number), "-l", str(page_number), pdf_path]
+        returncode, stdout, stderr = await command_utils.run_command(cmd, timeout=30)
+
+        if returncode == 0:
+            match = re.search(r"^Page\s+\d+\s+size:\s+([\d.]+)\s+x\s+([\d.]+)", stdout, re.MULTILINE)
+            if match:
+                return float(match.group(1)), float(match.group(2))
+        return None
+
+    async def render_region(self, pdf_path: str, page_number: int, scale: float,
+                            x: int, y: int, width: int, height: int,
+                            priority: command_utils.Priority = command_utils.Priority.NORMAL,
+                            image_format: str = "png", quality: int = 90) -> Optional[bytes]:
+        with tempfile.TemporaryDirectory(dir=settings.CONVERTED_DIR) as temp_dir:
+            output_prefix = os.path.join(temp_dir, "region")
+            cmd = [
+                "pdftoppm", "-png", "-singlefile",
+                "-f", str(page_number), "-l", str(page_number),
+                "-r", str(72 * scale),
+                "-x", str(x), "-y", str(y), "-W", str(width), "-H", str(height),
+                pdf_path, output_prefix
+            ]
+            returncode, stdout, stderr = await command_utils.run_command(cmd, priority=priority)
+
+            generated_file = f"{output_prefix}.png"
+            if returncode != 0 or not os.path.exists(generated_file):
+                raise RuntimeError(f"pdftoppm failed for {pdf_path}: {stderr.strip()}")
+            with Image.open(generated_file) as image:
+                return encode_image(image, image_format, quality)
+
+
+def _pdfium_render_page(document: "pdfium.PdfDocument", page_number: int, width: int,
+                        image_format: str, quality: int) -> Optional[bytes]:
+    if page_number > len(document):
+        return None
+    page = document[page_number - 1]
+    try:
+        page_width, _ = page.get_size()
+        image = page.render(scale=width / page_width).to_pil()
+    finally:
+        page.close()
+    return encode_image(image, image_format, quality)
+
+
+def _pdfium_render_region(document: "pdfium.PdfDocument", page_number: int, scale: float,
+                          x: int, y: int, width: int, height: int,
+                          image_format: str, quality: int) -> Optional[bytes]:
+    if page_number > len(document):
+        return None
+    page = document[page_number - 1]
+    try:
+        page_width, page_height = page.get_size()
+        full_width = math.ceil(page_width * scale)
+        full_height = math.ceil(page_height * scale)
+        # PDFium crops whole pixels as ceil(points * scale); nudge each
+        # edge below the pixel boundary so the crop lands exactly on it
+        crop = [
+            max(0.0, (edge - 0.001) / scale) for edge in (
+                x, full_height - y - height, full_width - x - width, y
+            )
+        ]
+        image = page.render(scale=scale, crop=crop).to_pil()
+    finally:
+        page.close()
+    return encode_image(image, image_format, quality)
+
+
+def _pdfium_page_count(document: "pdfium.PdfDocument") -> int:
+    return len(document)
+
+
+def _pdfium_page_size(document: "pdfium.PdfDocument", page_number: int) -> Optional[Tuple[float, float]]:
+    if page_number > len(document):
+        return None
+    page = document[page_number - 1]
+    try:
+        return page.get_size()
+    finally:
+        page.close()
+
+
+_PDFIUM_OPERATIONS = {
+    "render_page": _pdfium_render_page,
+    "render_region": _pdfium_render_region,
+    "page_count": _pdfium_page_count,
+    "page_size": _pdfium_page_size,
+}
+
+
+def _pdfium_worker(connection, handle_cache_size: int):
+    """
+    Worker process loop: one request at a time, so PDFium is only ever used
+    from this process's single thread. Parsed documents stay open in an LRU.
+    """
+    handles: "OrderedDict[str, pdfium.PdfDocument]" = OrderedDict()
+    while True:
+        try:
+            operation, pdf_path, args = connection.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            document = handles.pop(pdf_path, None) or pdfium.PdfDocument(pdf_path)
+            handles[pdf_path] = document
+            while len(handles) > handle_cache_size:
+                handles.popitem(last=False)[1].close()
+            reply = ("ok", _PDFIUM_OPERATIONS[operation](document, *args))
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        connection.send(reply)
+
+
+class PdfiumWorkerError(Exception):
+    """PDFium failed on a request; the worker process itself is still usable"""
+
+
+class _PdfiumProcess:
+    """One PDFium worker process and the pipe to it"""
+
+    def __init__(self):
+        # Spawned, not forked: the server process runs threads
+        context = multiprocessing.get_context("spawn")
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_pdfium_worker, args=(child_connection, settings.RENDER_HANDLE_CACHE_SIZE),
+            name="pdfium-render", daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+
+    async def call(self, operation: str, pdf_path: str, args: tuple, timeout: float):
+        self.connection.send((operation, pdf_path, args))
+        # A killed worker makes poll return (end of file), so these threads never outlive it
+        if not await asyncio.to_thread(self.connection.poll, timeout):
+            raise TimeoutError(f"PDFium did not finish {operation} of {pdf_path} within {timeout} seconds")
+        status, result = await asyncio.to_thread(self.connection.recv)
+        if status == "error":
+            raise PdfiumWorkerError(result)
+        return result
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=settings.PROCESS_KILL_GRACE)
+        self.connection.close()
+
+
+class PdfiumRenderBackend(RenderBackend):
+    """
+    Rasterization with PDFium in a pool of worker processes, each keeping
+    an LRU of parsed documents. Calls wait for a worker under the "pdfium"
+    entry of TOOL_CONCURRENCY, so interactive renders are started ahead of
+    prefetch and thumbnails. A call that runs past RENDER_TIMEOUT, or whose
+    caller is cancelled (e.g. the client disconnected), kills its worker;
+    a fresh one is started for the next call.
+    """
+    name = "pdfium"
+
+    def __init__(self):
+        self.idle: List[_PdfiumProcess] = []
+
+    async def _call(self, priority: command_utils.Priority, operation: str, pdf_path: str, *args):
+        limiter = command_utils.get_limiter(self.name)
+        if limiter:
+            await limiter.acquire(priority)
+        worker = None
+        try:
+            worker = self.idle.pop() if self.idle else _PdfiumProcess()
+            result = await worker.call(operation, pdf_path, args, settings.RENDER_TIMEOUT)
+            self.idle.append(worker)
+            return result
+        except PdfiumWorkerError:
+            self.idle.append(worker)
+            raise
+        except BaseException:
+            # Timed out, cancelled or crashed: the worker may be stuck inside PDFium
+            if worker:
+                await asyncio.to_thread(worker.kill)
+            raise
+        finally:
+            if limiter:
+                limiter.release()
+
+    def close(self):
+        while self.idle:
+            self.idle.pop().kill()
+
+    async def render_pages(self, pdf_path: str, pages: List[int], width: int,
+                           priority: command_utils.Priority = command_utils.Priority.NORMAL,
+                           image_format: str = "png", quality: int = 90) -> Dict[int, bytes]:
+        results = await asyncio.gather(*(
+            self._call(priority, "render_page", pdf_path, page, width, image_format, quality)
+            for page in pages
+        ))
+        return {page: data for page, data in zip(pages, results) if data is not None}
+
+    async def get_page_count(self, pdf_path: str) -> int:
+        try:
+            return await self._call(command_utils.Priority.NORMAL, "page_count", pdf_path)
+        except Exception:
+            return 0
+
+    async def get_page_size(self, pdf_path: str, page_number: int) -> Optional[Tuple[float, float]]:
+        try:
+            return await self._call(command_utils.Priority.NORMAL, "page_size", pdf_path, page_number)
+        except Exception:
+            return None
+
+    async def render_region(self, pdf_path: str, page_number: int, scale: float,
+                            x: int, y: int, width: int, height: int,
+                            priority: command_utils.Priority = command_utils.Priority.NORMAL,
+                            image_format: str = "png", quality: int = 90) -> Optional[bytes]:
+        return await self._call(
+            priority, "render_region", pdf_path, page_number, scale, x, y, width, height, image_format, quality
+        )
+
+
+_subprocess_backend = PdftoppmBackend()
+_backends: Dict[str, RenderBackend] = {}
+
+
+def stop_render_backends():
+    """Stop the PDFium worker processes (called on application shutdown)"""
+    for backend in _backends.values():
+        if isinstance(backend, PdfiumRenderBackend):
+            backend.close()
+
+
+def get_render_backend() -> RenderBackend:
+    """Backend selected by settings.RENDER_BACKEND, falling back to pdftoppm"""
+    if settings.RENDER_BACKEND == PdfiumRenderBackend.name and pdfium is not None:
+        if PdfiumRenderBackend.name not in _backends:
+            _backends[PdfiumRenderBackend.name] = PdfiumRenderBackend()
+        return _backends[PdfiumRenderBackend.name]
+    return _subprocess_backend
+
+
+async def render_pages(pdf_path: str, pages: List[int], width: int,
+                       priority: command_utils.Priority = command_utils.Priority.NORMAL,
+                       image_format: str = "png", quality: int = 90) -> Dict[int, bytes]:
+    """Render pages with the configured backend, retrying with pdftoppm if it fails"""
+    backend = get_render_backend()
+    try:
+        return await backend.render_pages(pdf_path, pages, width, priority, image_format, quality)
+    except Exception as e:
+        if backend is _subprocess_backend:
+            print(f"Error rendering {pdf_path}: {e}")
+            return {}
+        print(f"{backend.name} failed to render {pdf_path}, falling back to pdftoppm: {e}")
+    try:
+        return await _subprocess_backend.render_pages(pdf_path, pages, width, priority, image_format, quality)
+    except Exception as e:
+        print(f"Error rendering {pdf_path}: {e}")
+        return {}
+
+
+async def render_region(pdf_path: str, page_number: int, scale: float,
+                        x: int, y: int, width: int, height: int,
+                        priority: command_utils.Priority = command_utils.Priority.NORMAL,
+                        image_format: str = "png", quality: int = 90) -> Optional[bytes]:
+    """Render a page region with the configured backend, retrying with pdftoppm if it fails"""
+    backend = get_render_backend()
+    args = (pdf_path, page_number, scale, x, y, width, height, priority, image_format, quality)
+    try:
+        return await backend.render_region(*args)
+    except Exception as e:
+        if backend is _subprocess_backend:
+            print(f"Error rendering region of {pdf_path}: {e}")
+            return None
+        print(f"{backend.name} failed to render a region of {pdf_path}, falling back to pdftoppm: {e}")
+    try:
+        return await _subprocess_backend.render_region(*args)
+    except Exception as e:
+        print(f"Error rendering region of {pdf_path}: {e}")
+        return None
+
+
+async def get_page_size(pdf_path: str, page_number: int) -> Optional[Tuple[float, float]]:
+    """Page size in points from the configured backend, retrying with pdfinfo if it fails"""
+    backend = get_render_backend()
+    page_size = await backend.get_page_size(pdf_path, page_number)
+    if page_size is None and backend is not _subprocess_backend:
+        page_size = await _subprocess_backend.get_page_size(pdf_path, page_number)
+    return page_size
+
+
+async def get_pdf_page_count(pdf_path: str) -> int:
+    """Page count from the configured backend, retrying with pdfinfo if it fails"""
+    backend = get_render_backend()
+    page_count = await backend.get_page_count(pdf_path)
+    if page_count == 0 and backend is not _subprocess_backend:
+        page_count = await _subprocess_backend.get_page_count(pdf_path)
+    return page_count
+
+
+async def render_page_svg(pdf_path: str, page_number: int, output_path: str,
+                          priority: command_utils.Priority = command_utils.Priority.NORMAL) -> bool:
+    """Export one page as vector SVG with pdftocairo"""
+    cmd = [
+        "pdftocairo", "-svg",
+        "-f", str(page_number), "-l", str(page_number),
+        pdf_path, output_path
+    ]
+    returncode, stdout, stderr = await command_utils.run_command(cmd, priority=priority)
+    if returncode != 0:
+        print(f"Error exporting page {page_number} of {pdf_path} as SVG: {stderr.strip()}")
+    return returncode == 0 and os.path.exists(output_path)
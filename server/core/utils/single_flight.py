@@ -0,0 +1,93 @@
+# core/utils/single_flight.py
+import os
+import fcntl
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Callable, Awaitable, TypeVar
+
+from config import settings
+
+T = TypeVar("T")
+
+
+@asynccontextmanager
+async def file_lock(key: str, poll_interval: float = 0.05):
+    """
+    Advisory lock shared by every process on the host (e.g. uvicorn workers).
+    The lock is polled with LOCK_NB so waiting stays cancellable. The holder
+    deletes the lock file before releasing it; a waiter that then wins the
+    lock on the deleted file sees that the path is gone or replaced and
+    starts over, so lock files do not pile up.
+    """
+    lock_dir = os.path.join(settings.CONVERTED_DIR, ".locks")
+    os.makedirs(lock_dir, exist_ok=True)
+    lock_path = os.path.join(lock_dir, f"{hashlib.sha1(key.encode()).hexdigest()}.lock")
+
+    while True:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(poll_interval)
+            try:
+                current = os.stat(lock_path).st_ino == os.fstat(fd).st_ino
+            except FileNotFoundError:
+                current = False
+            if not current:
+                continue
+            try:
+                yield
+            finally:
+                os.unlink(lock_path)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            return
+        finally:
+            os.close(fd)
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent work by key. The first caller starts the
+    computation and late arrivals await the same future. The work holds
+    file_lock(key) so other worker processes wait instead of duplicating it;
+    fn should therefore re-check for an existing result before producing one.
+    The computation is cancelled only when every waiter has gone away.
+    """
+
+    def __init__(self):
+        self.flights: Dict[str, _Flight] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        flight = self.flights.get(key)
+        if flight is None or flight.abandoned:
+            flight = _Flight(asyncio.ensure_future(self._run(key, fn)))
+            self.flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.abandoned = True
+                flight.task.cancel()
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        async with file_lock(key):
+            return await fn()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
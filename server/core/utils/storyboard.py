@@ -0,0 +1,154 @@
+# core/utils/storyboard.py
+import os
+import uuid
+import asyncio
+import shutil
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from config import settings
+from core.utils import command_utils
+
+STORYBOARD_TRACK = "storyboard.vtt"
+SAMPLES_FILE = "samples.gray"
+
+
+def storyboard_dir(doc_id: str) -> str:
+    return os.path.join(settings.CONVERTED_DIR, doc_id, "storyboard")
+
+
+def storyboard_track_path(doc_id: str) -> str:
+    return os.path.join(storyboard_dir(doc_id), STORYBOARD_TRACK)
+
+
+def sample_interval(duration: float) -> float:
+    """Seconds between sampled frames, widened so long videos stay within STORYBOARD_MAX_FRAMES"""
+    return max(settings.STORYBOARD_INTERVAL, duration / settings.STORYBOARD_MAX_FRAMES)
+
+
+async def generate_storyboard(file_path: str, doc_id: str, duration: float) -> Optional[Dict[str, Any]]:
+    """
+    Decode the video once, sampling a frame every sample_interval() seconds.
+    The samples are tiled into STORYBOARD_COLUMNS x STORYBOARD_ROWS JPEG
+    sprite sheets described by a WebVTT thumbnail track, and written as
+    grayscale frames that are scored to choose the poster frame.
+    Returns the track path and the poster timestamp, or None on failure.
+    """
+    output_dir = storyboard_dir(doc_id)
+    track_path = storyboard_track_path(doc_id)
+    # Leftovers of an interrupted run are started over
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir, exist_ok=True)
+
+    interval = sample_interval(duration or 0.0)
+    columns, rows = settings.STORYBOARD_COLUMNS, settings.STORYBOARD_ROWS
+    samples_path = os.path.join(output_dir, SAMPLES_FILE)
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error", "-nostats",
+        "-i", file_path,
+        "-filter_complex",
+        f"[0:v]fps=1/{interval:.3f},scale={settings.STORYBOARD_THUMB_WIDTH}:-2,split=2[sheet][score];"
+        f"[sheet]tile={columns}x{rows}[sprites];[score]format=gray[gray]",
+        "-map", "[sprites]", "-q:v", "5", os.path.join(output_dir, "sprite_%03d.jpg"),
+        "-map", "[gray]", "-f", "rawvideo", samples_path,
+    ]
+    returncode, stdout, stderr = await command_utils.run_command(
+        cmd, timeout=settings.STORYBOARD_TIMEOUT, priority=command_utils.Priority.BULK
+    )
+    sprites = sorted(name for name in os.listdir(output_dir) if name.startswith("sprite_"))
+    if returncode != 0 or not sprites or not os.path.exists(samples_path):
+        print(f"Storyboard generation failed for {file_path}: {stderr.strip()[-500:]}")
+        return None
+
+    # Reading the sheet and scoring every sample are CPU work over the whole video, off the event loop
+    thumb_width, thumb_height, scores = await asyncio.to_thread(
+        _measure_and_score, os.path.join(output_dir, sprites[0]), samples_path
+    )
+    frame_count = len(scores) or len(sprites) * columns * rows
+
+    _write_track(track_path, sprites, frame_count, interval, duration, thumb_width, thumb_height)
+    poster_index = int(np.argmax(scores)) if len(scores) else 0
+    # fps=1/interval emits sample k at k * interval
+    poster_time = poster_index * interval
+    if duration:
+        poster_time = min(poster_time, max(0.0, duration - 0.1))
+    return {"storyboard_path": track_path, "poster_time": poster_time}
+
+
+def _measure_and_score(sheet_path: str, samples_path: str):
+    """Thumbnail size read from a sprite sheet, and the scores of the samples (which are then removed)"""
+    columns, rows = settings.STORYBOARD_COLUMNS, settings.STORYBOARD_ROWS
+    with Image.open(sheet_path) as sheet:
+        # tile pads every sheet to the full grid
+        thumb_width, thumb_height = sheet.width // columns, sheet.height // rows
+    try:
+        return thumb_width, thumb_height, score_frames(samples_path, thumb_width, thumb_height)
+    finally:
+        os.remove(samples_path)
+
+
+def score_frames(samples_path: str, width: int, height: int) -> np.ndarray:
+    """
+    Poster suitability of each sampled grayscale frame: the entropy of its
+    histogram plus its contrast, with near-black and near-white frames
+    (fades, title cards) pushed to the bottom.
+    """
+    frame_size = width * height
+    frame_count = os.path.getsize(samples_path) // frame_size if frame_size else 0
+    if not frame_count:
+        return np.zeros(0)
+    frames = np.memmap(samples_path, dtype=np.uint8, mode='r', shape=(frame_count, frame_size))
+
+    scores = np.empty(frame_count)
+    batch = 256
+    bins = 32
+    for start in range(0, frame_count, batch):
+        chunk = np.asarray(frames[start:start + batch])
+        count = len(chunk)
+        # One bincount for the whole batch: each frame gets its own range of bins
+        binned = (chunk >> 3).astype(np.int64) + (np.arange(count) * bins)[:, None]
+        histograms = np.bincount(binned.ravel(), minlength=count * bins).reshape(count, bins) / frame_size
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entropy = -np.nansum(histograms * np.log2(histograms), axis=1)
+        brightness = chunk.mean(axis=1)
+        contrast = chunk.std(axis=1) / 64
+        penalty = np.where((brightness < 24) | (brightness > 232), 10.0, 0.0)
+        scores[start:start + count] = entropy + contrast - penalty
+    del frames
+    return scores
+
+
+def _timestamp(seconds: float) -> str:
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+
+def _write_track(track_path: str, sprites: List[str], frame_count: int, interval: float,
+                 duration: float, thumb_width: int, thumb_height: int):
+    """WebVTT cues pointing at each thumbnail's region of its sprite sheet (media fragment #xywh)"""
+    columns, rows = settings.STORYBOARD_COLUMNS, settings.STORYBOARD_ROWS
+    per_sheet = columns * rows
+    frame_count = min(frame_count, len(sprites) * per_sheet)
+    lines = ["WEBVTT", ""]
+    for i in range(frame_count):
+        start = i * interval
+        end = (i + 1) * interval
+        if duration:
+            # The last sample covers the rest of the video
+            end = duration if i == frame_count - 1 else min(end, duration)
+        if start >= end:
+            break
+        sheet, position = divmod(i, per_sheet)
+        row, column = divmod(position, columns)
+        lines += [
+            f"{_timestamp(start)} --> {_timestamp(end)}",
+            f"{sprites[sheet]}#xywh={column * thumb_width},{row * thumb_height},{thumb_width},{thumb_height}",
+            "",
+        ]
+    temp_path = f"{track_path}.{uuid.uuid4().hex}.part"
+    with open(temp_path, 'w') as f:
+        f.write("\n".join(lines))
+    os.replace(temp_path, track_path)
@@ -0,0 +1,52 @@
+# core/utils/text_extraction.py
+import asyncio
+from typing import AsyncIterator, List, Tuple
+
+import PyPDF2
+
+from config import settings
+from core.utils import command_utils, render_backends
+
+
+async def pdf_page_texts(pdf_path: str) -> AsyncIterator[Tuple[int, str]]:
+    """
+    (page number, text) of every page of a PDF. Pages are extracted by
+    pdftotext in batches of SEARCH_EXTRACT_BATCH_PAGES, under its tool limit
+    at BULK priority; batches pdftotext cannot read fall back to PyPDF2.
+    """
+    page_count = await render_backends.get_pdf_page_count(pdf_path) or \
+        await asyncio.to_thread(_pypdf2_page_count, pdf_path)
+    for first in range(1, page_count + 1, settings.SEARCH_EXTRACT_BATCH_PAGES):
+        last = min(first + settings.SEARCH_EXTRACT_BATCH_PAGES - 1, page_count)
+        cmd = ["pdftotext", "-enc", "UTF-8", "-f", str(first), "-l", str(last), pdf_path, "-"]
+        returncode, stdout, stderr = await command_utils.run_command(
+            cmd, timeout=settings.SEARCH_EXTRACT_TIMEOUT, priority=command_utils.Priority.BULK
+        )
+        if returncode == 0:
+            # pdftotext ends every page with a form feed
+            texts = stdout.split("\f")[:last - first + 1]
+        else:
+            print(f"pdftotext failed for pages {first}-{last} of {pdf_path}, using PyPDF2: {stderr.strip()[-500:]}")
+            texts = await asyncio.to_thread(_pypdf2_texts, pdf_path, first, last)
+        for offset, text in enumerate(texts):
+            yield first + offset, text
+
+
+def _pypdf2_page_count(pdf_path: str) -> int:
+    try:
+        with open(pdf_path, 'rb') as f:
+            return len(PyPDF2.PdfReader(f).pages)
+    except Exception:
+        return 0
+
+
+def _pypdf2_texts(pdf_path: str, first: int, last: int) -> List[str]:
+    texts = []
+    with open(pdf_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for index in range(first - 1, min(last, len(reader.pages))):
+            try:
+                texts.append(reader.pages[index].extract_text() or "")
+            except Exception:
+                texts.append("")
+    return texts
@@ -0,0 +1,203 @@
+# core/utils/text_layer.py
+import os
+import re
+import html
+import json
+import uuid
+import shutil
+import asyncio
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from config import settings
+from core.utils import command_utils
+
+TEXT_LAYER_MANIFEST = "textlayer.json"
+# Columns of the layer: every word of the document in reading order
+WORDS_FILE = "words.txt"  # Word texts joined with \n
+OFFSETS_FILE = "offsets.npy"  # int64, character offset of each word in WORDS_FILE (+ end)
+BOXES_FILE = "boxes.npy"  # float32 (words, 4): xMin, yMin, xMax, yMax in points, origin top-left
+PAGES_FILE = "pages.npy"  # int64, index of each page's first word (+ end)
+SIZES_FILE = "sizes.npy"  # float32 (pages, 2): width, height in points
+
+_PAGE = re.compile(r'<page width="([\d.]+)" height="([\d.]+)"')
+_WORD = re.compile(r'<word xMin="([-\d.]+)" yMin="([-\d.]+)" xMax="([-\d.]+)" yMax="([-\d.]+)">(.*?)</word>')
+
+
+def text_layer_dir(doc_id: str) -> str:
+    return os.path.join(settings.CONVERTED_DIR, doc_id, "textlayer")
+
+
+async def build_text_layer(pdf_path: str, doc_id: str) -> Optional[str]:
+    """
+    Extract every word of a PDF with its bounding box (pdftotext -bbox) and
+    store them as columns. Returns the manifest path, or None on failure.
+    """
+    output_dir = text_layer_dir(doc_id)
+    manifest_path = os.path.join(output_dir, TEXT_LAYER_MANIFEST)
+    if os.path.exists(manifest_path):
+        return manifest_path
+    # Leftovers of an interrupted run are started over
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir, exist_ok=True)
+
+    bbox_path = os.path.join(output_dir, "bbox.html")
+    cmd = ["pdftotext", "-bbox", "-enc", "UTF-8", pdf_path, bbox_path]
+    returncode, stdout, stderr = await command_utils.run_command(
+        cmd, timeout=settings.TEXT_LAYER_TIMEOUT, priority=command_utils.Priority.BULK
+    )
+    if returncode != 0 or not os.path.exists(bbox_path):
+        print(f"Text layer extraction failed for {pdf_path}: {stderr.strip()[-500:]}")
+        return None
+    try:
+        await asyncio.to_thread(_write_columns, bbox_path, output_dir)
+    finally:
+        os.remove(bbox_path)
+
+    temp_path = f"{manifest_path}.{uuid.uuid4().hex}.part"
+    with open(temp_path, 'w') as f:
+        json.dump({"pages": len(np.load(os.path.join(output_dir, SIZES_FILE)))}, f)
+    os.replace(temp_path, manifest_path)
+    return manifest_path
+
+
+def _write_columns(bbox_path: str, output_dir: str):
+    """Stream pdftotext's XHTML line by line into the column files"""
+    # Compact typed arrays: a large document has millions of words
+    sizes = array('f')
+    page_starts = array('q')
+    offsets = array('q')
+    boxes = array('f')
+    position = 0
+    with open(bbox_path, encoding='utf-8', errors='replace') as source, \
+            open(os.path.join(output_dir, WORDS_FILE), 'w', encoding='utf-8') as words:
+        for line in source:
+            word = _WORD.search(line)
+            if word:
+                text = html.unescape(word.group(5)).replace("\n", " ")
+                if offsets:
+                    words.write("\n")
+                    position += 1
+                offsets.append(position)
+                words.write(text)
+                position += len(text)
+                boxes.extend(float(value) for value in word.groups()[:4])
+                continue
+            page = _PAGE.search(line)
+            if page:
+                sizes.extend((float(page.group(1)), float(page.group(2))))
+                page_starts.append(len(offsets))
+
+    page_starts.append(len(offsets))
+    offsets.append(position + 1 if offsets else 0)
+    np.save(os.path.join(output_dir, OFFSETS_FILE), np.frombuffer(offsets, dtype=np.int64))
+    np.save(os.path.join(output_dir, BOXES_FILE), np.frombuffer(boxes, dtype=np.float32).reshape(-1, 4))
+    np.save(os.path.join(output_dir, PAGES_FILE), np.frombuffer(page_starts, dtype=np.int64))
+    np.save(os.path.join(output_dir, SIZES_FILE), np.frombuffer(sizes, dtype=np.float32).reshape(-1, 2))
+
+
+class TextLayer:
+    """Read access to a stored text layer; the numeric columns are memory-mapped"""
+
+    def __init__(self, manifest_path: str):
+        directory = os.path.dirname(manifest_path)
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode='r')
+        self.boxes = np.load(os.path.join(directory, BOXES_FILE), mmap_mode='r')
+        self.page_starts = np.load(os.path.join(directory, PAGES_FILE), mmap_mode='r')
+        self.sizes = np.load(os.path.join(directory, SIZES_FILE), mmap_mode='r')
+        with open(os.path.join(directory, WORDS_FILE), encoding='utf-8') as f:
+            self.text = f.read()
+        self._lowered: Optional[str] = None
+        self._lowered_offsets: Optional[np.ndarray] = None
+
+    @property
+    def page_count(self) -> int:
+        return len(self.sizes)
+
+    def page(self, page_number: int) -> Dict[str, Any]:
+        """Words and boxes of one page (1-based)"""
+        first, last = int(self.page_starts[page_number - 1]), int(self.page_starts[page_number])
+        words = self.text[self.offsets[first]:self.offsets[last] - 1].split("\n") if last > first else []
+        width, height = self.sizes[page_number - 1]
+        return {
+            "page": page_number,
+            "width": float(width),
+            "height": float(height),
+            "text": " ".join(words),
+            "words": words,
+            "boxes": np.round(self.boxes[first:last], 2).tolist(),
+        }
+
+    def _lowercase(self):
+        # Lowercasing can change a word's length, so the offsets are recomputed
+        if self._lowered is None:
+            self._lowered = self.text.lower()
+            lengths = np.fromiter((len(word) + 1 for word in self._lowered.split("\n")), dtype=np.int64)
+            self._lowered_offsets = np.concatenate([[0], np.cumsum(lengths)]) if self.text else np.zeros(1, np.int64)
+        return self._lowered, self._lowered_offsets
+
+    def find(self, query: str, max_matches: int) -> Dict[str, Any]:
+        """
+        Case-insensitive matches of a query, whose words may span words of
+        the layer. Each match has one rectangle per word it touches, trimmed
+        in proportion to the matched characters of the first and last word.
+        """
+        terms = query.lower().split()
+        pages: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        total = 0
+        if not terms or not self.text:
+            return {"total": 0, "truncated": False, "pages": []}
+
+        text, offsets = self._lowercase()
+        needle = "\n".join(terms)
+        position = text.find(needle)
+        while position != -1:
+            if total == max_matches:
+                return {"total": total, "truncated": True, "pages": list(pages.values())}
+            end = position + len(needle)
+            first = int(np.searchsorted(offsets, position, side='right')) - 1
+            last = int(np.searchsorted(offsets, end - 1, side='right')) - 1
+            page_index = int(np.searchsorted(self.page_starts, first, side='right')) - 1
+            page_end = int(self.page_starts[page_index + 1])
+
+            rects = []
+            for index in range(first, min(last, page_end - 1) + 1):
+                x0, y0, x1, y1 = (float(value) for value in self.boxes[index])
+                length = max(1, int(offsets[index + 1] - 1 - offsets[index]))
+                start_fraction = (position - int(offsets[index])) / length if index == first else 0.0
+                end_fraction = (end - int(offsets[index])) / length if index == last else 1.0
+                width = x1 - x0
+                rects.append([round(x0 + width * start_fraction, 2), round(y0, 2),
+                              round(x0 + width * min(end_fraction, 1.0), 2), round(y1, 2)])
+
+            if page_index not in pages:
+                width, height = self.sizes[page_index]
+                pages[page_index] = {"page": page_index + 1, "width": float(width), "height": float(height),
+                                     "matches": []}
+            pages[page_index]["matches"].append({"rects": rects})
+            total += 1
+            position = text.find(needle, position + 1)
+        return {"total": total, "truncated": False, "pages": list(pages.values())}
+
+
+_layers: "OrderedDict[str, TextLayer]" = OrderedDict()
+_layers_lock = threading.Lock()
+
+
+def open_text_layer(manifest_path: str) -> TextLayer:
+    """Recently used layers stay loaded, up to TEXT_LAYER_CACHE_SIZE"""
+    with _layers_lock:
+        layer = _layers.get(manifest_path)
+        if layer is not None:
+            _layers.move_to_end(manifest_path)
+            return layer
+    layer = TextLayer(manifest_path)
+    with _layers_lock:
+        _layers[manifest_path] = layer
+        while len(_layers) > settings.TEXT_LAYER_CACHE_SIZE:
+            _layers.popitem(last=False)
+    return layer
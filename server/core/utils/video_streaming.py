@@ -0,0 +1,263 @@
+# core/utils/video_streaming.py
+import os
+import json
+import uuid
+import shutil
+import struct
+import asyncio
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set
+
+from config import settings
+from core.utils import command_utils
+from core.utils.single_flight import SingleFlight
+
+# Containers and codecs every supported browser plays through a <video> tag
+NATIVE_VIDEO_EXTENSIONS = {'.mp4', '.m4v', '.webm', '.mov', '.ogv'}
+NATIVE_VIDEO_CODECS = {'h264', 'vp8', 'vp9', 'av1', 'theora'}
+
+# ISO base media containers that can carry their index (moov) after the media data
+FASTSTART_EXTENSIONS = {'.mp4', '.m4v', '.mov'}
+
+HLS_MASTER_PLAYLIST = "master.m3u8"
+HLS_COMPLETE_MARKER = ".complete"
+# Written when ffmpeg fails, so a video it cannot transcode is not retried on every request
+HLS_FAILED_MARKER = ".failed"
+# Concurrency limit key of transcodes (see settings.TOOL_CONCURRENCY)
+HLS_TOOL = "ffmpeg-hls"
+
+_transcodes = SingleFlight()
+_background_tasks: Set[asyncio.Task] = set()
+_running_hls: Set[str] = set()
+
+
+async def probe_video(file_path: str) -> Optional[Dict[str, Any]]:
+    """ffprobe streams and format of a video, or None if it cannot be read"""
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-print_format", "json",
+        "-show_format", "-show_streams", file_path
+    ]
+    returncode, stdout, stderr = await command_utils.run_command(cmd, timeout=60)
+    if returncode != 0:
+        return None
+    try:
+        return json.loads(stdout)
+    except ValueError:
+        return None
+
+
+def needs_transcode(file_path: str, probe: Optional[Dict[str, Any]]) -> bool:
+    """Whether browsers need an HLS rendition to play the file"""
+    if Path(file_path).suffix.lower() not in NATIVE_VIDEO_EXTENSIONS:
+        return True
+    if not probe:
+        return False
+    video_stream = next((s for s in probe.get("streams", []) if s.get("codec_type") == "video"), None)
+    return bool(video_stream) and video_stream.get("codec_name") not in NATIVE_VIDEO_CODECS
+
+
+def needs_faststart(file_path: str) -> bool:
+    """
+    Whether an MP4/MOV stores its moov box after mdat, so browsers must fetch
+    the whole file before the first frame. Only top-level box headers are
+    read, a few bytes per box however large the file is.
+    """
+    if Path(file_path).suffix.lower() not in FASTSTART_EXTENSIONS:
+        return False
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        offset = 0
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            header = f.read(16)
+            if len(header) < 8:
+                return False
+            size, box_type = struct.unpack(">I4s", header[:8])
+            if size == 1:
+                # 64-bit size follows the type
+                if len(header) < 16:
+                    return False
+                size = struct.unpack(">Q", header[8:16])[0]
+            elif size == 0:
+                # Box extends to the end of the file
+                size = file_size - offset
+            if box_type == b"moov":
+                return False
+            if box_type == b"mdat":
+                return True
+            if size < 8:
+                return False  # Corrupt; leave the file as it is
+            offset += size
+    return False
+
+
+def faststart_path(file_path: str, doc_id: str) -> str:
+    return os.path.join(settings.CONVERTED_DIR, doc_id, f"{doc_id}.faststart{Path(file_path).suffix.lower()}")
+
+
+async def ensure_faststart(file_path: str, doc_id: str) -> Optional[str]:
+    """
+    Copy of the video with moov moved ahead of mdat, or None if the remux
+    fails. Streams are copied, not re-encoded.
+    """
+    output_path = faststart_path(file_path, doc_id)
+    return await _transcodes.do(
+        f"faststart:{doc_id}",
+        lambda: _remux_faststart(file_path, output_path)
+    )
+
+
+async def _remux_faststart(file_path: str, output_path: str) -> Optional[str]:
+    if os.path.exists(output_path):
+        return output_path
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # Write under a temporary name so /preview never serves a partial file
+    temp_path = f"{output_path}.{uuid.uuid4().hex}.part{Path(output_path).suffix}"
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error", "-nostats",
+        "-i", file_path,
+        "-map", "0", "-c", "copy",
+        "-movflags", "+faststart",
+        temp_path
+    ]
+    returncode, stdout, stderr = await command_utils.run_command(
+        cmd, timeout=settings.FASTSTART_REMUX_TIMEOUT, priority=command_utils.Priority.BULK
+    )
+    if returncode != 0 or not os.path.exists(temp_path):
+        print(f"Faststart remux failed for {file_path}: {stderr.strip()[-500:]}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def hls_dir(doc_id: str) -> str:
+    return os.path.join(settings.CONVERTED_DIR, doc_id, "hls")
+
+
+def hls_master_path(doc_id: str) -> str:
+    return os.path.join(hls_dir(doc_id), HLS_MASTER_PLAYLIST)
+
+
+def is_hls_complete(doc_id: str) -> bool:
+    return os.path.exists(os.path.join(hls_dir(doc_id), HLS_COMPLETE_MARKER))
+
+
+def is_hls_failed(doc_id: str) -> bool:
+    return os.path.exists(os.path.join(hls_dir(doc_id), HLS_FAILED_MARKER))
+
+
+def start_hls_transcode(file_path: str, doc_id: str, probe: Optional[Dict[str, Any]] = None):
+    """
+    Transcode to HLS in the background; returns immediately. Also restarts
+    a transcode that a restart interrupted (its playlist is never finished),
+    but not one that failed.
+    """
+    if is_hls_complete(doc_id) or is_hls_failed(doc_id) or doc_id in _running_hls:
+        return
+    task = asyncio.create_task(ensure_hls(file_path, doc_id, probe))
+    _running_hls.add(doc_id)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    task.add_done_callback(lambda _: _running_hls.discard(doc_id))
+
+
+async def stop_transcodes():
+    """Cancel running background transcodes, killing their ffmpeg (called on application shutdown)"""
+    for task in list(_background_tasks):
+        task.cancel()
+    await asyncio.gather(*list(_background_tasks), return_exceptions=True)
+
+
+async def ensure_hls(file_path: str, doc_id: str, probe: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Produce the HLS renditions of a video and return the master playlist.
+    Concurrent callers (and other worker processes) share one transcode.
+    """
+    return await _transcodes.do(
+        f"hls:{doc_id}",
+        lambda: _transcode_hls(file_path, doc_id, probe)
+    )
+
+
+def _ladder(probe: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rungs of HLS_LADDER no taller than the source (always at least the smallest)"""
+    ladder = sorted(settings.HLS_LADDER, key=lambda rung: rung["height"])
+    video_stream = next(
+        (s for s in (probe or {}).get("streams", []) if s.get("codec_type") == "video"), None
+    )
+    source_height = (video_stream or {}).get("height")
+    if not source_height:
+        return ladder[:2]
+    return [rung for rung in ladder if rung["height"] <= source_height] or ladder[:1]
+
+
+async def _transcode_hls(file_path: str, doc_id: str, probe: Optional[Dict[str, Any]]) -> Optional[str]:
+    output_dir = hls_dir(doc_id)
+    master_path = hls_master_path(doc_id)
+    if is_hls_complete(doc_id):
+        return master_path
+    if is_hls_failed(doc_id):
+        return None
+
+    # Leftovers of an interrupted run are started over
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir, exist_ok=True)
+
+    probe = probe or await probe_video(file_path)
+    has_audio = any(s.get("codec_type") == "audio" for s in (probe or {}).get("streams", []))
+    ladder = _ladder(probe)
+
+    # One decode, split and scaled once per rung
+    split = f"[0:v]split={len(ladder)}" + "".join(f"[v{i}]" for i in range(len(ladder)))
+    scales = ";".join(
+        f"[v{i}]scale=-2:{rung['height']}[v{i}out]" for i, rung in enumerate(ladder)
+    )
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error", "-nostats",
+        "-i", file_path, "-filter_complex", f"{split};{scales}"
+    ]
+    stream_map = []
+    for i, rung in enumerate(ladder):
+        cmd += [
+            "-map", f"[v{i}out]",
+            f"-c:v:{i}", "libx264", f"-b:v:{i}", rung["video_bitrate"],
+            f"-maxrate:v:{i}", rung["video_bitrate"], f"-bufsize:v:{i}", rung["video_bitrate"],
+        ]
+        if has_audio:
+            cmd += ["-map", "0:a:0", f"-c:a:{i}", "aac", f"-b:a:{i}", rung["audio_bitrate"]]
+            stream_map.append(f"v:{i},a:{i},name:{rung['height']}p")
+        else:
+            stream_map.append(f"v:{i},name:{rung['height']}p")
+
+    segment_seconds = settings.HLS_SEGMENT_SECONDS
+    cmd += [
+        "-preset", "veryfast",
+        # Fixed GOPs aligned with segment boundaries so every rung can switch at each segment
+        "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})", "-sc_threshold", "0",
+        "-f", "hls",
+        "-hls_time", str(segment_seconds),
+        # EVENT playlists grow as segments are written, so playback starts before the transcode ends
+        "-hls_playlist_type", "event",
+        "-hls_flags", "independent_segments+temp_file",
+        "-hls_segment_filename", os.path.join(output_dir, "%v", "segment_%05d.ts"),
+        "-master_pl_name", HLS_MASTER_PLAYLIST,
+        "-var_stream_map", " ".join(stream_map),
+        os.path.join(output_dir, "%v", "index.m3u8"),
+    ]
+
+    returncode, stdout, stderr = await command_utils.run_command(
+        cmd, timeout=settings.HLS_TRANSCODE_TIMEOUT, priority=command_utils.Priority.BULK, tool=HLS_TOOL
+    )
+    if returncode != 0 or not os.path.exists(master_path):
+        print(f"HLS transcode failed for {file_path}: {stderr.strip()[-500:]}")
+        with open(os.path.join(output_dir, HLS_FAILED_MARKER), 'w') as f:
+            f.write(stderr.strip()[-500:])
+        return None
+
+    with open(os.path.join(output_dir, HLS_COMPLETE_MARKER), 'w') as f:
+        f.write("")
+    return master_path
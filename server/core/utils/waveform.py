@@ -0,0 +1,207 @@
+# core/utils/waveform.py
+import os
+import json
+import asyncio
+import uuid
+import struct
+import shutil
+from typing import Dict, Any, Optional
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from config import settings
+from core.utils import command_utils
+
+WAVEFORM_MANIFEST = "waveform.json"
+SAMPLES_FILE = "samples.pcm"
+# audiowaveform's binary format (version 1), which peaks.js and wavesurfer read directly
+DAT_HEADER = struct.Struct("<iIiiI")  # version, flags, sample rate, samples per pixel, length
+FLAG_8_BIT = 1
+
+
+def waveform_dir(doc_id: str) -> str:
+    return os.path.join(settings.CONVERTED_DIR, doc_id, "waveform")
+
+
+def waveform_manifest_path(doc_id: str) -> str:
+    return os.path.join(waveform_dir(doc_id), WAVEFORM_MANIFEST)
+
+
+def level_path(doc_id: str, level: int) -> str:
+    return level_file(waveform_manifest_path(doc_id), level)
+
+
+def level_file(manifest_path: str, level: int) -> str:
+    return os.path.join(os.path.dirname(manifest_path), f"level_{level}.dat")
+
+
+def load_manifest(manifest_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+async def generate_waveform(file_path: str, doc_id: str) -> Optional[str]:
+    """
+    Decode the audio once to mono PCM at WAVEFORM_SAMPLE_RATE and reduce it
+    to min/max peak pairs at every zoom level in WAVEFORM_LEVELS (samples
+    per pixel). Each level is written as an audiowaveform .dat file of
+    WAVEFORM_BITS-bit pairs. Returns the manifest path, or None on failure.
+    """
+    output_dir = waveform_dir(doc_id)
+    manifest_path = waveform_manifest_path(doc_id)
+    # Leftovers of an interrupted run are started over
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir, exist_ok=True)
+
+    samples_path = os.path.join(output_dir, SAMPLES_FILE)
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error", "-nostats",
+        "-i", file_path,
+        "-vn", "-ac", "1", "-ar", str(settings.WAVEFORM_SAMPLE_RATE),
+        "-f", "s16le", "-acodec", "pcm_s16le", samples_path,
+    ]
+    returncode, stdout, stderr = await command_utils.run_command(
+        cmd, timeout=settings.WAVEFORM_TIMEOUT, priority=command_utils.Priority.BULK
+    )
+    if returncode != 0 or not os.path.exists(samples_path):
+        print(f"Waveform generation failed for {file_path}: {stderr.strip()[-500:]}")
+        return None
+
+    # Reducing the samples is numpy work over the whole file, so it stays off the event loop
+    await asyncio.to_thread(_write_levels, samples_path, doc_id, manifest_path)
+    return manifest_path
+
+
+def _write_levels(samples_path: str, doc_id: str, manifest_path: str):
+    """Reduce the decoded samples to every zoom level and write them with the manifest"""
+    levels = sorted(set(settings.WAVEFORM_LEVELS))
+    duration = os.path.getsize(samples_path) / 2 / settings.WAVEFORM_SAMPLE_RATE
+    try:
+        finest = compute_peaks(samples_path, levels[0])
+    finally:
+        os.remove(samples_path)
+
+    manifest_levels = []
+    for index, requested in enumerate(levels):
+        # Coarser levels are merged from the finest one, so they step in whole multiples of it
+        factor = max(1, requested // levels[0])
+        samples_per_pixel = levels[0] * factor
+        peaks = downsample_peaks(finest, factor)
+        _write_dat(level_path(doc_id, index), peaks, samples_per_pixel)
+        manifest_levels.append({"samples_per_pixel": samples_per_pixel, "length": len(peaks)})
+
+    manifest = {
+        "sample_rate": settings.WAVEFORM_SAMPLE_RATE,
+        "bits": settings.WAVEFORM_BITS,
+        "duration": duration,
+        "levels": manifest_levels,
+    }
+    _write_atomic(manifest_path, json.dumps(manifest).encode())
+
+
+def compute_peaks(samples_path: str, samples_per_pixel: int) -> np.ndarray:
+    """
+    (length, 2) int16 array of the min and max sample of every
+    samples_per_pixel-long run, read block by block from the PCM file.
+    """
+    sample_count = os.path.getsize(samples_path) // 2
+    length = -(-sample_count // samples_per_pixel)
+    peaks = np.zeros((length, 2), dtype=np.int16)
+    if not sample_count:
+        return peaks
+    samples = np.memmap(samples_path, dtype='<i2', mode='r', shape=(sample_count,))
+
+    # Whole pixels per block, so no pixel straddles two blocks
+    block = samples_per_pixel * 4096
+    for start in range(0, sample_count, block):
+        chunk = np.asarray(samples[start:start + block])
+        pixels = -(-len(chunk) // samples_per_pixel)
+        padding = pixels * samples_per_pixel - len(chunk)
+        if padding:
+            # Repeating the last sample leaves the min/max of the tail unchanged
+            chunk = np.concatenate([chunk, np.full(padding, chunk[-1], dtype=chunk.dtype)])
+        chunk = chunk.reshape(pixels, samples_per_pixel)
+        first = start // samples_per_pixel
+        peaks[first:first + pixels, 0] = chunk.min(axis=1)
+        peaks[first:first + pixels, 1] = chunk.max(axis=1)
+    del samples
+    return peaks
+
+
+def downsample_peaks(peaks: np.ndarray, factor: int) -> np.ndarray:
+    """Merge every `factor` consecutive min/max pairs into one"""
+    if factor <= 1 or not len(peaks):
+        return peaks
+    length = -(-len(peaks) // factor)
+    padding = length * factor - len(peaks)
+    if padding:
+        peaks = np.concatenate([peaks, np.repeat(peaks[-1:], padding, axis=0)])
+    grouped = peaks.reshape(length, factor, 2)
+    return np.stack([grouped[:, :, 0].min(axis=1), grouped[:, :, 1].max(axis=1)], axis=1)
+
+
+def read_level(dat_path: str) -> Dict[str, Any]:
+    """A .dat level in audiowaveform's JSON layout: min/max pairs flattened into `data`"""
+    with open(dat_path, 'rb') as f:
+        _, flags, sample_rate, samples_per_pixel, length = DAT_HEADER.unpack(f.read(DAT_HEADER.size))
+        bits = 8 if flags & FLAG_8_BIT else 16
+        data = np.frombuffer(f.read(), dtype='<i1' if bits == 8 else '<i2')
+    return {
+        "version": 2,
+        "channels": 1,
+        "sample_rate": sample_rate,
+        "samples_per_pixel": samples_per_pixel,
+        "bits": bits,
+        "length": length,
+        "data": data.tolist(),
+    }
+
+
+def level_json(dat_path: str) -> str:
+    """read_level serialized compactly, for the JSON variant of the waveform endpoint"""
+    return json.dumps(read_level(dat_path), separators=(",", ":"))
+
+
+def render_thumbnail(manifest_path: str, thumbnail_path: str, size=(400, 240)) -> Optional[str]:
+    """Draw the thumbnail from the coarsest level that still covers its width, without decoding again"""
+    manifest = load_manifest(manifest_path)
+    if not manifest or not manifest["levels"]:
+        return None
+    width, height = size
+    levels = manifest["levels"]
+    level = max((i for i, info in enumerate(levels) if info["length"] >= width), default=0)
+    info = read_level(level_file(manifest_path, level))
+    length, bits = info["length"], info["bits"]
+    if not length:
+        return None
+
+    peaks = np.array(info["data"], dtype=np.int32).reshape(length, 2)
+    columns = downsample_peaks(peaks, -(-length // width)) / (1 << (bits - 1))
+    middle = height / 2
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for x, (low, high) in enumerate(columns):
+        draw.line([(x, middle - high * middle), (x, middle - low * middle)], fill="white")
+    image.save(thumbnail_path)
+    return thumbnail_path
+
+
+def _write_dat(dat_path: str, peaks: np.ndarray, samples_per_pixel: int):
+    if settings.WAVEFORM_BITS == 8:
+        # Keep the top byte of each 16-bit sample
+        data, flags = (peaks >> 8).astype('<i1'), FLAG_8_BIT
+    else:
+        data, flags = peaks.astype('<i2'), 0
+    header = DAT_HEADER.pack(1, flags, settings.WAVEFORM_SAMPLE_RATE, samples_per_pixel, len(peaks))
+    _write_atomic(dat_path, header + data.tobytes())
+
+
+def _write_atomic(path: str, content: bytes):
+    temp_path = f"{path}.{uuid.uuid4().hex}.part"
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
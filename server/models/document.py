@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 import uuid
@@ -29,13 +29,26 @@ class Document(BaseModel):
     file_type: str
     size: int
     file_path: str
+    content_hash: Optional[str] = None  # SHA-256 of the uploaded bytes
+    artifact_key: Optional[str] = None  # Key of the shared converted/thumbnail artifacts
     converted_path: Optional[str] = None
+    linearized_path: Optional[str] = None  # Fast web view PDF served by /preview
+    hls_path: Optional[str] = None  # HLS master playlist of videos browsers cannot play natively
+    storyboard_path: Optional[str] = None  # WebVTT thumbnail track of video scrub previews
+    waveform_path: Optional[str] = None  # Manifest of the audio waveform peak levels
+    line_index_path: Optional[str] = None  # Manifest of the line offset index of plain text
+    highlight_path: Optional[str] = None  # Manifest of highlighted code / rendered Markdown chunks
+    text_layer_path: Optional[str] = None  # Manifest of the per-page words and boxes of the PDF
+    member_index_path: Optional[str] = None  # Member index of archives
+    parent_id: Optional[str] = None  # Archive document of a virtual member document
+    member_path: Optional[str] = None  # Path of a virtual member document inside its parent
     thumbnail_path: Optional[str] = None
     total_pages: int = 1
     metadata: Optional[DocumentMetadata] = None
 
     # Plain text/code/comic/database flags
     is_plain_text: bool = False
+    status: str = "ready"  # processing, ready or failed
     is_code_file: bool = False
     is_comic: bool = False
     is_database: bool = False
@@ -68,4 +81,13 @@ class Comment(BaseModel):
     author: str
     created_at: datetime = datetime.now()
     updated_at: datetime = datetime.now()
-    is_edited: bool = False
\ No newline at end of file
+    is_edited: bool = False
+
+class ProcessingJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    document_id: str
+    status: str = "queued"  # queued, processing, completed, failed
+    stages: List[str] = []  # Completed stages: saved, converted, thumbnailed, linearized, text_layer, metadata, indexed
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
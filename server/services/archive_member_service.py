@@ -0,0 +1,132 @@
+# services/archive_member_service.py
+import os
+import hashlib
+import mimetypes
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Tuple
+
+from models.document import Document
+from core.utils import archive_access
+from core.utils.single_flight import SingleFlight
+from services.artifact_store import ArtifactStore
+from services.document_service import DocumentService
+
+MEMBER_SOURCE = "source"
+
+_openings = SingleFlight()
+
+
+class ArchiveMemberService:
+    """
+    Archive members viewed as documents of their own. A member path is
+    resolved through the member index, descending into nested archives
+    ("outer/inner.zip/docs/report.pdf"). The member is extracted once into
+    the artifact directory of ArtifactStore.member_key, derived from the
+    archive's content-hash key, and processed there like an upload: by the
+    handler of its extension, then linearized and given a text layer. Repeat
+    views (from any upload of the same archive) reuse the extracted file and
+    all of its artifacts. The resulting virtual document is registered with
+    the DocumentService, so the page, tile, preview, find and text endpoints
+    serve it like an upload.
+    """
+
+    def __init__(self, document_service: DocumentService):
+        self.document_service = document_service
+
+    async def resolve(self, document: Document, member_path: str) -> Tuple[str, str, archive_access.ArchiveIndex,
+                                                                          Dict[str, Any], str]:
+        """
+        (archive file, archive key, index, member, member path in that archive)
+        of the innermost archive holding member_path. Nested archives on the
+        way are opened as virtual documents themselves.
+        """
+        archive_path = document.file_path
+        archive_key = document.artifact_key or document.id
+        index_path = document.member_index_path
+        parts = [part for part in member_path.split("/") if part]
+        while True:
+            index = archive_access.open_archive_index(index_path) if index_path else None
+            if not index:
+                raise archive_access.MemberNotFoundError(f"No member {member_path} in this archive.")
+
+            # The first file along the path is the member, or the archive it continues in
+            depth = 1
+            while depth < len(parts):
+                row = index.row("/".join(parts[:depth]))
+                if row is None or not index.entries["is_dir"][row]:
+                    break
+                depth += 1
+            name = "/".join(parts[:depth])
+            member = index.member(name)
+            if depth == len(parts):
+                return archive_path, archive_key, index, member, name
+            if not archive_access.archive_format(name):
+                raise archive_access.MemberNotFoundError(f"No member {member_path} in this archive.")
+
+            archive_path, archive_key, processed_info = await self._materialize(
+                archive_path, archive_key, index, member, name
+            )
+            index_path = processed_info.get("member_index_path")
+            parts = parts[depth:]
+
+    async def _materialize(self, archive_path: str, archive_key: str, index: archive_access.ArchiveIndex,
+                           member: Dict[str, Any], name: str) -> Tuple[str, str, Dict[str, Any]]:
+        """Extracted file, artifact key and handler output of a member, each produced only once"""
+        artifact_store = self.document_service.artifact_store
+        member_key = ArtifactStore.member_key(archive_key, name)
+        source_path = os.path.join(artifact_store.artifact_dir(member_key), MEMBER_SOURCE + Path(name).suffix.lower())
+
+        processed_info = artifact_store.get_processed_info(member_key)
+        if processed_info is None or not os.path.exists(source_path):
+            await archive_access.extract_member(archive_path, archive_key, index, member, source_path)
+            processed_info = await self.document_service.process_document(source_path, member_key)
+        return source_path, member_key, processed_info
+
+    async def open_document(self, document: Document, member_path: str) -> Document:
+        """The virtual document of an archive member, registered under a stable id"""
+        path = "/".join(part for part in member_path.split("/") if part)
+        virtual_id = f"{document.id}~{hashlib.sha1(path.encode()).hexdigest()[:16]}"
+        virtual = self.document_service.get_document(virtual_id)
+        if virtual:
+            return virtual
+        return await _openings.do(f"member:{virtual_id}", lambda: self._open_document(document, path, virtual_id))
+
+    async def _open_document(self, document: Document, member_path: str, virtual_id: str) -> Document:
+        archive_path, archive_key, index, member, name = await self.resolve(document, member_path)
+        source_path, member_key, processed_info = await self._materialize(
+            archive_path, archive_key, index, member, name
+        )
+        # Both are recorded in the member's manifest, so only the first opening builds them
+        linearized_path = await self.document_service.linearize_document(source_path, member_key, processed_info)
+        text_layer_path = await self.document_service.build_text_layer(source_path, member_key, processed_info)
+
+        file_name = os.path.basename(name)
+        virtual = Document(
+            id=virtual_id,
+            name=file_name,
+            original_name=file_name,
+            file_type=mimetypes.guess_type(file_name)[0] or "application/octet-stream",
+            size=os.path.getsize(source_path),
+            file_path=source_path,
+            content_hash=member_key,
+            artifact_key=member_key,
+            parent_id=document.id,
+            member_path=member_path,
+            converted_path=processed_info.get("converted_path"),
+            thumbnail_path=processed_info.get("thumbnail_path"),
+            linearized_path=linearized_path,
+            text_layer_path=text_layer_path,
+            hls_path=processed_info.get("hls_path"),
+            storyboard_path=processed_info.get("storyboard_path"),
+            waveform_path=processed_info.get("waveform_path"),
+            line_index_path=processed_info.get("line_index_path"),
+            highlight_path=processed_info.get("highlight_path"),
+            member_index_path=processed_info.get("member_index_path"),
+            total_pages=processed_info.get("total_pages", 1),
+            is_plain_text=processed_info.get("is_plain_text", False),
+            created_at=document.created_at,
+            updated_at=datetime.now(),
+        )
+        self.document_service.register_virtual_document(virtual)
+        return virtual
@@ -0,0 +1,108 @@
+# services/artifact_store.py
+import os
+import glob
+import json
+import shutil
+import hashlib
+from typing import Dict, Any, Optional, Set
+
+from config import settings
+from core.utils.cache_manager import page_cache
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for processed artifacts.
+    Converted PDFs, thumbnails and page renders are written under an artifact
+    key derived from the upload's SHA-256, so documents with identical bytes
+    share them. Document ids are kept as references to the key and the
+    artifacts are removed once the last reference is released.
+    """
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(self):
+        self.references: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def artifact_key(content_hash: str, file_ext: str) -> str:
+        """Build the artifact key; the extension is part of it since it selects the handler"""
+        ext = file_ext.lower().lstrip('.') or "bin"
+        return f"{content_hash}-{ext}"
+
+    @staticmethod
+    def member_key(archive_key: str, member_path: str) -> str:
+        """
+        Key of an archive member's artifacts, derived from the archive's key:
+        its artifacts live and are purged with the archive's content hash
+        """
+        member_hash = hashlib.sha1(member_path.encode()).hexdigest()[:16]
+        return f"{archive_key}.{ArtifactStore.artifact_key(member_hash, os.path.splitext(member_path)[1])}"
+
+    def artifact_dir(self, artifact_key: str) -> str:
+        return os.path.join(settings.CONVERTED_DIR, artifact_key)
+
+    def manifest_path(self, artifact_key: str) -> str:
+        return os.path.join(self.artifact_dir(artifact_key), self.MANIFEST_NAME)
+
+    def get_processed_info(self, artifact_key: str) -> Optional[Dict[str, Any]]:
+        """Return the stored handler output for a key, or None if it is missing or stale"""
+        try:
+            with open(self.manifest_path(artifact_key), 'r', encoding='utf-8') as f:
+                processed_info = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        for path_key in ("converted_path", "thumbnail_path"):
+            path = processed_info.get(path_key)
+            if path and not os.path.exists(path):
+                return None
+        return processed_info
+
+    def save_processed_info(self, artifact_key: str, processed_info: Dict[str, Any]):
+        """Persist handler output so a repeat upload becomes a lookup"""
+        os.makedirs(self.artifact_dir(artifact_key), exist_ok=True)
+        manifest_path = self.manifest_path(artifact_key)
+        temp_path = f"{manifest_path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(processed_info, f, default=str)
+            os.replace(temp_path, manifest_path)
+        except (OSError, TypeError) as e:
+            print(f"Could not save artifact manifest for {artifact_key}: {e}")
+
+    def add_reference(self, artifact_key: str, document_id: str):
+        self.references.setdefault(artifact_key, set()).add(document_id)
+
+    def release(self, artifact_key: str, document_id: str) -> bool:
+        """Drop a document's reference; purge the artifacts if it was the last one"""
+        document_ids = self.references.get(artifact_key)
+        if document_ids is not None:
+            document_ids.discard(document_id)
+            if document_ids:
+                return False
+            del self.references[artifact_key]
+        self.purge(artifact_key)
+        return True
+
+    def purge(self, artifact_key: str):
+        """Remove every artifact stored under a key, and those of its archive members"""
+        member_dirs = glob.glob(os.path.join(glob.escape(settings.CONVERTED_DIR), f"{glob.escape(artifact_key)}.*"))
+        for member_dir in member_dirs:
+            if os.path.isdir(member_dir):
+                self._purge_key(os.path.basename(member_dir))
+        self._purge_key(artifact_key)
+
+    def _purge_key(self, artifact_key: str):
+        for directory in (
+            self.artifact_dir(artifact_key),
+            os.path.join(settings.CONVERTED_DIR, "pages", artifact_key),
+            os.path.join(settings.CONVERTED_DIR, f"thumb_{artifact_key}"),
+            os.path.join(settings.CONVERTED_DIR, f"thumb_temp_{artifact_key}"),
+        ):
+            shutil.rmtree(directory, ignore_errors=True)
+            page_cache.forget(directory)
+
+        thumbnail_path = os.path.join(settings.THUMBNAILS_DIR, f"{artifact_key}_thumb.png")
+        if os.path.exists(thumbnail_path):
+            os.remove(thumbnail_path)
+            page_cache.forget(thumbnail_path)
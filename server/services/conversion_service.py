@@ -1,12 +1,21 @@
 import os
-import glob
+import uuid
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Dict, Tuple, Set
+from collections import OrderedDict
 import asyncio
 
 from core.utils import command_utils
+from core.utils.office_pool import convert_with_libreoffice
+from core.utils.single_flight import SingleFlight
+from core.utils.cache_manager import page_cache
 from config import settings
 from core.registry import extensions
+from core.utils import render_backends
+
+_conversions = SingleFlight()
+_page_renders = SingleFlight()
+
 
 class ConversionService:
     def __init__(self):
@@ -32,58 +41,85 @@ class ConversionService:
         Creates a dedicated directory for each conversion.
         """
         output_dir = os.path.join(settings.CONVERTED_DIR, document_id)
-        os.makedirs(output_dir, exist_ok=True)
-
         final_pdf_path = os.path.join(output_dir, f"{document_id}.pdf")
         if os.path.exists(final_pdf_path):
             return final_pdf_path
 
         file_ext = Path(file_path).suffix.lower()
-        cmd = []
 
-        if file_ext in self.OFFICE_EXTS:
-            cmd = ["libreoffice", "--headless", "--convert-to", "pdf", "--outdir", output_dir, file_path]
-        elif file_ext in self.TEXT_EXTS:
+        if file_ext in self.TEXT_EXTS:
             cmd = ["pandoc", file_path, "-o", final_pdf_path]
         elif file_ext in self.LATEX_EXTS:
             cmd = ["pdflatex", "-output-directory", output_dir, "-jobname", document_id, file_path]
         else:
-            cmd = ["libreoffice", "--headless", "--convert-to", "pdf", "--outdir", output_dir, file_path]
+            # Office documents and everything else go through the LibreOffice pool
+            return await convert_with_libreoffice(file_path, output_dir, final_pdf_path)
+
+        # Concurrent conversions to the same target share one run
+        return await _conversions.do(
+            f"pdf:{final_pdf_path}",
+            lambda: self._run_converter(cmd, output_dir, final_pdf_path)
+        )
+
+    async def _run_converter(self, cmd: list[str], output_dir: str, final_pdf_path: str) -> Optional[str]:
+        if os.path.exists(final_pdf_path):
+            return final_pdf_path
+        os.makedirs(output_dir, exist_ok=True)
 
         returncode, stdout, stderr = await command_utils.run_command(cmd)
 
-        # Post-processing to ensure the output file has the correct name
-        if returncode == 0:
-            original_stem = Path(file_path).stem
-            generated_pdf_libre = os.path.join(output_dir, f"{original_stem}.pdf")
-            generated_pdf_latex = os.path.join(output_dir, f"{document_id}.pdf")
-
-            if os.path.exists(final_pdf_path):
-                return final_pdf_path
-            elif os.path.exists(generated_pdf_libre):
-                os.rename(generated_pdf_libre, final_pdf_path)
-                return final_pdf_path
-            else:
-                return None
-        else:
-            return None
+        if returncode == 0 and os.path.exists(final_pdf_path):
+            return final_pdf_path
+        return None
+
+    async def linearize_pdf(self, pdf_path: str, document_id: str) -> Optional[str]:
+        """
+        Returns a linearized ("fast web view") copy of a PDF, made with qpdf,
+        so viewers can show the first page after fetching only its byte range.
+        PDFs that are already linearized are returned as they are.
+        """
+        if self.is_linearized(pdf_path):
+            return pdf_path
+
+        output_dir = os.path.join(settings.CONVERTED_DIR, document_id)
+        linearized_path = os.path.join(output_dir, f"{document_id}.linearized.pdf")
+        return await _conversions.do(
+            f"linearize:{linearized_path}",
+            lambda: self._run_linearize(pdf_path, output_dir, linearized_path)
+        )
+
+    async def _run_linearize(self, pdf_path: str, output_dir: str, linearized_path: str) -> Optional[str]:
+        if os.path.exists(linearized_path):
+            return linearized_path
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Write under a temporary name so readers never see a partial PDF
+        partial_path = f"{linearized_path}.part"
+        cmd = ["qpdf", "--linearize", pdf_path, partial_path]
+        returncode, stdout, stderr = await command_utils.run_command(cmd, priority=command_utils.Priority.BULK)
+
+        # qpdf exits with 3 when it succeeded with warnings
+        if returncode in (0, 3) and os.path.exists(partial_path):
+            os.replace(partial_path, linearized_path)
+            return linearized_path
+        print(f"Could not linearize {pdf_path}: {stderr.strip()}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return None
+
+    def is_linearized(self, pdf_path: str) -> bool:
+        """A linearization dictionary must be the first object in the file"""
+        try:
+            with open(pdf_path, 'rb') as f:
+                return b"/Linearized" in f.read(1024)
+        except OSError:
+            return False
 
     async def get_pdf_page_count(self, pdf_path: str) -> int:
-        """Gets the total page count of a PDF file using pdfinfo."""
+        """Gets the total page count of a PDF file with the configured render backend."""
         if not os.path.exists(pdf_path):
             return 0
-
-        cmd = ["pdfinfo", pdf_path]
-        returncode, stdout, stderr = await command_utils.run_command(cmd, timeout=30)
-
-        if returncode == 0:
-            for line in stdout.splitlines():
-                if line.startswith("Pages:"):
-                    try:
-                        return int(line.split(":")[1].strip())
-                    except (ValueError, IndexError):
-                        return 0
-        return 0
+        return await render_backends.get_pdf_page_count(pdf_path)
 
     async def get_document_page_count(self, file_path: str) -> int:
         """Estimates page count for non-PDF documents."""
@@ -116,9 +152,14 @@ class ConversionService:
             return None
 
         if file_ext == '.pdf':
-            output_prefix = os.path.join(settings.THUMBNAILS_DIR, f"{document_id}_thumb_temp")
-            cmd = ["pdftoppm", "-png", "-f", "1", "-l", "1", "-scale-to-x", "400",
-                   "-scale-to-y", "-1", source_path, output_prefix]
+            rendered = await render_backends.render_pages(
+                source_path, [1], 400, command_utils.Priority.BULK
+            )
+            if 1 not in rendered:
+                return None
+            with open(thumbnail_path, 'wb') as f:
+                f.write(rendered[1])
+            return thumbnail_path
         elif file_ext in self.IMAGE_EXTS:
             cmd = ["convert", source_path + "[0]", "-thumbnail", "400x400>",
                    "-background", "white", "-alpha", "remove", thumbnail_path]
@@ -135,17 +176,7 @@ class ConversionService:
             else:
                 return None
 
-        returncode, stdout, stderr = await command_utils.run_command(cmd)
-
-        # Handle PDF thumbnail output
-        if file_ext == '.pdf':
-            generated_file = f"{output_prefix}-1.png"
-            if os.path.exists(generated_file):
-                os.rename(generated_file, thumbnail_path)
-            else:
-                potential_files = glob.glob(f"{output_prefix}*.png")
-                if potential_files:
-                    os.rename(potential_files[0], thumbnail_path)
+        returncode, stdout, stderr = await command_utils.run_command(cmd, priority=command_utils.Priority.BULK)
 
         if returncode == 0 and os.path.exists(thumbnail_path):
             return thumbnail_path
@@ -153,40 +184,244 @@ class ConversionService:
             return None
 
     async def get_page_as_image(self, source_path: str, page_number: int, document_id: str) -> Optional[str]:
-        """Converts a specific page of a document to a PNG image."""
-        page_image_dir = os.path.join(settings.CONVERTED_DIR, "pages", document_id)
-        os.makedirs(page_image_dir, exist_ok=True)
-        page_image_path = os.path.join(page_image_dir, f"page_{page_number}.png")
+        """
+        Converts a specific page of a document to a PNG image.
+        Pages are rendered in windows (one backend call for N..N+k, or N-k..N
+        when scrolling backwards) and the next window is prefetched in the
+        background, so sequential reading is served from the page cache.
+        """
+        page_image_path = self._page_image_path(document_id, page_number)
+        direction, window = _scroll_tracker.observe(document_id, page_number)
+
+        if not page_cache.lookup(page_image_path):
+            # Another request may already be rendering a window containing this page
+            pending = _window_renders.get((document_id, page_number))
+            if pending:
+                await asyncio.shield(pending)
 
+        if not os.path.exists(page_image_path):
+            # Concurrent requests for the same page share one render
+            await _page_renders.do(
+                f"page:{document_id}:{page_number}",
+                lambda: self._render_window(
+                    source_path, page_number, document_id, direction, window,
+                    command_utils.Priority.INTERACTIVE
+                )
+            )
+
+        if not os.path.exists(page_image_path):
+            return None
+
+        self._prefetch(source_path, page_number + direction, document_id, direction, window)
+        return page_image_path
+
+    async def get_page_rendition(self, source_path: str, page_number: int, document_id: str,
+                                 width: int, dpr: float = 1.0, image_format: str = "png",
+                                 quality: Optional[int] = None) -> Optional[str]:
+        """
+        Renders a page at a requested size and format straight from the PDF.
+        Raster output is `width` CSS pixels times `dpr`, rounded up to
+        PAGE_RENDITION_WIDTH_STEP so nearby sizes share one cached file;
+        image_format "svg" exports the page as vectors and ignores the size.
+        Each parameter set is rendered once and then served from disk.
+        """
+        rendition_path = self._rendition_path(document_id, page_number, width, dpr, image_format, quality)
+        if page_cache.lookup(rendition_path):
+            return rendition_path
+
+        await _page_renders.do(
+            f"rendition:{rendition_path}",
+            lambda: self._render_rendition(
+                source_path, page_number, document_id, rendition_path, width, dpr, image_format, quality
+            )
+        )
+        return rendition_path if os.path.exists(rendition_path) else None
+
+    def _rendition_path(self, document_id: str, page_number: int, width: int, dpr: float,
+                        image_format: str, quality: Optional[int]) -> str:
+        rendition_dir = os.path.join(settings.CONVERTED_DIR, "pages", document_id, "renditions")
+        if image_format == "svg":
+            return os.path.join(rendition_dir, f"page_{page_number}.svg")
+
+        pixel_width = self._rendition_pixel_width(width, dpr)
+        extension = "jpg" if image_format == "jpeg" else image_format
+        if image_format == "png":
+            name = f"page_{page_number}_w{pixel_width}.{extension}"
+        else:
+            quality = quality or settings.PAGE_RENDITION_DEFAULT_QUALITY
+            name = f"page_{page_number}_w{pixel_width}_q{quality}.{extension}"
+        return os.path.join(rendition_dir, name)
+
+    def _rendition_pixel_width(self, width: int, dpr: float) -> int:
+        step = settings.PAGE_RENDITION_WIDTH_STEP
+        pixel_width = -(-int(round(width * dpr)) // step) * step
+        return max(step, min(pixel_width, settings.PAGE_RENDITION_MAX_WIDTH))
+
+    async def _render_rendition(self, source_path: str, page_number: int, document_id: str,
+                                rendition_path: str, width: int, dpr: float, image_format: str,
+                                quality: Optional[int]) -> Optional[str]:
+        # Another worker may have rendered it while we waited for the lock
+        if os.path.exists(rendition_path):
+            return rendition_path
+
+        pdf_to_process = await self.ensure_pdf(source_path, document_id)
+        if not pdf_to_process:
+            return None
+
+        os.makedirs(os.path.dirname(rendition_path), exist_ok=True)
+        # Write under a temporary name so readers never see a partial file
+        temp_path = f"{rendition_path}.{uuid.uuid4().hex}.part"
+        try:
+            if image_format == "svg":
+                if not await render_backends.render_page_svg(
+                    pdf_to_process, page_number, temp_path, command_utils.Priority.INTERACTIVE
+                ):
+                    return None
+            else:
+                rendered = await render_backends.render_pages(
+                    pdf_to_process, [page_number], self._rendition_pixel_width(width, dpr),
+                    command_utils.Priority.INTERACTIVE, image_format,
+                    quality or settings.PAGE_RENDITION_DEFAULT_QUALITY
+                )
+                if page_number not in rendered:
+                    return None
+                with open(temp_path, 'wb') as f:
+                    f.write(rendered[page_number])
+            os.replace(temp_path, rendition_path)
+            page_cache.record(rendition_path, os.path.getsize(rendition_path))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return rendition_path
+
+    async def ensure_pdf(self, source_path: str, document_id: str) -> Optional[str]:
+        """PDF to render pages from, converting the source if needed"""
+        if Path(source_path).suffix.lower() == '.pdf':
+            return source_path
+        return await self.convert_to_pdf(source_path, document_id)
+
+    def _page_image_path(self, document_id: str, page_number: int) -> str:
+        return os.path.join(settings.CONVERTED_DIR, "pages", document_id, f"page_{page_number}.png")
+
+    def _plan_window(self, page_number: int, document_id: str, direction: int, window: int) -> list[int]:
+        """Pages to render with page_number: up to `window` uncached pages in the scroll direction"""
+        pages = [page_number]
+        last_page = _page_limits.get(document_id)
+        candidate = page_number + direction
+        while len(pages) < window and candidate >= 1 and (not last_page or candidate <= last_page):
+            if os.path.exists(self._page_image_path(document_id, candidate)) or \
+                    (document_id, candidate) in _window_renders:
+                break
+            pages.append(candidate)
+            candidate += direction
+        return sorted(pages)
+
+    def _prefetch(self, source_path: str, page_number: int, document_id: str, direction: int, window: int):
+        """Render the next window in the background at bulk priority"""
+        last_page = _page_limits.get(document_id)
+        if page_number < 1 or (last_page and page_number > last_page):
+            return
+        if os.path.exists(self._page_image_path(document_id, page_number)) or \
+                (document_id, page_number) in _window_renders:
+            return
+
+        task = asyncio.create_task(_page_renders.do(
+            f"page:{document_id}:{page_number}",
+            lambda: self._render_window(
+                source_path, page_number, document_id, direction, window,
+                command_utils.Priority.BULK
+            )
+        ))
+        _prefetch_tasks.add(task)
+        task.add_done_callback(_prefetch_tasks.discard)
+
+    async def _render_window(self, source_path: str, page_number: int, document_id: str,
+                             direction: int, window: int, priority: command_utils.Priority) -> Optional[str]:
+        page_image_path = self._page_image_path(document_id, page_number)
+        # Another worker may have rendered the page while we waited for the lock
         if os.path.exists(page_image_path):
             return page_image_path
 
-        file_ext = Path(source_path).suffix.lower()
-        pdf_to_process = source_path
+        page_image_dir = os.path.dirname(page_image_path)
+        os.makedirs(page_image_dir, exist_ok=True)
 
-        if file_ext != '.pdf':
-            converted_pdf_path = await self.convert_to_pdf(source_path, document_id)
-            if not converted_pdf_path:
-                return None
-            pdf_to_process = converted_pdf_path
+        pdf_to_process = await self.ensure_pdf(source_path, document_id)
+        if not pdf_to_process:
+            return None
 
-        output_prefix = os.path.join(page_image_dir, f"page_temp_{page_number}")
-        cmd = [
-            "pdftoppm", "-png",
-            "-f", str(page_number), "-l", str(page_number),
-            "-scale-to-x", "1200", "-scale-to-y", "-1",
-            pdf_to_process, output_prefix
-        ]
+        pages = self._plan_window(page_number, document_id, direction, window)
+        loop = asyncio.get_running_loop()
+        claimed = {}
+        for page in pages:
+            if page != page_number:
+                claimed[(document_id, page)] = loop.create_future()
+        _window_renders.update(claimed)
 
-        returncode, stdout, stderr = await command_utils.run_command(cmd)
+        try:
+            rendered = await render_backends.render_pages(
+                pdf_to_process, pages, settings.PAGE_RENDER_WIDTH, priority
+            )
+            for page, data in rendered.items():
+                # Write under a temporary name so readers never see a partial image
+                temp_path = os.path.join(page_image_dir, f"page_temp_{page}_{uuid.uuid4().hex}.png")
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, self._page_image_path(document_id, page))
+                page_cache.record(self._page_image_path(document_id, page), len(data))
 
-        # Rename generated file
-        generated_file_pattern = f"{output_prefix}*.png"
-        created_files = glob.glob(generated_file_pattern)
-        if created_files:
-            os.rename(created_files[0], page_image_path)
+            # Pages past the end are not rendered; remember where the document ends
+            if rendered and max(rendered) < pages[-1]:
+                _page_limits[document_id] = max(rendered)
+                _page_limits.move_to_end(document_id)
+                if len(_page_limits) > MAX_PAGE_LIMITS:
+                    _page_limits.popitem(last=False)
+        finally:
+            for key, future in claimed.items():
+                _window_renders.pop(key, None)
+                future.set_result(None)
 
-        if returncode == 0 and os.path.exists(page_image_path):
+        if os.path.exists(page_image_path):
             return page_image_path
         else:
-            return None
\ No newline at end of file
+            return None
+
+
+class PageScrollTracker:
+    """
+    Tracks each document's recent page requests to size the render window.
+    Sequential requests in one direction double the window up to
+    PAGE_RENDER_WINDOW_MAX; a jump or direction change resets it.
+    """
+    MAX_TRACKED_DOCUMENTS = 10000
+
+    def __init__(self):
+        # document_id -> (last requested page, direction, window size)
+        self.state: "OrderedDict[str, Tuple[int, int, int]]" = OrderedDict()
+
+    def observe(self, document_id: str, page_number: int) -> Tuple[int, int]:
+        """Record a request and return (direction, window) to render with"""
+        base = settings.PAGE_RENDER_WINDOW
+        last_page, direction, window = self.state.pop(document_id, (None, 1, base))
+
+        if last_page is not None and page_number != last_page:
+            step = page_number - last_page
+            new_direction = 1 if step > 0 else -1
+            if abs(step) <= 2 and new_direction == direction:
+                window = min(window * 2, settings.PAGE_RENDER_WINDOW_MAX)
+            else:
+                window = base
+            direction = new_direction
+
+        self.state[document_id] = (page_number, direction, window)
+        if len(self.state) > self.MAX_TRACKED_DOCUMENTS:
+            self.state.popitem(last=False)
+        return direction, window
+
+
+_scroll_tracker = PageScrollTracker()
+# Pages being rendered as part of another request's window
+_window_renders: Dict[Tuple[str, int], asyncio.Future] = {}
+# Last page of documents whose end has been reached while rendering, most recently found last
+_page_limits: "OrderedDict[str, int]" = OrderedDict()
+MAX_PAGE_LIMITS = 10000
+_prefetch_tasks: Set[asyncio.Task] = set()
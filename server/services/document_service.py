@@ -1,18 +1,38 @@
 # services/document_service.py
 import os
-import shutil
-import uuid
-from typing import Dict, Any, Optional
+import hashlib
+from typing import Dict, Any, Optional, Callable, Awaitable
 from pathlib import Path
+import aiofiles
 from fastapi import UploadFile
 
 from config import settings
 from models.document import Document
 from core.registry.handler_registry import HandlerRegistry
+from core.utils.file_utils import get_mime_type_from_buffer
+from core.utils.single_flight import SingleFlight
+from core.utils.cache_manager import page_cache
+from core.utils import text_layer, video_streaming
+from services.artifact_store import ArtifactStore
+from services.conversion_service import ConversionService
+
+
+class UnsupportedFileError(Exception):
+    """Raised when an upload is rejected because of its type"""
+
+
+class FileTooLargeError(Exception):
+    """Raised when an upload exceeds settings.MAX_FILE_SIZE"""
+
 
 class DocumentService:
     def __init__(self):
         self.documents: Dict[str, Document] = {}
+        # Archive members opened as documents (see ArchiveMemberService), by id
+        self.virtual_documents: Dict[str, Document] = {}
+        self.artifact_store = ArtifactStore()
+        self.conversion_service = ConversionService()
+        self._processing = SingleFlight()
 
     def is_supported_file(self, filename: str, content_type: str) -> bool:
         """Check if file type is supported by extension or MIME type."""
@@ -23,37 +43,202 @@ class DocumentService:
         return (file_ext in settings.SUPPORTED_EXTENSIONS or
                 content_type in settings.SUPPORTED_MIME_TYPES)
 
-    async def save_uploaded_file(self, file: UploadFile, document_id: str) -> str:
-        """Save uploaded file to disk"""
-        file_ext = Path(file.filename).suffix.lower()
-        filename = f"{document_id}{file_ext}"
-        file_path = os.path.join(settings.UPLOAD_DIR, filename)
+    async def ingest_uploaded_file(self, file: UploadFile, document_id: str) -> Dict[str, Any]:
+        """
+        Copy an upload to its final path in chunks without blocking the event
+        loop. By now Starlette has spooled the multipart body, so this does not
+        spare the transfer: oversized requests are refused earlier from their
+        Content-Length (see app.limit_upload_size). The MIME type is sniffed
+        from the first chunk so unsupported uploads are not copied, and the
+        exact size limit, SHA-256 and byte count are checked in the same pass.
+        Returns dictionary with keys: file_path, mime_type, size, sha256
+        """
+        max_size = settings.MAX_FILE_SIZE
+        declared_size = getattr(file, "size", None)
+        if declared_size is not None and declared_size > max_size:
+            raise FileTooLargeError(
+                f"File exceeds maximum size of {max_size} bytes: '{file.filename}'"
+            )
+
+        file_ext = Path(file.filename or "").suffix.lower()
+        file_path = os.path.join(settings.UPLOAD_DIR, f"{document_id}{file_ext}")
+        partial_path = f"{file_path}.part"
+
+        first_chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+        mime_type = get_mime_type_from_buffer(first_chunk)
+        if not self.is_supported_file(file.filename, mime_type):
+            raise UnsupportedFileError(
+                f"Unsupported file type. "
+                f"Filename: '{file.filename}', "
+                f"Detected Content-Type: '{mime_type}'"
+            )
+
+        sha256 = hashlib.sha256()
+        size = 0
+        chunk = first_chunk
+        try:
+            async with aiofiles.open(partial_path, "wb") as buffer:
+                while chunk:
+                    size += len(chunk)
+                    if size > max_size:
+                        raise FileTooLargeError(
+                            f"File exceeds maximum size of {max_size} bytes: '{file.filename}'"
+                        )
+                    sha256.update(chunk)
+                    await buffer.write(chunk)
+                    chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+            os.replace(partial_path, file_path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+        return {
+            "file_path": file_path,
+            "mime_type": mime_type,
+            "size": size,
+            "sha256": sha256.hexdigest()
+        }
+
+    def get_artifact_key(self, content_hash: str, file_path: str) -> str:
+        """Artifact key under which a file's processed outputs are stored"""
+        return ArtifactStore.artifact_key(content_hash, Path(file_path).suffix)
+
+    async def process_document(
+        self,
+        file_path: str,
+        artifact_key: str,
+        stage_callback: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Process document using the appropriate handler.
+        Outputs are stored under the artifact key, so a repeat upload of the
+        same content is served from the artifact store without reprocessing.
+        stage_callback is passed to the handler to report pipeline progress.
+        """
+        processed_info = self.artifact_store.get_processed_info(artifact_key)
+        if processed_info is not None:
+            if processed_info.get("hls_path"):
+                # A transcode interrupted by a restart left an unfinished playlist; it starts over
+                video_streaming.start_hls_transcode(file_path, artifact_key)
+            return processed_info
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Identical uploads arriving together are processed once
+        return await self._processing.do(
+            f"process:{artifact_key}",
+            lambda: self._process_document(file_path, artifact_key, stage_callback)
+        )
 
-        return file_path
+    async def _process_document(
+        self,
+        file_path: str,
+        artifact_key: str,
+        stage_callback: Optional[Callable[[str], Awaitable[None]]]
+    ) -> Dict[str, Any]:
+        processed_info = self.artifact_store.get_processed_info(artifact_key)
+        if processed_info is not None:
+            return processed_info
 
-    async def process_document(self, file_path: str, document_id: str) -> Dict[str, Any]:
-        """Process document using the appropriate handler"""
         file_ext = Path(file_path).suffix.lower()
         handler = HandlerRegistry.get_handler(file_ext)
-        return await handler.process(file_path, document_id)
+        handler.stage_callback = stage_callback
+        processed_info = await handler.process(file_path, artifact_key)
+        thumbnail_path = processed_info.get("thumbnail_path")
+        if thumbnail_path and os.path.exists(thumbnail_path):
+            # Counted against the cache's thumbnail budget
+            page_cache.record(thumbnail_path, os.path.getsize(thumbnail_path))
+        self.artifact_store.save_processed_info(artifact_key, processed_info)
+        return processed_info
+
+    async def linearize_document(self, file_path: str, artifact_key: str, processed_info: Dict[str, Any]) -> Optional[str]:
+        """
+        Produce the linearized PDF served by /preview, or None if the
+        document's preview is not a PDF. The result is recorded in the
+        artifact manifest so repeat uploads reuse it.
+        """
+        linearized_path = processed_info.get("linearized_path")
+        if linearized_path and os.path.exists(linearized_path):
+            return linearized_path
+
+        pdf_path = self._document_pdf(file_path, processed_info)
+        if not pdf_path:
+            return None
+
+        try:
+            linearized_path = await self.conversion_service.linearize_pdf(pdf_path, artifact_key)
+        except Exception as e:
+            print(f"Error linearizing {pdf_path}: {e}")
+            return None
+        if linearized_path:
+            processed_info["linearized_path"] = linearized_path
+            self.artifact_store.save_processed_info(artifact_key, processed_info)
+        return linearized_path
+
+    async def build_text_layer(self, file_path: str, artifact_key: str, processed_info: Dict[str, Any]) -> Optional[str]:
+        """
+        Extract the words and boxes of every page of the document's PDF, or
+        return None if it has none. Recorded in the artifact manifest like
+        the linearized copy.
+        """
+        text_layer_path = processed_info.get("text_layer_path")
+        if text_layer_path and os.path.exists(text_layer_path):
+            return text_layer_path
+
+        pdf_path = self._document_pdf(file_path, processed_info)
+        if not pdf_path:
+            return None
+
+        try:
+            # Identical uploads processed together extract it once
+            text_layer_path = await self._processing.do(
+                f"text_layer:{artifact_key}", lambda: text_layer.build_text_layer(pdf_path, artifact_key)
+            )
+        except Exception as e:
+            print(f"Error extracting the text layer of {pdf_path}: {e}")
+            return None
+        if text_layer_path:
+            processed_info["text_layer_path"] = text_layer_path
+            self.artifact_store.save_processed_info(artifact_key, processed_info)
+        return text_layer_path
+
+    @staticmethod
+    def _document_pdf(file_path: str, processed_info: Dict[str, Any]) -> Optional[str]:
+        """The PDF a document is viewed as: its conversion, or the upload itself"""
+        converted_path = processed_info.get("converted_path")
+        if converted_path and converted_path.lower().endswith(".pdf"):
+            return converted_path
+        if file_path.lower().endswith(".pdf") and not processed_info.get("is_plain_text"):
+            return file_path
+        return None
 
     def store_document(self, document: Document):
         """Store document in memory (in production, use a database)"""
         self.documents[document.id] = document
+        if document.artifact_key:
+            self.artifact_store.add_reference(document.artifact_key, document.id)
+
+    def register_virtual_document(self, document: Document):
+        """Make an archive member's document reachable by id; its artifacts belong to the archive's"""
+        self.virtual_documents[document.id] = document
 
     def get_document(self, document_id: str) -> Optional[Document]:
         """Get document by ID"""
-        return self.documents.get(document_id)
+        return self.documents.get(document_id) or self.virtual_documents.get(document_id)
 
     def delete_document(self, document_id: str):
         """Delete document by ID"""
+        # Members of a deleted archive go with it; deleting a member only forgets it
+        self.virtual_documents.pop(document_id, None)
+        for virtual_id in [key for key, virtual in self.virtual_documents.items() if virtual.parent_id == document_id]:
+            self.delete_document(virtual_id)
         document = self.documents.pop(document_id, None)
         if document:
             if document.file_path and os.path.exists(document.file_path):
                 os.remove(document.file_path)
+            if document.artifact_key:
+                # Converted files and thumbnails may be shared with other documents
+                self.artifact_store.release(document.artifact_key, document.id)
+                return
             if document.converted_path and os.path.exists(document.converted_path):
                 os.remove(document.converted_path)
             if document.thumbnail_path and os.path.exists(document.thumbnail_path):
@@ -70,5 +255,33 @@ class DocumentService:
         handler = HandlerRegistry.get_handler(file_ext)
 
         return await handler.get_page_as_image(
-            source_file, page_number, document_id
+            source_file, page_number, document.artifact_key or document_id
+        )
+
+    async def get_page_pdf(self, document_id: str) -> Optional[str]:
+        """Get the PDF the document's pages are rendered from using the appropriate handler"""
+        document = self.get_document(document_id)
+        if not document:
+            return None
+
+        source_file = document.converted_path or document.file_path
+        file_ext = Path(source_file).suffix.lower()
+        handler = HandlerRegistry.get_handler(file_ext)
+
+        return await handler.get_page_pdf(source_file, document.artifact_key or document_id)
+
+    async def get_page_rendition(self, document_id: str, page_number: int, width: int, dpr: float = 1.0,
+                                 image_format: str = "png", quality: Optional[int] = None) -> Optional[str]:
+        """Get page rendered with explicit size/format parameters using the appropriate handler"""
+        document = self.get_document(document_id)
+        if not document:
+            return None
+
+        source_file = document.converted_path or document.file_path
+        file_ext = Path(source_file).suffix.lower()
+        handler = HandlerRegistry.get_handler(file_ext)
+
+        return await handler.get_page_rendition(
+            source_file, page_number, document.artifact_key or document_id,
+            width, dpr, image_format, quality
         )
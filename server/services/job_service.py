@@ -0,0 +1,208 @@
+# services/job_service.py
+import asyncio
+import time
+import traceback
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, List, AsyncIterator
+
+from config import settings
+from models.document import Document, ProcessingJob
+from services.document_service import DocumentService
+from services.metadata_service import MetadataService
+from services.search_service import SearchService
+
+
+class JobQueueFullError(Exception):
+    """Raised when the processing queue cannot accept more jobs"""
+
+
+class JobService:
+    """
+    In-process job queue that runs the handler pipeline in the background.
+    A bounded pool of worker tasks takes jobs off the queue; every finished
+    stage is recorded on the job and published to its event subscribers.
+    Finished jobs stay queryable for settings.JOB_RETENTION seconds, and at
+    most settings.JOB_HISTORY_SIZE of them are kept.
+    """
+
+    def __init__(self, document_service: DocumentService, metadata_service: MetadataService,
+                 search_service: Optional[SearchService] = None):
+        self.document_service = document_service
+        self.metadata_service = metadata_service
+        self.search_service = search_service
+        self.jobs: Dict[str, ProcessingJob] = {}
+        self.events: Dict[str, List[Dict[str, Any]]] = {}
+        self.changed: Dict[str, asyncio.Event] = {}
+        # Job id -> monotonic finish time, oldest first
+        self.finished: "OrderedDict[str, float]" = OrderedDict()
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+
+    async def start(self):
+        """Start the worker pool (called on application startup)"""
+        if self.workers:
+            return
+        self.queue = asyncio.Queue(maxsize=settings.PROCESSING_QUEUE_SIZE)
+        self.workers = [
+            asyncio.create_task(self._worker(), name=f"processing-worker-{i}")
+            for i in range(settings.PROCESSING_WORKERS)
+        ]
+
+    async def stop(self):
+        """Cancel the worker pool (called on application shutdown)"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def submit(self, document: Document) -> ProcessingJob:
+        """Queue a stored document for processing; the upload itself counts as the 'saved' stage"""
+        self._prune_finished()
+        job = ProcessingJob(document_id=document.id)
+        self.jobs[job.id] = job
+        self.events[job.id] = []
+        self.changed[job.id] = asyncio.Event()
+        self._record(job, "stage", stage="saved")
+
+        try:
+            self.queue.put_nowait(job.id)
+        except asyncio.QueueFull:
+            self._record(job, "failed", error="Processing queue is full")
+            raise JobQueueFullError("Processing queue is full, try again later.")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[ProcessingJob]:
+        return self.jobs.get(job_id)
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every event of a job, past and future, until it completes or fails"""
+        # Held by reference, so pruning the job does not cut off a subscriber
+        events = self.events.get(job_id, [])
+        index = 0
+        while True:
+            # Finished jobs have no change event left; their last event is already recorded
+            changed = self.changed.get(job_id)
+            while index < len(events):
+                event = events[index]
+                index += 1
+                yield event
+                if event["event"] in ("completed", "failed"):
+                    return
+            if changed is None:
+                return
+            await changed.wait()
+
+    def _record(self, job: ProcessingJob, event: str, stage: Optional[str] = None, error: Optional[str] = None):
+        """Update the job and wake up subscribers"""
+        job.updated_at = datetime.now()
+        if stage:
+            if stage in job.stages:
+                return
+            job.stages.append(stage)
+        if event == "completed":
+            job.status = "completed"
+        elif event == "failed":
+            job.status = "failed"
+            job.error = error
+
+        self.events[job.id].append({
+            "event": event,
+            "job_id": job.id,
+            "document_id": job.document_id,
+            "status": job.status,
+            "stage": stage,
+            "stages": list(job.stages),
+            "error": error,
+            "timestamp": job.updated_at.isoformat()
+        })
+        if event in ("completed", "failed"):
+            # Nothing is recorded after this, so no one needs to wait again
+            self.changed.pop(job.id).set()
+            self.finished[job.id] = time.monotonic()
+            self._prune_finished()
+            return
+        # Swap in a fresh event so waiters registered from now on block again
+        changed = self.changed[job.id]
+        self.changed[job.id] = asyncio.Event()
+        changed.set()
+
+    def _prune_finished(self):
+        """Forget finished jobs past their retention or beyond the history size"""
+        now = time.monotonic()
+        while self.finished:
+            job_id, finished_at = next(iter(self.finished.items()))
+            if len(self.finished) <= settings.JOB_HISTORY_SIZE and now - finished_at < settings.JOB_RETENTION:
+                break
+            del self.finished[job_id]
+            self.jobs.pop(job_id, None)
+            self.events.pop(job_id, None)
+
+    async def _worker(self):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self._run(self.jobs[job_id])
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: ProcessingJob):
+        document = self.document_service.get_document(job.document_id)
+        if not document:
+            self._record(job, "failed", error="Document was deleted before processing")
+            return
+
+        job.status = "processing"
+
+        async def on_stage(stage: str):
+            self._record(job, "stage", stage=stage)
+
+        try:
+            processed_info = await self.document_service.process_document(
+                document.file_path, document.artifact_key or document.id, stage_callback=on_stage
+            )
+            # Handlers that don't report progress finish both stages in process()
+            await on_stage("converted")
+            await on_stage("thumbnailed")
+
+            # Optional: without it /preview serves the unlinearized PDF
+            linearized_path = await self.document_service.linearize_document(
+                document.file_path, document.artifact_key or document.id, processed_info
+            )
+            await on_stage("linearized")
+
+            # Optional: without it /find and /page/{n}/text are unavailable
+            text_layer_path = await self.document_service.build_text_layer(
+                document.file_path, document.artifact_key or document.id, processed_info
+            )
+            await on_stage("text_layer")
+
+            metadata = await self.metadata_service.extract_metadata(document.file_path)
+            await on_stage("metadata")
+
+            document.converted_path = processed_info.get("converted_path")
+            document.thumbnail_path = processed_info.get("thumbnail_path")
+            document.linearized_path = linearized_path
+            document.text_layer_path = text_layer_path
+            document.hls_path = processed_info.get("hls_path")
+            document.storyboard_path = processed_info.get("storyboard_path")
+            document.waveform_path = processed_info.get("waveform_path")
+            document.line_index_path = processed_info.get("line_index_path")
+            document.highlight_path = processed_info.get("highlight_path")
+            document.member_index_path = processed_info.get("member_index_path")
+            document.total_pages = processed_info.get("total_pages", 1)
+            document.is_plain_text = processed_info.get("is_plain_text", False)
+            document.metadata = metadata
+            document.status = "ready"
+            document.updated_at = datetime.now()
+
+            if self.search_service:
+                # Optional: a document that fails to index is still viewable
+                await self.search_service.index_document(document, processed_info)
+                await on_stage("indexed")
+            self._record(job, "completed")
+        except Exception as e:
+            print(f"Error processing document {document.id}: {e}")
+            traceback.print_exc()
+            document.status = "failed"
+            self._record(job, "failed", error=str(e))
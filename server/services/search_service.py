@@ -0,0 +1,242 @@
+# services/search_service.py
+import os
+import re
+import html
+import time
+import sqlite3
+import asyncio
+import threading
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Set
+
+from config import settings
+from models.document import Document
+from core.registry.handler_registry import HandlerRegistry
+from core.utils.single_flight import SingleFlight
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(
+    body, artifact_key UNINDEXED, page UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    artifact_key TEXT PRIMARY KEY,
+    pages INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    artifact_key TEXT NOT NULL,
+    name TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_by_artifact ON documents (artifact_key);
+"""
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+# Control characters mark matches in raw snippets; they are swapped for <mark> after escaping
+MARK_START, MARK_END = "\x02", "\x03"
+
+
+class SearchService:
+    """
+    Full-text index of every document's pages in SQLite FTS5. Page text is
+    stored once per artifact key, so identical uploads share their rows;
+    documents map onto artifacts and deleting the last document of an
+    artifact drops its pages. The database is opened in WAL mode, so
+    searches run alongside indexing and across worker processes.
+    """
+
+    def __init__(self, index_path: Optional[str] = None):
+        self.index_path = index_path or settings.SEARCH_INDEX_PATH
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._indexing = SingleFlight()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    async def index_document(self, document: Document, processed_info: Dict[str, Any]):
+        """Add a document's page text; failures are logged and leave the document unsearchable"""
+        artifact_key = document.artifact_key or document.id
+        try:
+            await self._indexing.do(
+                f"search:{artifact_key}",
+                lambda: self._index_document(document, artifact_key, processed_info)
+            )
+        except Exception as e:
+            print(f"Search indexing failed for {document.id}: {e}")
+
+    async def _index_document(self, document: Document, artifact_key: str, processed_info: Dict[str, Any]):
+        # Text is extracted on the event loop (external tools run under their limits); SQLite runs in threads
+        if not await asyncio.to_thread(self._is_indexed, artifact_key):
+            handler = HandlerRegistry.get_handler(Path(document.file_path).suffix.lower())
+            await asyncio.to_thread(self._clear_pages, artifact_key)
+            page_count = 0
+            batch = []
+            async for page_number, text in handler.iter_page_texts(document.file_path, processed_info):
+                page_count = page_number
+                if text.strip():
+                    # The markers must only ever come from snippet()
+                    text = text.replace(MARK_START, " ").replace(MARK_END, " ")
+                    batch.append((text, artifact_key, page_number))
+                if len(batch) >= settings.SEARCH_INDEX_BATCH_PAGES:
+                    await asyncio.to_thread(self._insert_pages, batch)
+                    batch = []
+            await asyncio.to_thread(self._insert_pages, batch)
+            await asyncio.to_thread(self._write, (
+                "INSERT OR REPLACE INTO artifacts (artifact_key, pages) VALUES (?, ?)", (artifact_key, page_count)
+            ))
+
+        await asyncio.to_thread(self._write, (
+            "INSERT OR REPLACE INTO documents (document_id, artifact_key, name) VALUES (?, ?, ?)",
+            (document.id, artifact_key, document.original_name)
+        ))
+
+    def _is_indexed(self, artifact_key: str) -> bool:
+        return self._connection().execute(
+            "SELECT 1 FROM artifacts WHERE artifact_key = ?", (artifact_key,)
+        ).fetchone() is not None
+
+    def _clear_pages(self, artifact_key: str):
+        # Rows of an interrupted run are replaced
+        self._write(("DELETE FROM pages WHERE artifact_key = ?", (artifact_key,)))
+
+    def _write(self, statement: tuple):
+        with self._write_lock:
+            self._connection().execute(*statement)
+
+    def _insert_pages(self, rows: List[tuple]):
+        if not rows:
+            return
+        connection = self._connection()
+        with self._write_lock:
+            connection.execute("BEGIN")
+            try:
+                connection.executemany("INSERT INTO pages (body, artifact_key, page) VALUES (?, ?, ?)", rows)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    async def remove_document(self, document_id: str):
+        """Drop a document, and its artifact's pages if no other document shares them"""
+        try:
+            await asyncio.to_thread(self._remove_document, document_id)
+        except Exception as e:
+            print(f"Could not remove {document_id} from the search index: {e}")
+
+    def _remove_document(self, document_id: str):
+        connection = self._connection()
+        with self._write_lock:
+            connection.execute("BEGIN")
+            try:
+                row = connection.execute(
+                    "SELECT artifact_key FROM documents WHERE document_id = ?", (document_id,)
+                ).fetchone()
+                if row:
+                    connection.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+                    shared = connection.execute(
+                        "SELECT 1 FROM documents WHERE artifact_key = ? LIMIT 1", (row[0],)
+                    ).fetchone()
+                    if not shared:
+                        connection.execute("DELETE FROM pages WHERE artifact_key = ?", row)
+                        connection.execute("DELETE FROM artifacts WHERE artifact_key = ?", row)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    async def prune_documents(self, known_ids: Iterable[str]):
+        """
+        Forget indexed documents that are not in known_ids, and the pages no
+        remaining document refers to. Documents live in memory, so after a
+        restart the index would otherwise hold rows for documents that are gone.
+        """
+        try:
+            await asyncio.to_thread(self._prune_documents, set(known_ids))
+        except Exception as e:
+            print(f"Could not prune the search index: {e}")
+
+    def _prune_documents(self, known_ids: Set[str]):
+        connection = self._connection()
+        with self._write_lock:
+            connection.execute("BEGIN")
+            try:
+                stale = [
+                    row[0] for row in connection.execute("SELECT document_id FROM documents")
+                    if row[0] not in known_ids
+                ]
+                connection.executemany("DELETE FROM documents WHERE document_id = ?", [(i,) for i in stale])
+                connection.execute(
+                    "DELETE FROM pages WHERE artifact_key NOT IN (SELECT artifact_key FROM documents)"
+                )
+                connection.execute(
+                    "DELETE FROM artifacts WHERE artifact_key NOT IN (SELECT artifact_key FROM documents)"
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def build_query(query: str) -> Optional[str]:
+        """
+        FTS5 expression matching pages that contain every word of a free-text
+        query; the last word also matches as a prefix, for search-as-you-type.
+        """
+        terms = _TERM.findall(query)
+        if not terms:
+            return None
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += "*"
+        return " ".join(quoted)
+
+    @staticmethod
+    def snippet_html(snippet: str) -> str:
+        """Escape the document text of a snippet, then turn the match markers into <mark> tags"""
+        escaped = html.escape(snippet)
+        return escaped.replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+    async def search(self, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._search, query, limit, offset)
+
+    def _search(self, query: str, limit: int, offset: int) -> Dict[str, Any]:
+        started = time.perf_counter()
+        expression = self.build_query(query)
+        hits = []
+        if expression:
+            # Ranking runs on the FTS table alone so FTS5 can stop at the page limit
+            rows = self._connection().execute(
+                """
+                SELECT d.document_id, d.name, hit.page, hit.snippet, hit.score
+                FROM (
+                    SELECT artifact_key, page,
+                           snippet(pages, 0, ?, ?, '…', ?) AS snippet,
+                           rank AS score
+                    FROM pages
+                    WHERE pages MATCH ?
+                      AND artifact_key IN (SELECT artifact_key FROM documents)
+                    ORDER BY rank LIMIT ? OFFSET ?
+                ) AS hit
+                JOIN documents AS d ON d.artifact_key = hit.artifact_key
+                ORDER BY hit.score
+                """,
+                (MARK_START, MARK_END, settings.SEARCH_SNIPPET_TOKENS, expression, limit, offset)
+            ).fetchall()
+            hits = [
+                {"documentId": document_id, "name": name, "page": page, "snippet": self.snippet_html(snippet),
+                 "score": -score}
+                for document_id, name, page, snippet, score in rows
+            ]
+        return {
+            "query": query,
+            "hits": hits,
+            "tookMs": round((time.perf_counter() - started) * 1000, 2),
+        }
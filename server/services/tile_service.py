@@ -0,0 +1,160 @@
+# services/tile_service.py
+import os
+import math
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from config import settings
+from core.utils import command_utils, render_backends
+from core.utils.single_flight import SingleFlight
+from core.utils.cache_manager import page_cache
+from services.document_service import DocumentService
+
+_tile_renders = SingleFlight()
+
+
+class TileOutOfRangeError(Exception):
+    """Requested level or tile does not exist in the page's pyramid"""
+    pass
+
+
+class TileService:
+    """
+    Deep Zoom (DZI) tile pyramids for document pages. Level maxLevel is the
+    page at TILE_MAX_SCALE pixels per point (capped at TILE_MAX_DIMENSION);
+    every level below halves it, down to a single pixel at level 0. Tiles are
+    rendered on demand from the PDF, one region at a time, and cached under
+    pages/<key>/tiles/<page>/<level>/<x>_<y>.<format>.
+    """
+
+    def __init__(self, document_service: DocumentService):
+        self.document_service = document_service
+        # (pdf_path, page_number) -> page size in points, least recently used first
+        self.page_sizes: "OrderedDict[Tuple[str, int], Tuple[float, float]]" = OrderedDict()
+
+    async def get_manifest(self, document_id: str, page_number: int) -> Optional[Dict[str, Any]]:
+        """Pyramid geometry of a page, or None if the document has no renderable pages"""
+        pdf_path = await self.document_service.get_page_pdf(document_id)
+        if not pdf_path:
+            return None
+        page_size = await self._page_size(pdf_path, page_number)
+        if not page_size:
+            return None
+
+        scale, max_level = self._pyramid(page_size)
+        width, height = self._level_size(page_size, scale, max_level, max_level)
+        return {
+            "width": width,
+            "height": height,
+            "tileSize": settings.TILE_SIZE,
+            "overlap": settings.TILE_OVERLAP,
+            "format": self.default_format(),
+            "minLevel": 0,
+            "maxLevel": max_level,
+        }
+
+    async def get_tile(self, document_id: str, page_number: int, level: int, x: int, y: int,
+                       image_format: Optional[str] = None) -> Optional[str]:
+        """Path of a cached tile, rendering it first if needed"""
+        document = self.document_service.get_document(document_id)
+        if not document:
+            return None
+        image_format = image_format or self.default_format()
+        extension = "jpg" if image_format == "jpeg" else image_format
+        tile_path = os.path.join(
+            settings.CONVERTED_DIR, "pages", document.artifact_key or document_id,
+            "tiles", str(page_number), str(level), f"{x}_{y}.{extension}"
+        )
+        if page_cache.lookup(tile_path):
+            return tile_path
+
+        pdf_path = await self.document_service.get_page_pdf(document_id)
+        if not pdf_path:
+            return None
+        page_size = await self._page_size(pdf_path, page_number)
+        if not page_size:
+            return None
+        region = self._tile_region(page_size, level, x, y)
+
+        await _tile_renders.do(
+            f"tile:{tile_path}",
+            lambda: self._render_tile(pdf_path, page_number, tile_path, region, image_format)
+        )
+        return tile_path if os.path.exists(tile_path) else None
+
+    def default_format(self) -> str:
+        if settings.TILE_FORMAT in render_backends.supported_image_formats():
+            return settings.TILE_FORMAT
+        return "png"
+
+    async def _page_size(self, pdf_path: str, page_number: int) -> Optional[Tuple[float, float]]:
+        key = (pdf_path, page_number)
+        page_size = self.page_sizes.get(key)
+        if page_size is not None:
+            self.page_sizes.move_to_end(key)
+            return page_size
+        page_size = await render_backends.get_page_size(pdf_path, page_number)
+        if not page_size:
+            return None
+        self.page_sizes[key] = page_size
+        while len(self.page_sizes) > settings.TILE_PAGE_SIZE_CACHE_SIZE:
+            self.page_sizes.popitem(last=False)
+        return page_size
+
+    def _pyramid(self, page_size: Tuple[float, float]) -> Tuple[float, int]:
+        """Scale (pixels per point) of the top level and the top level's index"""
+        scale = min(settings.TILE_MAX_SCALE, settings.TILE_MAX_DIMENSION / max(page_size))
+        max_level = math.ceil(math.log2(max(1, math.ceil(max(page_size) * scale))))
+        return scale, max_level
+
+    def _level_size(self, page_size: Tuple[float, float], scale: float,
+                    max_level: int, level: int) -> Tuple[int, int]:
+        level_scale = scale / 2 ** (max_level - level)
+        return (
+            max(1, math.ceil(page_size[0] * level_scale)),
+            max(1, math.ceil(page_size[1] * level_scale))
+        )
+
+    def _tile_region(self, page_size: Tuple[float, float], level: int,
+                     x: int, y: int) -> Tuple[float, int, int, int, int]:
+        """(scale, x, y, width, height) in level pixels, including overlap with neighbours"""
+        scale, max_level = self._pyramid(page_size)
+        if level < 0 or level > max_level:
+            raise TileOutOfRangeError(f"Level {level} is outside 0..{max_level}")
+        level_width, level_height = self._level_size(page_size, scale, max_level, level)
+
+        tile_size = settings.TILE_SIZE
+        overlap = settings.TILE_OVERLAP
+        if x < 0 or y < 0 or x * tile_size >= level_width or y * tile_size >= level_height:
+            raise TileOutOfRangeError(f"Tile {x}_{y} is outside level {level}")
+
+        left = max(0, x * tile_size - overlap)
+        top = max(0, y * tile_size - overlap)
+        right = min(level_width, (x + 1) * tile_size + overlap)
+        bottom = min(level_height, (y + 1) * tile_size + overlap)
+        level_scale = scale / 2 ** (max_level - level)
+        return level_scale, left, top, right - left, bottom - top
+
+    async def _render_tile(self, pdf_path: str, page_number: int, tile_path: str,
+                           region: Tuple[float, int, int, int, int], image_format: str) -> Optional[str]:
+        # Another worker may have rendered it while we waited for the lock
+        if os.path.exists(tile_path):
+            return tile_path
+
+        scale, x, y, width, height = region
+        data = await render_backends.render_region(
+            pdf_path, page_number, scale, x, y, width, height,
+            command_utils.Priority.INTERACTIVE, image_format, settings.TILE_QUALITY
+        )
+        if not data:
+            return None
+
+        os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+        # Write under a temporary name so readers never see a partial tile
+        temp_path = f"{tile_path}.{uuid.uuid4().hex}.part"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, tile_path)
+        page_cache.record(tile_path, len(data))
+        return tile_path
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# Modules import each other from the server root (`from config import settings`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
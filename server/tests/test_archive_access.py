@@ -0,0 +1,188 @@
+# tests/test_archive_access.py
+import asyncio
+import json
+import os
+import zipfile
+
+import pytest
+
+from config import settings
+from core.utils import archive_access
+from core.utils.archive_access import ArchiveIndex, MemberNotFoundError, parse_7z_listing
+
+
+SEVEN_ZIP_LISTING = """
+7-Zip [64] 16.02 : Copyright (c) 1999-2016 Igor Pavlov : 2016-05-21
+
+Scanning the drive for archives:
+1 file, 1234 bytes (2 KiB)
+
+Listing archive: sample.7z
+
+--
+Path = sample.7z
+Type = 7z
+Physical Size = 1234
+Headers Size = 210
+Method = LZMA2:12
+Solid = +
+Blocks = 1
+
+----------
+Path = docs
+Size = 0
+Packed Size = 0
+Modified = 2023-05-01 12:30:45
+Attributes = D....
+CRC = 
+Encrypted = -
+Method = 
+Block = 
+
+Path = docs/readme.txt
+Size = 1200
+Packed Size = 800
+Modified = 2023-05-01 12:30:45.1234567
+Attributes = A....
+CRC = 3610A686
+Encrypted = -
+Method = LZMA2:12
+Block = 0
+
+Path = data.bin
+Size = 34
+Packed Size = 
+Modified = 
+Attributes = A....
+Encrypted = -
+Block = 0
+"""
+
+
+def test_parse_7z_listing_skips_archive_header():
+    members = parse_7z_listing(SEVEN_ZIP_LISTING)
+    assert [member[0] for member in members] == ["docs", "docs/readme.txt", "data.bin"]
+
+    docs, readme, data = members
+    assert docs[1] == 0 and docs[4] is True
+    assert readme[1:3] == (1200, 800) and readme[4] is False
+    assert readme[3] > 0
+    # Empty fields of a solid block fall back to "unknown"
+    assert data == ("data.bin", 34, -1, -1, False, -1)
+
+
+def test_parse_7z_listing_crlf_and_empty():
+    assert parse_7z_listing(SEVEN_ZIP_LISTING.replace("\n", "\r\n")) == parse_7z_listing(SEVEN_ZIP_LISTING)
+    assert parse_7z_listing("") == []
+    assert parse_7z_listing("Path = sample.7z\nType = 7z\n") == []
+
+
+def _build_index(tmp_path, members) -> ArchiveIndex:
+    manifest = archive_access._write_columns(members, str(tmp_path))
+    manifest["format"] = "zip"
+    manifest_path = os.path.join(tmp_path, "index.json")
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    return ArchiveIndex(manifest_path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    return _build_index(tmp_path, [
+        ("README.md", 10, 8, 1_700_000_000, False, -1),
+        ("./src/main.py", 100, 40, 1_700_000_000, False, -1),
+        ("src/util.py", 50, 20, -1, False, -1),
+        ("src/lib/", 0, 0, -1, True, -1),
+        ("docs/guide/intro.txt", 5, -1, -1, False, -1),  # docs and docs/guide are only implied
+        ("zeta.txt", 1, 1, -1, False, -1),
+    ])
+
+
+def test_index_totals(index):
+    assert index.file_count == 5
+    assert index.total_size == 166
+    assert index.names == sorted(index.names)
+
+
+def test_list_root_puts_directories_first(index):
+    listing = index.list()
+    assert listing["path"] == ""
+    assert [entry["path"] for entry in listing["entries"]] == ["docs", "src", "README.md", "zeta.txt"]
+    assert listing["total"] == 4
+
+
+def test_list_implied_directories(index):
+    docs = index.list("docs")
+    assert [(entry["path"], entry["isDir"]) for entry in docs["entries"]] == [("docs/guide", True)]
+    assert [entry["name"] for entry in index.list("docs/guide")["entries"]] == ["intro.txt"]
+
+
+def test_list_recursive_in_path_order(index):
+    listing = index.list("src", recursive=True)
+    assert [entry["path"] for entry in listing["entries"]] == ["src/lib", "src/main.py", "src/util.py"]
+
+
+def test_list_prefix_and_pattern(index):
+    assert [entry["name"] for entry in index.list("src", prefix="m")["entries"]] == ["main.py"]
+    assert [entry["path"] for entry in index.list(recursive=True, pattern="*.py")["entries"]] == [
+        "src/main.py", "src/util.py"
+    ]
+    assert index.list("src", pattern="*.txt")["total"] == 0
+
+
+def test_list_pagination(index):
+    first = index.list(limit=3)
+    second = index.list(offset=3, limit=3)
+    assert first["total"] == second["total"] == 4
+    assert len(first["entries"]) == 3
+    assert [entry["path"] for entry in second["entries"]] == ["zeta.txt"]
+
+
+def test_list_missing_directory(index):
+    with pytest.raises(MemberNotFoundError):
+        index.list("nope")
+    with pytest.raises(MemberNotFoundError):
+        index.list("README.md")
+
+
+def test_entry_fields(index):
+    entry = index.entry(index.row("src/main.py"))
+    assert entry["size"] == 100
+    assert entry["compressedSize"] == 40
+    assert entry["modified"].startswith("2023-11-14")
+    entry = index.entry(index.row("docs/guide/intro.txt"))
+    assert entry["compressedSize"] is None and entry["modified"] is None
+
+
+def test_member_keeps_the_archive_name(index):
+    assert index.member("src/main.py") == {"name": "./src/main.py", "size": 100, "offset": -1}
+    assert index.member("/src/util.py")["name"] == "src/util.py"
+    with pytest.raises(MemberNotFoundError):
+        index.member("src")
+    with pytest.raises(MemberNotFoundError):
+        index.member("src/missing.py")
+
+
+def test_later_member_replaces_earlier(tmp_path):
+    index = _build_index(tmp_path, [
+        ("a.txt", 1, 1, -1, False, -1),
+        ("a.txt", 7, 7, -1, False, -1),
+    ])
+    assert index.file_count == 1
+    assert index.member("a.txt")["size"] == 7
+
+
+def test_build_member_index_from_zip(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CONVERTED_DIR", str(tmp_path / "converted"))
+    archive_path = tmp_path / "sample.zip"
+    with zipfile.ZipFile(archive_path, 'w') as archive:
+        archive.writestr("folder/one.txt", "one")
+        archive.writestr("two.txt", "two!")
+
+    manifest_path = asyncio.run(archive_access.build_member_index(str(archive_path), "doc"))
+    assert manifest_path == archive_access.member_index_path("doc")
+
+    index = ArchiveIndex(manifest_path)
+    assert index.format == "zip"
+    assert (index.file_count, index.total_size) == (2, 7)
+    assert [entry["path"] for entry in index.list()["entries"]] == ["folder", "two.txt"]
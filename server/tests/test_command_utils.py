@@ -0,0 +1,73 @@
+# tests/test_command_utils.py
+import asyncio
+
+from core.utils.command_utils import Priority, ToolLimiter
+
+
+async def _run_order(limit, priorities):
+    limiter = ToolLimiter("test", limit)
+    started = []
+
+    async def job(name, priority):
+        await limiter.acquire(priority)
+        started.append(name)
+        await asyncio.sleep(0)
+        limiter.release()
+
+    # Hold every slot so the jobs below all queue up
+    for _ in range(limit):
+        await limiter.acquire(Priority.NORMAL)
+    tasks = [asyncio.create_task(job(name, priority)) for name, priority in priorities]
+    await asyncio.sleep(0)
+    assert sum(limiter.queued.values()) == len(priorities)
+    for _ in range(limit):
+        limiter.release()
+    await asyncio.gather(*tasks)
+    return limiter, started
+
+
+def test_waiters_run_by_priority_then_fifo():
+    limiter, started = asyncio.run(_run_order(1, [
+        ("bulk-1", Priority.BULK),
+        ("normal-1", Priority.NORMAL),
+        ("interactive-1", Priority.INTERACTIVE),
+        ("bulk-2", Priority.BULK),
+        ("interactive-2", Priority.INTERACTIVE),
+    ]))
+    assert started == ["interactive-1", "interactive-2", "normal-1", "bulk-1", "bulk-2"]
+    assert limiter.running == 0
+    assert limiter.stats()["queued"] == {"interactive": 0, "normal": 0, "bulk": 0}
+
+
+def test_acquire_without_contention_does_not_queue():
+    async def run():
+        limiter = ToolLimiter("test", 2)
+        await limiter.acquire(Priority.BULK)
+        await limiter.acquire(Priority.BULK)
+        assert limiter.running == 2 and not limiter._waiters
+        limiter.release()
+        limiter.release()
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert limiter.running == 0 and limiter.completed == 2
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def run():
+        limiter = ToolLimiter("test", 1)
+        await limiter.acquire(Priority.NORMAL)
+        cancelled = asyncio.create_task(limiter.acquire(Priority.INTERACTIVE))
+        waiting = asyncio.create_task(limiter.acquire(Priority.BULK))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+
+        limiter.release()
+        await asyncio.wait_for(waiting, 1)
+        assert limiter.running == 1
+        limiter.release()
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert limiter.running == 0
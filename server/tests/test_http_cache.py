@@ -0,0 +1,59 @@
+# tests/test_http_cache.py
+from email.utils import formatdate
+
+import pytest
+from starlette.datastructures import Headers
+
+from core.utils.http_cache import RangeNotSatisfiableError, is_not_modified, make_etag, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),  # A suffix longer than the file is the whole file
+    ("bytes=900-5000", (900, 999)),  # The end is clamped to the last byte
+    ("bytes=0-0", (0, 0)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    None, "", "items=0-10", "bytes=0-10,20-30", "bytes=abc-", "bytes=5", "bytes=--5",
+])
+def test_parse_range_sends_whole_file(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=1000-2000", "bytes=-0", "bytes=50-10"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(RangeNotSatisfiableError):
+        parse_range(header, 1000)
+
+
+def test_make_etag_is_quoted_and_deterministic():
+    etag = make_etag("abc", 1, "page")
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == make_etag("abc", 1, "page")
+    assert etag != make_etag("abc", 2, "page")
+
+
+def test_if_none_match():
+    etag = make_etag("abc")
+    assert is_not_modified(Headers({"if-none-match": etag}), etag)
+    assert is_not_modified(Headers({"if-none-match": f'"other", W/{etag}'}), etag)
+    assert is_not_modified(Headers({"if-none-match": "*"}), etag)
+    assert not is_not_modified(Headers({"if-none-match": '"other"'}), etag)
+    assert not is_not_modified(Headers({}), etag)
+
+
+def test_if_modified_since():
+    etag = make_etag("abc")
+    modified = 1_700_000_000
+    since = formatdate(modified, usegmt=True)
+    assert is_not_modified(Headers({"if-modified-since": since}), etag, modified)
+    assert not is_not_modified(Headers({"if-modified-since": since}), etag, modified + 60)
+    assert not is_not_modified(Headers({"if-modified-since": "not a date"}), etag, modified)
+    # If-None-Match takes precedence over If-Modified-Since
+    assert not is_not_modified(Headers({"if-none-match": '"other"', "if-modified-since": since}), etag, modified)
@@ -0,0 +1,67 @@
+# tests/test_line_index.py
+import codecs
+
+import pytest
+
+from config import settings
+from core.utils import line_index
+
+
+@pytest.fixture(autouse=True)
+def converted_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CONVERTED_DIR", str(tmp_path / "converted"))
+
+
+def _index(tmp_path, data: bytes, doc_id: str = "doc"):
+    file_path = tmp_path / f"{doc_id}.txt"
+    file_path.write_bytes(data)
+    manifest_path = line_index._build_line_index(str(file_path), doc_id)
+    return str(file_path), manifest_path, line_index.load_manifest(manifest_path)
+
+
+def test_detect_encoding():
+    assert line_index.detect_encoding(codecs.BOM_UTF8 + b"abc") == ("utf-8-sig", 3)
+    assert line_index.detect_encoding(codecs.BOM_UTF16_LE + b"a\x00") == ("utf-16-le", 2)
+    # A sample cut inside a multi-byte sequence is still UTF-8
+    assert line_index.detect_encoding("héllo".encode("utf-8")[:2]) == ("utf-8", 0)
+    assert line_index.detect_encoding(b"caf\xe9 au lait") == ("cp1252", 0)
+
+
+def test_scan_counts_lines_and_characters(tmp_path):
+    _, _, manifest = _index(tmp_path, "one\ntwo\r\nthrée\n".encode("utf-8"))
+    assert manifest["encoding"] == "utf-8"
+    assert manifest["line_count"] == 3  # The trailing newline does not start a fourth line
+    assert manifest["char_count"] == 15
+
+
+def test_read_lines_window(tmp_path):
+    file_path, manifest_path, manifest = _index(tmp_path, b"zero\none\r\ntwo\nthree")
+    assert manifest["line_count"] == 4
+
+    window = line_index.read_lines(file_path, manifest_path, manifest, 1, 2)
+    assert window == {"lines": ["one", "two"], "truncated": False}
+    assert line_index.read_lines(file_path, manifest_path, manifest, 3, 10)["lines"] == ["three"]
+    assert line_index.read_lines(file_path, manifest_path, manifest, 4, 10)["lines"] == []
+    assert line_index.read_lines(file_path, manifest_path, manifest, 0, 0)["lines"] == []
+
+
+def test_read_lines_utf16_with_bom(tmp_path):
+    data = codecs.BOM_UTF16_LE + "α\nβ😀\n".encode("utf-16-le")
+    file_path, manifest_path, manifest = _index(tmp_path, data)
+    assert manifest["encoding"] == "utf-16-le"
+    assert manifest["line_count"] == 2
+    assert manifest["char_count"] == 5  # The surrogate pair is one character
+    assert line_index.read_lines(file_path, manifest_path, manifest, 0, 2)["lines"] == ["α", "β😀"]
+
+
+def test_read_lines_truncates_long_windows(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TEXT_LINES_MAX_BYTES", 4)
+    file_path, manifest_path, manifest = _index(tmp_path, b"abcdefgh\n")
+    assert line_index.read_lines(file_path, manifest_path, manifest, 0, 1) == {
+        "lines": ["abcd"], "truncated": True
+    }
+
+
+def test_empty_file(tmp_path):
+    _, _, manifest = _index(tmp_path, b"")
+    assert manifest["line_count"] == 0 and manifest["char_count"] == 0
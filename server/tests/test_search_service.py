@@ -0,0 +1,34 @@
+# tests/test_search_service.py
+from services.search_service import MARK_END, MARK_START, SearchService
+
+
+def test_build_query_quotes_terms_and_prefixes_the_last():
+    assert SearchService.build_query("annual report") == '"annual" "report"*'
+    assert SearchService.build_query('NEAR(a b) OR "x') == '"NEAR" "a" "b" "OR" "x"*'
+    assert SearchService.build_query("  --  ") is None
+    assert SearchService.build_query("") is None
+
+
+def test_snippet_html_escapes_document_text():
+    snippet = f"<script>{MARK_START}alert{MARK_END}</script> & more"
+    assert SearchService.snippet_html(snippet) == (
+        "&lt;script&gt;<mark>alert</mark>&lt;/script&gt; &amp; more"
+    )
+
+
+def test_search_matches_and_highlights(tmp_path):
+    service = SearchService(str(tmp_path / "search.db"))
+    service._insert_pages([("The <b>quarterly</b> report", "key", 1), ("Nothing here", "key", 2)])
+    service._write(("INSERT INTO documents (document_id, artifact_key, name) VALUES (?, ?, ?)",
+                    ("doc", "key", "report.pdf")))
+    service._write(("INSERT INTO pages (body, artifact_key, page) VALUES (?, ?, ?)",
+                    ("quarterly numbers", "orphan", 1)))
+
+    result = service._search("quart", 10, 0)
+    # Pages of artifacts no document refers to are never returned
+    assert [(hit["documentId"], hit["page"]) for hit in result["hits"]] == [("doc", 1)]
+    assert "<mark>quarterly</mark>" in result["hits"][0]["snippet"]
+    assert "&lt;b&gt;" in result["hits"][0]["snippet"]
+
+    service._remove_document("doc")
+    assert service._search("quarterly", 10, 0)["hits"] == []
@@ -0,0 +1,47 @@
+# tests/test_tile_service.py
+import pytest
+
+from config import settings
+from services.tile_service import TileOutOfRangeError, TileService
+
+LETTER = (612.0, 792.0)
+
+
+@pytest.fixture
+def tiles(monkeypatch):
+    monkeypatch.setattr(settings, "TILE_SIZE", 256)
+    monkeypatch.setattr(settings, "TILE_OVERLAP", 1)
+    monkeypatch.setattr(settings, "TILE_MAX_SCALE", 4.0)
+    monkeypatch.setattr(settings, "TILE_MAX_DIMENSION", 32768)
+    return TileService(document_service=None)
+
+
+def test_pyramid_levels(tiles):
+    scale, max_level = tiles._pyramid(LETTER)
+    assert scale == 4.0
+    # 3168 pixels on the long side need 12 halvings to reach one pixel
+    assert max_level == 12
+    assert tiles._level_size(LETTER, scale, max_level, max_level) == (2448, 3168)
+    assert tiles._level_size(LETTER, scale, max_level, 0) == (1, 1)
+
+
+def test_pyramid_caps_the_deepest_level(tiles, monkeypatch):
+    monkeypatch.setattr(settings, "TILE_MAX_DIMENSION", 1000)
+    scale, max_level = tiles._pyramid(LETTER)
+    width, height = tiles._level_size(LETTER, scale, max_level, max_level)
+    assert max(width, height) == 1000
+
+
+def test_tile_region_overlaps_neighbours(tiles):
+    scale, max_level = tiles._pyramid(LETTER)
+    assert tiles._tile_region(LETTER, max_level, 0, 0) == (scale, 0, 0, 257, 257)
+    assert tiles._tile_region(LETTER, max_level, 1, 1) == (scale, 255, 255, 258, 258)
+    # The last column and row are cut at the level's edge
+    assert tiles._tile_region(LETTER, max_level, 9, 12) == (scale, 2303, 3071, 145, 97)
+
+
+def test_tile_region_out_of_range(tiles):
+    _, max_level = tiles._pyramid(LETTER)
+    for level, x, y in [(-1, 0, 0), (max_level + 1, 0, 0), (max_level, 10, 0), (max_level, 0, 13), (0, 1, 0)]:
+        with pytest.raises(TileOutOfRangeError):
+            tiles._tile_region(LETTER, level, x, y)